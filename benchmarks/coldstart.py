@@ -0,0 +1,154 @@
+#---------------------------------------------------------------------------------------------
+# Cold-start benchmark of the dashboard under gunicorn
+#
+#   python benchmarks/coldstart.py                        # default, fast and fast+demo modes
+#   python benchmarks/coldstart.py --modes fast --runs 5 --workers 2
+#
+# Each run starts gunicorn from scratch, as a spun-down host does, and times how long it takes
+# until the page ('/') and the app layout ('/_dash-layout') are served, then how long uploading
+# the demo sector and rendering it in 3D takes on the fresh workers. The median of --runs runs
+# is reported.
+#---------------------------------------------------------------------------------------------
+
+import argparse
+import base64
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {'default': {'DYNAMICSECTOR_FAST_START': '0', 'DYNAMICSECTOR_PRECOMPILE_DEMO': '0'},
+         'fast': {'DYNAMICSECTOR_FAST_START': '1', 'DYNAMICSECTOR_PRECOMPILE_DEMO': '0'},
+         'fast+demo': {'DYNAMICSECTOR_FAST_START': '1', 'DYNAMICSECTOR_PRECOMPILE_DEMO': '1'}}
+
+
+def free_port():
+    """Picks a free local TCP port."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, start, timeout):
+    """Polls url until it answers with 200, returning the seconds since start."""
+    while time.time() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                response.read()
+                if response.status == 200:
+                    return time.time() - start
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.01)
+    raise RuntimeError('No response from {} after {}s'.format(url, timeout))
+
+
+def callback(base, outputs, inputs, state=(), changed=None):
+    """Calls a dashboard callback the way the browser does and returns its response."""
+    body = {'output': '..' + '...'.join('{}.{}'.format(i, p) for i, p in outputs) + '..',
+            'outputs': [{'id': i, 'property': p} for i, p in outputs],
+            'inputs': [{'id': i, 'property': p, 'value': v} for i, p, v in inputs],
+            'state': [{'id': i, 'property': p, 'value': v} for i, p, v in state],
+            'changedPropIds': changed or ['{}.{}'.format(i, p) for i, p, _ in inputs]}
+    request = urllib.request.Request(base + '/_dash-update-component', data=json.dumps(body).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())['response']
+
+
+def upload_outputs(base, kind):
+    """Looks up the outputs of the dashboard's upload callback for `kind`, as the browser does."""
+    with urllib.request.urlopen(base + '/_dash-dependencies') as response:
+        dependencies = json.loads(response.read())
+    for dependency in dependencies:
+        outputs = [tuple(o.split('.', 1)) for o in dependency['output'].strip('.').split('...')]
+        if ('stored_' + kind, 'children') in outputs:
+            return outputs
+    raise RuntimeError('No upload callback for {}'.format(kind))
+
+
+def first_render(base):
+    """Uploads the demo sector as csv and renders it in 3D, returning the seconds this took."""
+    start = time.time()
+    tokens = []
+    for kind in ['system_data', 'sector_map']:
+        table = pd.read_pickle(os.path.join(ROOT, 'data', kind + '.pkl'))
+        contents = 'data:text/csv;base64,' + base64.b64encode(table.to_csv(index=False).encode()).decode()
+        response = callback(base, upload_outputs(base, kind),
+                            [('upload_' + kind, 'contents', contents)],
+                            [('upload_' + kind, 'filename', kind + '.csv')])
+        tokens.append(response[kind]['data'])
+
+    # Renders that take longer than the dashboard waits for are polled, as the browser does
+    outputs = [('output_display', 'children'), ('render_progress', 'children'), ('sector_layout', 'data'),
+               ('interaction', 'data'), ('render_job', 'data'), ('shown_figure', 'data'), ('render_poll', 'disabled')]
+    inputs = [('system_data', 'data', tokens[0]), ('sector_map', 'data', tokens[1]), ('view', 'value', '3d'),
+              ('render_poll', 'n_intervals', None), ('expanded', 'data', None)]
+    response = callback(base, outputs, inputs, [('sector_layout', 'data', {}), ('render_job', 'data', {}),
+                                                ('shown_figure', 'data', None)],
+                        changed=['system_data.data'])
+    while not response['render_poll']['disabled']:
+        time.sleep(0.1)
+        response = callback(base, outputs, inputs, [('sector_layout', 'data', {}),
+                                                    ('render_job', 'data', response['render_job']['data']),
+                                                    ('shown_figure', 'data', None)],
+                            changed=['render_poll.n_intervals'])
+    return time.time() - start
+
+
+def cold_start(mode, workers, cache_dir, timeout=120):
+    """Starts gunicorn in `mode` and times the first responses."""
+    env = dict(os.environ, DYNAMICSECTOR_CACHE_DIR=cache_dir, WEB_CONCURRENCY=str(workers), **MODES[mode])
+    port = free_port()
+    start = time.time()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--chdir', os.path.join(ROOT, 'src'),
+                               '-c', os.path.join(ROOT, 'src', 'gunicorn.conf.py'),
+                               '--bind', '127.0.0.1:{}'.format(port), 'dynamic_sector_app:server'],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = 'http://127.0.0.1:{}'.format(port)
+        page = wait_for(base + '/', start, timeout)
+        layout = wait_for(base + '/_dash-layout', start, timeout)
+        render = first_render(base)
+    finally:
+        server.terminate()
+        server.wait()
+    return {'page': page, 'layout': layout, 'first render': render}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the cold start of the DynamicSector dashboard.')
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--runs', type=int, default=3, help='cold starts per mode; the median is kept')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = []
+    print('{:<10} {:>10} {:>10} {:>14}'.format('mode', 'page', 'layout', 'first render'))
+    for mode in args.modes:
+        runs = []
+        for _ in range(args.runs):
+            with tempfile.TemporaryDirectory() as cache_dir:
+                runs.append(cold_start(mode, args.workers, cache_dir))
+        median = {k: statistics.median(r[k] for r in runs) for k in runs[0]}
+        results.append(dict(mode=mode, **median))
+        print('{:<10} {:>8.2f} s {:>8.2f} s {:>12.3f} s'.format(mode, median['page'], median['layout'],
+                                                                median['first render']), flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'workers': args.workers, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
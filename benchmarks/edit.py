@@ -0,0 +1,73 @@
+#---------------------------------------------------------------------------------------------
+# Stability benchmark of incremental layouts: how far bodies move when one body is added
+#
+#   python benchmarks/edit.py                             # 1k, 10k and 100k bodies
+#   python benchmarks/edit.py --bodies 10000 --dim 2
+#
+# A synthetic sector is laid out from scratch, then a planet is added to one of its systems
+# and the sector is laid out again from the first layout. Displacements are reported in units
+# of the median route length of the first layout; the run fails if a body moves further than
+# --limit of those.
+#---------------------------------------------------------------------------------------------
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+import dynamicsector as ds
+from synthetic import sector_of_size
+
+
+def add_planet(system_data, sector_map, sun):
+    """Returns copies of the frames with one more planet, orbiting `sun`."""
+    label = '{}-new'.format(sun)
+    planet = pd.DataFrame({'label': [label], 'type': ['Planet'], 'value': [4.5e-5], 'threat level': ['Minima'],
+                           'description': ['']})
+    route = pd.DataFrame({'source': [sun], 'target': [label], 'weight': [5.0], 'type': ['In-system']})
+    return (pd.concat([system_data, planet], ignore_index=True),
+            pd.concat([sector_map, route], ignore_index=True))
+
+
+def edit(bodies, dim, seed=0):
+    """Adds a body to a laid-out sector, returning (seconds, bodies moved, max and median displacement / k)."""
+    system_data, sector_map = sector_of_size(bodies, seed=seed)
+    before = ds.prepare_sector(system_data, sector_map, dim, seed=seed, cache=False)
+    pos = before.positions(dim)
+    k = np.median(np.sqrt(((pos[before.edges['source']] - pos[before.edges['target']]) ** 2).sum(axis=1)))
+
+    edited = add_planet(system_data, sector_map, system_data['label'][0])
+    start = time.perf_counter()
+    after = ds.prepare_sector(*edited, dim, seed=seed, cache=False, previous=ds.layout_snapshot(before))
+    seconds = time.perf_counter() - start
+
+    # Compare the bodies both layouts have
+    moved = np.sqrt(((after.positions(dim)[:before.n_nodes] - pos) ** 2).sum(axis=1)) / k
+    moving = moved[moved > 0]
+    return seconds, len(moving), moving.max() if len(moving) else 0.0, np.median(moving) if len(moving) else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks how far an incremental layout moves bodies.')
+    parser.add_argument('--bodies', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--dim', type=int, default=3, choices=[2, 3])
+    parser.add_argument('--limit', type=float, default=3.0, help='largest displacement allowed, in route lengths')
+    args = parser.parse_args()
+
+    print('{:>9} {:>10} {:>7} {:>12} {:>15}'.format('bodies', 'time', 'moved', 'max moved', 'median moved'))
+    failed = False
+    for bodies in args.bodies:
+        seconds, count, largest, median = edit(bodies, args.dim)
+        print('{:>9} {:>8.3f} s {:>7} {:>10.2f} k {:>13.2f} k'.format(bodies, seconds, count, largest, median), flush=True)
+        failed = failed or largest > args.limit
+    if failed:
+        sys.exit('Bodies moved further than {} route lengths'.format(args.limit))
+
+
+if __name__ == '__main__':
+    main()
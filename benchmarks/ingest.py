@@ -0,0 +1,99 @@
+#---------------------------------------------------------------------------------------------
+# Peak memory benchmark of reading a large sector map whole versus streaming it in chunks
+#
+#   python benchmarks/ingest.py                           # 200k bodies, 5M routes, csv and parquet
+#   python benchmarks/ingest.py --bodies 1000000 --routes 20000000 --formats parquet
+#
+# A synthetic sector is written to a temporary directory, then each way of building a
+# SectorModel from it runs in a fresh process, which reports its peak resident memory above
+# what the imports alone take, and how long the build took.
+#---------------------------------------------------------------------------------------------
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROUTE_TYPES = ['Hyperlane', 'Trade Route', 'Smuggling Route', 'In-System']
+
+CHILD = '''
+import resource, sys, time
+sys.path.insert(0, {src!r})
+import dynamicsector as ds
+import pyarrow.parquet
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+if {method!r} == 'frame':
+    model = ds.SectorModel.from_frames(ds.read_system_data({system!r}), ds.read_sector_map({sector!r}))
+else:
+    model = ds.read_sector({system!r}, {sector!r}, chunksize={chunksize})
+print(time.perf_counter() - start, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base) / 1024,
+      model.n_edges)
+'''
+
+
+def write_sector(directory, bodies, routes, formats, seed=0):
+    """Writes a random sector with `bodies` bodies and `routes` routes, returning the file paths."""
+    rng = np.random.default_rng(seed)
+    labels = pd.Series(['Body {}'.format(i) for i in range(bodies)], dtype=object)
+    system_data = pd.DataFrame({'label': labels, 'type': 'Planet', 'value': 1.0, 'description': ''})
+    sector_map = pd.DataFrame({'source': labels.to_numpy()[rng.integers(0, bodies, routes)],
+                               'target': labels.to_numpy()[rng.integers(0, bodies, routes)],
+                               'weight': 1 - rng.random(routes),
+                               'type': np.array(ROUTE_TYPES, dtype=object)[rng.integers(0, len(ROUTE_TYPES), routes)]})
+    paths = {'system': os.path.join(directory, 'system_data.parquet')}
+    system_data.to_parquet(paths['system'])
+    for fmt in formats:
+        paths[fmt] = os.path.join(directory, 'sector_map.' + fmt)
+        if fmt == 'csv':
+            sector_map.to_csv(paths[fmt], index=False)
+        else:
+            sector_map.to_parquet(paths[fmt], row_group_size=1000000)
+    return paths
+
+
+def measure(method, system, sector, chunksize):
+    """Builds a SectorModel in a fresh process, returning (seconds, peak MB above imports, routes)."""
+    code = CHILD.format(src=os.path.join(ROOT, 'src'), method=method, system=system, sector=sector,
+                        chunksize=chunksize)
+    seconds, peak, routes = subprocess.check_output([sys.executable, '-c', code]).split()
+    return float(seconds), float(peak), int(routes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks whole versus streaming sector map ingest.')
+    parser.add_argument('--bodies', type=int, default=200000)
+    parser.add_argument('--routes', type=int, default=5000000)
+    parser.add_argument('--formats', nargs='+', default=['csv', 'parquet'], choices=['csv', 'parquet'])
+    parser.add_argument('--chunksize', type=int, default=1000000, help='rows per streamed chunk')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_sector(directory, args.bodies, args.routes, args.formats)
+        print('{:<8} {:<7} {:>10} {:>12} {:>10}'.format('format', 'method', 'time', 'peak memory', 'routes'))
+        for fmt in args.formats:
+            size = os.path.getsize(paths[fmt]) / 2 ** 20
+            for method in ['frame', 'stream']:
+                seconds, peak, routes = measure(method, paths['system'], paths[fmt], args.chunksize)
+                results.append({'format': fmt, 'file MB': size, 'method': method, 'seconds': seconds,
+                                'peak MB': peak, 'routes': routes})
+                print('{:<8} {:<7} {:>8.2f} s {:>9.0f} MB {:>10}'.format(fmt, method, seconds, peak, routes),
+                      flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'bodies': args.bodies, 'routes': args.routes, 'chunksize': args.chunksize,
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
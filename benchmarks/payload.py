@@ -0,0 +1,107 @@
+#---------------------------------------------------------------------------------------------
+# Figure payload benchmark: plain JSON lists vs. base64 typed arrays (pack_figure)
+#
+#   python benchmarks/payload.py --copies 1 10 100
+#
+# The demo sector in data/ is tiled `copies` times side by side. For each size the 3D figure is
+# serialized both ways and the payload size (raw and gzipped) is reported, together with the
+# time to decode it back into arrays, a stand-in for the browser's parse before first render.
+# With --layout the bundled coordinates are dropped and the layout engine places the bodies.
+#---------------------------------------------------------------------------------------------
+
+import argparse
+import base64
+import gzip
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+import dynamicsector as ds
+
+
+def tiled_sector(copies):
+    """Repeats the demo sector `copies` times on a grid, with suffixed labels."""
+    system_data = pd.read_pickle(os.path.join(ROOT, 'data', 'system_data.pkl'))
+    sector_map = pd.read_pickle(os.path.join(ROOT, 'data', 'sector_map.pkl'))
+    side = int(np.ceil(copies ** (1 / 3)))
+    systems, maps = [], []
+    for i in range(copies):
+        s = system_data.copy()
+        s['label'] = s['label'] + ' {}'.format(i)
+        for axis, offset in zip(['x', 'y', 'z'], np.unravel_index(i, (side, side, side))):
+            s[axis] = s[axis] + 20 * offset
+        m = sector_map.copy()
+        m['source'] = m['source'] + ' {}'.format(i)
+        m['target'] = m['target'] + ' {}'.format(i)
+        systems.append(s)
+        maps.append(m)
+    return pd.concat(systems, ignore_index=True), pd.concat(maps, ignore_index=True)
+
+
+def as_lists(value):
+    """Turns every array in a figure into a list, as plotly.py before 6.0 serializes them."""
+    if isinstance(value, dict) and 'bdata' in value:
+        value = np.frombuffer(base64.b64decode(value['bdata']), value['dtype']).reshape(value.get('shape', -1))
+    if isinstance(value, dict):
+        return {k: as_lists(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [as_lists(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return [None if isinstance(v, float) and np.isnan(v) else v for v in value.tolist()]
+    return value
+
+
+def decode(figure):
+    """Parses a payload and materializes every typed array, as plotly.js does on load."""
+    figure = json.loads(figure)
+    for trace in figure['data']:
+        for value in list(trace.values()) + list(trace.get('marker', {}).values()):
+            if isinstance(value, dict) and 'bdata' in value:
+                np.frombuffer(base64.b64decode(value['bdata']), value['dtype'])
+    return figure
+
+
+def timed(f, *args, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = f(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--copies', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--layout', action='store_true', help='drop the coordinates and lay the sector out instead')
+    args = parser.parse_args()
+
+    # Load dependency
+    from plotly.utils import PlotlyJSONEncoder
+
+    print('{:>8} {:>8} {:>12} {:>12} {:>12} {:>12} {:>10} {:>10}'.format(
+        'bodies', 'routes', 'json B', 'json gz B', 'packed B', 'packed gz B', 'json ms', 'packed ms'))
+    for copies in args.copies:
+        system_data, sector_map = tiled_sector(copies)
+        if args.layout:
+            system_data = system_data.drop(columns=['x', 'y', 'z'])
+        fig = ds.dynamic_sector_3d(system_data, sector_map, cache=False)
+        plain = json.dumps(as_lists(fig.to_plotly_json()), cls=PlotlyJSONEncoder)
+        packed = json.dumps(ds.pack_figure(json.loads(plain)))
+        plain_time, _ = timed(decode, plain)
+        packed_time, _ = timed(decode, packed)
+        print('{:>8} {:>8} {:>12} {:>12} {:>12} {:>12} {:>10.1f} {:>10.1f}'.format(
+            len(system_data), len(sector_map),
+            len(plain), len(gzip.compress(plain.encode())),
+            len(packed), len(gzip.compress(packed.encode())),
+            1000 * plain_time, 1000 * packed_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#---------------------------------------------------------------------------------------------
+# Stage-by-stage benchmark of the render pipeline on synthetic sectors
+#
+#   python benchmarks/run.py                              # 100, 10k and 1M bodies
+#   python benchmarks/run.py --bodies 100 10000 --output before.json
+#   python benchmarks/run.py --bodies 100 10000 --compare before.json
+#
+# Each stage is timed (best of --repeat runs) and its peak traced memory is recorded. Results
+# can be written to JSON and compared against an earlier run, e.g. one taken on another commit.
+#---------------------------------------------------------------------------------------------
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+import dynamicsector as ds
+from synthetic import sector_of_size
+
+STAGES = ['ingest', 'styling', 'graph build', 'layout', 'figure build', 'serialization']
+
+
+def measure(f, repeat=1, memory=True):
+    """Runs f `repeat` times, returning its result, the best time and the peak traced memory (if traced)."""
+    best, peak = float('inf'), 0 if memory else None
+    for _ in range(repeat):
+        gc.collect()
+        if memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = f()
+        best = min(best, time.perf_counter() - start)
+        if memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    return result, best, peak
+
+
+def pipeline(bodies, folder, layout='auto', repeat=1, memory=True):
+    """Times every stage of rendering a synthetic sector of about `bodies` bodies."""
+    system_data, sector_map = sector_of_size(bodies)
+    try:
+        import pyarrow
+        fmt = 'parquet'
+    except ImportError:
+        fmt = 'csv'
+    paths = [os.path.join(folder, '{}.{}'.format(name, fmt)) for name in ['system_data', 'sector_map']]
+    if fmt == 'parquet':
+        system_data.to_parquet(paths[0])
+        sector_map.to_parquet(paths[1])
+    else:
+        system_data.to_csv(paths[0], index=False)
+        sector_map.to_csv(paths[1], index=False)
+
+    state = {}
+    stages = [('ingest', lambda: (ds.read_system_data(paths[0]), ds.read_sector_map(paths[1]))),
+              ('styling', lambda: ds.style_sector(*state['ingest'])),
+              ('graph build', lambda: ds.SectorModel.from_frames(*state['ingest'])),
+              ('layout', lambda: ds.layout_positions(state['graph build'], 3, engine=layout, cache=False)),
+              ('figure build', lambda: ds.sector_figure(state['graph build'])),
+              ('serialization', lambda: ds.pack_figure(json.loads(state['figure build'].to_json())))]
+    results = []
+    for stage, f in stages:
+        state[stage], seconds, peak = measure(f, repeat=repeat, memory=memory)
+        if stage == 'layout':
+            state['graph build'].set_positions(state['layout'])
+        peak_mb = peak / 2**20 if memory else None
+        results.append({'bodies': len(system_data), 'routes': len(sector_map), 'stage': stage,
+                        'seconds': seconds, 'peak_mb': peak_mb})
+        print('{:>9} {:>9} {:<14} {:>10.3f} s {:>13}'.format(len(system_data), len(sector_map), stage, seconds,
+                                                             '-' if peak_mb is None else '{:.1f} MB'.format(peak_mb)),
+              flush=True)
+    return results
+
+
+def compare(results, baseline):
+    """Prints the ratio of each stage's time and memory to the matching stage of a baseline run."""
+    before = {(r['bodies'], r['stage']): r for r in baseline['results']}
+    print('\n{:>9} {:<14} {:>10} {:>10} {:>8} {:>10} {:>10}'.format('bodies', 'stage', 'before s', 'after s', 'speedup',
+                                                                    'before MB', 'after MB'))
+    for r in results:
+        b = before.get((r['bodies'], r['stage']))
+        if b is not None:
+            print('{:>9} {:<14} {:>10.3f} {:>10.3f} {:>7.2f}x {:>10} {:>10}'.format(
+                r['bodies'], r['stage'], b['seconds'], r['seconds'], b['seconds'] / max(r['seconds'], 1e-9),
+                *('-' if mb is None else '{:.1f}'.format(mb) for mb in [b['peak_mb'], r['peak_mb']])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the DynamicSector render pipeline.')
+    parser.add_argument('--bodies', type=int, nargs='+', default=[100, 10000, 1000000])
+    parser.add_argument('--layout', default='auto', help='layout engine (see LAYOUT_ENGINES)')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per stage; the fastest is kept')
+    parser.add_argument('--no-memory', action='store_true', help='skip memory tracing, which slows some stages')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare against results written earlier with --output')
+    args = parser.parse_args()
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    results = []
+    print('{:>9} {:>9} {:<14} {:>12} {:>13}'.format('bodies', 'routes', 'stage', 'time', 'peak memory'))
+    with tempfile.TemporaryDirectory() as folder:
+        for bodies in args.bodies:
+            results.extend(pipeline(bodies, folder, layout=args.layout, repeat=args.repeat, memory=not args.no_memory))
+
+    run = {'commit': commit, 'python': platform.python_version(), 'machine': platform.machine(),
+           'cpus': os.cpu_count(), 'layout': args.layout, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#---------------------------------------------------------------------------------------------
+# Synthetic sector generator for the benchmarks
+#---------------------------------------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+
+THREAT_LEVELS = np.array(['Minima', 'Minoris', 'Majoris', 'Extremis'], dtype=object)
+DESCRIPTIONS = np.array(['[ERROR - RECORDS EXPUNGED]',
+                         'A temperate world of shallow oceans and scattered archipelagos, home to a modest mining colony.',
+                         'Barren and airless. Long-range scans report abandoned orbital platforms and intermittent distress beacons of unknown origin.',
+                         'Gas giant ringed by ice. Its moons host refuelling depots used by traders running the outer routes, though piracy is common.',
+                         ''], dtype=object)
+
+
+def synthetic_sector(n_systems, planets=5, routes=2, coordinates=False, seed=0):
+    """Generates system data and a sector map in the README schema.
+
+    Each of the `n_systems` star systems has one sun and `planets` planets tied to it by
+    In-system routes, and every sun gets `routes` Regular or Unpredictable routes to nearby
+    systems. With `coordinates`, x/y/z columns are included so no layout is needed.
+    """
+    rng = np.random.default_rng(seed)
+    size = planets + 1
+    n = n_systems * size
+    system = np.repeat(np.arange(n_systems), size)
+    moon = np.tile(np.arange(size), n_systems)
+    is_sun = moon == 0
+
+    # Bodies, labelled 'S<system>' for suns and 'S<system>-<planet>' for planets
+    label = pd.Series('S' + pd.Series(system).astype(str))
+    label = label.where(is_sun, label + '-' + pd.Series(moon).astype(str)).to_numpy(dtype=object)
+    system_data = pd.DataFrame({'label': label,
+                                'type': np.where(is_sun, 'Sun', 'Planet').astype(object),
+                                'value': np.where(is_sun, 0.009309, 4.5e-5 * rng.uniform(0.5, 2, n)),
+                                'threat level': THREAT_LEVELS[rng.integers(0, len(THREAT_LEVELS), n)]})
+    if coordinates:
+        centre = rng.uniform(-50 * n_systems ** (1 / 3), 50 * n_systems ** (1 / 3), (n_systems, 3))
+        xyz = centre[system] + np.where(is_sun[:, None], 0, rng.normal(scale=3, size=(n, 3)))
+        system_data['x'], system_data['y'], system_data['z'] = xyz[:, 0], xyz[:, 1], xyz[:, 2]
+    system_data['description'] = DESCRIPTIONS[rng.integers(0, len(DESCRIPTIONS), n)]
+
+    # In-system routes from every sun to its planets
+    suns = np.flatnonzero(is_sun)
+    orbit = np.flatnonzero(~is_sun)
+    source = [label[suns[system[orbit]]]]
+    target = [label[orbit]]
+    weight = [rng.uniform(0.3, 30, len(orbit))]
+    kind = [np.full(len(orbit), 'In-system', dtype=object)]
+
+    # Routes between suns, mostly to systems close by in index order
+    a = np.repeat(np.arange(n_systems), routes)
+    b = (a + rng.integers(1, max(2, min(n_systems, 20)), len(a))) % max(n_systems, 1)
+    keep = a != b
+    source.append(label[suns[a[keep]]])
+    target.append(label[suns[b[keep]]])
+    weight.append(rng.uniform(5, 60, keep.sum()))
+    kind.append(np.where(rng.random(keep.sum()) < 0.6, 'Regular', 'Unpredictable').astype(object))
+
+    sector_map = pd.DataFrame({'source': np.concatenate(source),
+                               'target': np.concatenate(target),
+                               'weight': np.concatenate(weight),
+                               'type': np.concatenate(kind)})
+    return system_data, sector_map
+
+
+def sector_of_size(bodies, planets=5, routes=2, coordinates=False, seed=0):
+    """Generates a synthetic sector with roughly `bodies` bodies."""
+    return synthetic_sector(max(1, int(round(bodies / (planets + 1)))), planets=planets, routes=routes,
+                            coordinates=coordinates, seed=seed)
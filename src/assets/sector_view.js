@@ -0,0 +1,92 @@
+// Clientside view interactions for the 3D sector map. They restyle the figure that is already in
+// the browser, so highlighting, route toggles and dimming never wait on the server, whatever the
+// size of the sector. The figure keeps its uirevision, so the camera stays where the user left it.
+
+var DIMMED_ALPHA = 0.12;
+
+function rgba(hex, alpha) {
+    var value = parseInt(hex.replace('#', ''), 16);
+    return 'rgba(' + ((value >> 16) & 255) + ',' + ((value >> 8) & 255) + ',' + (value & 255) + ',' + alpha + ')';
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    sector: {
+        restyle: function(clickData, shownRoutes, dimmedThreats, interaction, figure, selected, routeTypes) {
+            var noUpdate = window.dash_clientside.no_update;
+            if (!figure || !figure.data || !interaction || !interaction.fill) {
+                return [noUpdate, noUpdate];
+            }
+            var triggered = window.dash_clientside.callback_context.triggered.map(function(t) { return t.prop_id; });
+            var nodeTrace = figure.data.length - 1;
+            var n = interaction.fill.length;
+
+            // A new render starts without a selection; clicking a body selects it, clicking it again clears it
+            if (triggered.indexOf('interaction.data') >= 0) {
+                selected = null;
+            }
+            if (triggered.indexOf('sector_graph.clickData') >= 0 && clickData && clickData.points.length) {
+                var point = clickData.points[0];
+                if (point.curveNumber === nodeTrace) {
+                    selected = point.pointNumber === selected ? null : point.pointNumber;
+                }
+            }
+
+            // Bodies are dimmed by threat level, and outside the selected body's neighbourhood
+            var lit = new Uint8Array(n).fill(1);
+            var dimmed = new Set(dimmedThreats || []);
+            if (dimmed.size) {
+                for (var i = 0; i < n; i++) {
+                    if (dimmed.has(interaction.threat[i])) { lit[i] = 0; }
+                }
+            }
+            if (selected !== null && selected !== undefined && selected < n) {
+                var near = new Uint8Array(n);
+                near[selected] = 1;
+                for (var j = interaction.indptr[selected]; j < interaction.indptr[selected + 1]; j++) {
+                    near[interaction.indices[j]] = 1;
+                }
+                for (var k = 0; k < n; k++) { lit[k] = lit[k] & near[k]; }
+            }
+            var colors = interaction.fill.map(function(fill, i) { return rgba(fill, lit[i] ? 1 : DIMMED_ALPHA); });
+
+            // Only the node trace and the listed route types' visibility change; everything else is shared
+            var shown = new Set(shownRoutes || []);
+            var listed = new Set((routeTypes || []).map(function(option) { return option.value; }));
+            var data = figure.data.map(function(trace, i) {
+                if (i === nodeTrace) {
+                    var marker = Object.assign({}, trace.marker, {color: colors});
+                    delete marker.colorscale;
+                    delete marker.cmin;
+                    delete marker.cmax;
+                    return Object.assign({}, trace, {marker: marker});
+                }
+                if (i > 1 && listed.has(trace.name)) {
+                    return Object.assign({}, trace, {visible: shown.has(trace.name)});
+                }
+                return trace;
+            });
+            return [Object.assign({}, figure, {data: data}), selected === undefined ? null : selected];
+        },
+
+        // Only clicks on systems and camera moves in the '3D systems' view reach the server, which
+        // expands and collapses systems; other views handle clicks and camera moves here alone
+        lodEvent: function(clickData, relayoutData, view) {
+            var noUpdate = window.dash_clientside.no_update;
+            if (view !== 'lod') {
+                return noUpdate;
+            }
+            var triggered = window.dash_clientside.callback_context.triggered.map(function(t) { return t.prop_id; });
+            if (triggered.indexOf('sector_graph.clickData') >= 0) {
+                var point = clickData && clickData.points && clickData.points[0];
+                if (!point || point.customdata === undefined || point.customdata === null) {
+                    return noUpdate;
+                }
+                return {click: point.customdata, time: Date.now()};
+            }
+            if (relayoutData && relayoutData['scene.camera']) {
+                return {camera: relayoutData['scene.camera'], time: Date.now()};
+            }
+            return noUpdate;
+        }
+    }
+});
@@ -2,16 +2,33 @@
 # Dependencies
 #---------------------------------------------------------------------------------------------
 
+import os
+import sys
+import time
+
+STARTED = time.time()
+
+# In fast-start mode, modules the server never uses are kept out: Dash loads IPython's notebook
+# support whenever IPython is installed, which is a large share of its import time. They are
+# only blocked (a None entry in sys.modules makes importing them fail) while the app and the
+# render pipeline load below, and unblocked afterwards, so later imports of them still work
+FAST_START = os.environ.get('DYNAMICSECTOR_FAST_START', '0') == '1'
+BLOCKED_MODULES = [name for name in ['IPython', 'ipykernel', 'PIL'] if FAST_START and name not in sys.modules]
+for name in BLOCKED_MODULES:
+    sys.modules[name] = None
+
 import dash
 from dash import dcc, html, dash_table, ctx, callback
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
 
 import dash_bootstrap_components as dbc
 
 import base64
-import io
+import uuid
+from collections import OrderedDict
+
+import flask
 
-import pandas as pd
 import dynamicsector as ds
 
 #---------------------------------------------------------------------------------------------
@@ -24,6 +41,48 @@ app = dash.Dash(__name__,
                 suppress_callback_exceptions=True)
 server = app.server
 
+# Collect per-stage latencies, sizes and cache hit rates for /metrics. Each worker process counts
+# its own; with DYNAMICSECTOR_METRICS_DIR set, the workers share their totals through that
+# directory (cleared by gunicorn.conf.py when the server starts) and a scrape reports the whole server,
+# otherwise it reports whichever worker answers it
+metrics = ds.add_observer(ds.MetricsRecorder(directory=os.environ.get('DYNAMICSECTOR_METRICS_DIR')))
+
+# Import the render pipeline now, so that workers forked from a preloaded app share it
+if FAST_START:
+    with ds.timed('warm_imports'):
+        ds.warm_imports()
+for name in BLOCKED_MODULES:
+    if name in sys.modules and sys.modules[name] is None:
+        del sys.modules[name]
+
+#---------------------------------------------------------------------------------------------
+# Demo
+#---------------------------------------------------------------------------------------------
+
+def sector_graph(figure):
+    return dcc.Graph(id='sector_graph',
+                     figure=figure,
+                     config={'displayModeBar': False,
+                             'scrollZoom': True,
+                             'responsive': True},
+                     style={'backgroundColor':'rgba(0,0,0,0.80)',
+                            'height':'75vh'})
+
+# The bundled demo sector can be rendered at startup and shown until the user uploads their own;
+# its figure lands in the render cache, so later workers and restarts find it there
+DEMO_DIR = os.environ.get('DYNAMICSECTOR_DEMO_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'))
+demo_display = None
+demo_interaction = {}
+demo_shown = None
+if os.environ.get('DYNAMICSECTOR_PRECOMPILE_DEMO', '0') == '1':
+    with ds.timed('precompile_demo'):
+        demo = ds.render_sector_3d(ds.read_system_data(os.path.join(DEMO_DIR, 'system_data.pkl')),
+                                   ds.read_sector_map(os.path.join(DEMO_DIR, 'sector_map.pkl')),
+                                   binary=True)
+    demo_display = sector_graph(demo['figure'])
+    demo_interaction = demo['interaction']
+    demo_shown = demo['key']
+
 # Define wrapper
 app.layout = html.Div(style={'borderTop': '5px solid #728896',
                                   'borderBottom': '5px solid #728896',
@@ -93,7 +152,85 @@ app.layout = html.Div(style={'borderTop': '5px solid #728896',
                                           'borderBottom': '3px solid #728896',
                                           'padding': '5px 0px 5px 0px'}),   
                 
-                html.Div(id='output_display',
+                dcc.Store(id='sector_layout', storage_type='session', data={}),
+                dcc.Store(id='render_job', storage_type='session', data={}),
+                dcc.Store(id='shown_figure', data=demo_shown),
+                dcc.Store(id='expanded', data={'clicked': [], 'zoomed': []}),
+                dcc.Store(id='lod_event', data=None),
+                dcc.Store(id='route', data={}),
+                dcc.Store(id='jump', data={}),
+                dcc.Store(id='interaction', data=demo_interaction),
+                dcc.Store(id='selected_body', data=None),
+                dcc.Interval(id='render_poll', interval=500, disabled=True),
+                
+                dcc.RadioItems(id='view',
+                               options=[{'label': '3D', 'value': '3d'},
+                                        {'label': '3D systems', 'value': 'lod'},
+                                        {'label': '2D', 'value': '2d'}],
+                               value='3d',
+                               inline=True,
+                               inputStyle={'margin-right': '5px'},
+                               labelStyle={'margin-right': '15px'},
+                               style={'color': 'rgba(255,255,255,0.8)',
+                                      'font-family': 'monospace',
+                                      'font-size': '0.85vw',
+                                      'padding': '5px 15px 0px 15px'}),
+                
+                dbc.Row([
+                    dbc.Col(dcc.Dropdown(id='route_from', placeholder='Route from...', options=[]), width=3),
+                    dbc.Col(dcc.Dropdown(id='route_to', placeholder='Route to...', options=[]), width=3),
+                    dbc.Col(dcc.Checklist(id='route_avoid',
+                                          options=[],
+                                          value=[],
+                                          inline=True,
+                                          inputStyle={'margin-right': '5px'},
+                                          labelStyle={'margin-right': '15px'},
+                                          style={'color': 'rgba(255,255,255,0.8)',
+                                                 'font-family': 'monospace',
+                                                 'font-size': '0.85vw'}), width=3),
+                    dbc.Col(dcc.Input(id='jump_range',
+                                      type='number',
+                                      min=0,
+                                      placeholder='Jump range',
+                                      debounce=True,
+                                      style={'width': '100%'}), width=1),
+                    dbc.Col([html.Div(id='route_info',
+                                      style={'color': 'rgba(255,215,0,0.9)',
+                                             'font-family': 'monospace',
+                                             'font-size': '0.85vw'}),
+                             html.Div(id='range_info',
+                                      style={'color': 'rgba(0,200,255,0.9)',
+                                             'font-family': 'monospace',
+                                             'font-size': '0.85vw'})], width=2)
+                        ], align='center', style={'padding': '5px 15px 0px 15px'}),
+                
+                # Shown route types and dimmed threat levels restyle the map in the browser
+                dbc.Row([
+                    dbc.Col(dcc.Checklist(id='route_types',
+                                          options=[],
+                                          value=[],
+                                          inline=True,
+                                          inputStyle={'margin-right': '5px'},
+                                          labelStyle={'margin-right': '15px'},
+                                          style={'color': 'rgba(255,255,255,0.8)',
+                                                 'font-family': 'monospace',
+                                                 'font-size': '0.85vw'}), width=6),
+                    dbc.Col(dcc.Checklist(id='dim_threat',
+                                          options=[],
+                                          value=[],
+                                          inline=True,
+                                          inputStyle={'margin-right': '5px'},
+                                          labelStyle={'margin-right': '15px'},
+                                          style={'color': 'rgba(255,255,255,0.8)',
+                                                 'font-family': 'monospace',
+                                                 'font-size': '0.85vw'}), width=6)
+                        ], style={'padding': '5px 15px 0px 15px'}),
+                
+                html.Div(id='render_progress',
+                    style={'padding':'0px 10px 0px 10px'}),
+                
+                html.Div(demo_display,
+                    id='output_display',
                     style={'height':'76vh',
                            'width':'auto',
                            'padding':'5px 10px 5px 10px'}),
@@ -101,7 +238,7 @@ app.layout = html.Div(style={'borderTop': '5px solid #728896',
                 dbc.Row([
                     html.P(["The ",
                             html.B("DynamicSector"),
-                            " dashboard is intended to support science fiction or otherwise interstellar roleplaying games. It takes topological 'network' data (xls, csv, and pkl), converts the data into a NetworkX object, and visualizes the results as a 3D 'star map'. The resulting visualizations are navigable using a mouse and keyboard and includes tooltips describing each of the planets and stars (if the descriptions are provided). ",
+                            " dashboard is intended to support science fiction or otherwise interstellar roleplaying games. It takes topological 'network' data (csv, xls, parquet, and feather), converts the data into a NetworkX object, and visualizes the results as a 2D or 3D 'star map'. The resulting visualizations are navigable using a mouse and keyboard and includes tooltips describing each of the planets and stars (if the descriptions are provided). ",
                             html.B(["Instructions on how to properly format the data are provided at ",
                                     html.A("thomasbryansmith/DynamicSector",
                                         href='https://github.com/thomasbryansmith/DynamicSector'),
@@ -120,84 +257,451 @@ app.layout = html.Div(style={'borderTop': '5px solid #728896',
 # Functions
 #---------------------------------------------------------------------------------------------
      
-def read_and_check_upload(contents, filename):
-    content_string = contents.split(',')[1]
-    decoded = base64.b64decode(content_string)
+# Parsed uploads live server-side, keyed by a hash of the file; the browser only holds that key.
+# Workers share them through CACHE_DIR, or through Redis when DYNAMICSECTOR_REDIS_URL is set.
+STORE_TTL = int(os.environ.get('DYNAMICSECTOR_STORE_TTL', 24 * 60 * 60))
+if os.environ.get('DYNAMICSECTOR_REDIS_URL'):
+    sector_store = ds.RedisCache('frames', ds.frame_dumps, ds.frame_loads, os.environ['DYNAMICSECTOR_REDIS_URL'],
+                                 max_items=8, ttl=STORE_TTL)
+else:
+    sector_store = ds.TieredCache('frames', ds.frame_dumps, ds.frame_loads,
+                                  max_items=8, max_bytes=2**30, ttl=STORE_TTL)
+
+# Figures are built in a bounded pool of worker processes, so large sectors do not hold up the
+# server; jobs live in a store shared by the workers, so any of them can answer a poll
+RENDER_PROCESSES = int(os.environ.get('DYNAMICSECTOR_RENDER_PROCESSES', 2))
+RENDER_WAIT = 1.0
+if os.environ.get('DYNAMICSECTOR_REDIS_URL'):
+    job_store = ds.RedisCache('jobs', ds.job_store.dumps, ds.job_store.loads, os.environ['DYNAMICSECTOR_REDIS_URL'],
+                              max_items=0, ttl=ds.JOB_TTL)
+else:
+    job_store = ds.job_store
+render_pool = ds.RenderPool(processes=RENDER_PROCESSES, store=job_store)
+
+# Next stage of a render in progress, by the stage it last finished
+RENDER_STAGES = {None: 'Building sector', 'build': 'Laying out bodies', 'layout': 'Drawing figure',
+                 'figure': 'Packing figure'}
+
+# Route planners and spatial indexes are held in memory, for the last few sectors
+ROUTE_PLANNERS = 4
+route_planners = OrderedDict()
+spatial_indexes = OrderedDict()
+
+# Pickles can execute code when loaded, so they are only accepted when explicitly enabled
+ALLOW_PICKLE = os.environ.get('DYNAMICSECTOR_ALLOW_PICKLE', '0') == '1'
+
+# The 2D view loads vis-network from /vis, which browsers may cache for a week
+VIS_URL = '/vis'
+VIS_MAX_AGE = 7 * 24 * 60 * 60
+
+def parse_upload(contents, filename, kind):
+    with ds.timed('upload_decode'):
+        content_string = contents.split(',')[1]
+        decoded = base64.b64decode(content_string)
+    ds.notify('size', 'upload_bytes', len(decoded))
+    format = ds.table_format(filename)
+    key = ds.content_hash(kind, format, decoded)
+    if key not in sector_store:
+        schema = ds.SYSTEM_SCHEMA if kind == 'system_data' else ds.SECTOR_SCHEMA
+        with ds.timed('upload_parse'):
+            df = ds.read_table(decoded, schema, format=format, allow_pickle=ALLOW_PICKLE)
+        sector_store.put(key, df)
+    return key
+
+def parse_bundle(contents):
+    with ds.timed('upload_decode'):
+        decoded = base64.b64decode(contents.split(',')[1])
+    ds.notify('size', 'upload_bytes', len(decoded))
+    
+    # A compiled sector already carries its layout, which travels as the system data's coordinates
+    keys = [ds.content_hash(kind, 'bundle', decoded) for kind in ['system_data', 'sector_map']]
+    if keys[0] not in sector_store or keys[1] not in sector_store:
+        with ds.timed('upload_parse'):
+            frames = ds.bundle_frames(decoded)
+        for key, df in zip(keys, frames):
+            sector_store.put(key, df)
+    return keys
+
+def render_view(view, rendered):
+    if view == '2d':
+        return html.Iframe(srcDoc=rendered['html'],
+                           style={'backgroundColor':'rgba(0,0,0,0.80)',
+                                  'border':'none',
+                                  'width':'100%',
+                                  'height':'75vh'})
+    return sector_graph(rendered['figure'])
+
+def patch_view(view, rendered, shown):
+    
+    # A 3D figure replacing another one is sent as the parts that changed, keeping the graph in place
+    if view == '2d' or not shown or not rendered.get('key'):
+        return render_view(view, rendered)
+    if rendered['key'] == shown:
+        return dash.no_update
+    previous = ds.render_cache.get(shown, label='shown')
+    if previous is None:
+        return render_view(view, rendered)
+    patch = dash.Patch()
+    for op, path, value in ds.figure_changes(previous['figure'], rendered['figure']):
+        target = patch['props']['figure']
+        for key in path[:-1]:
+            target = target[key]
+        if op == 'set':
+            target[path[-1]] = value
+        elif op == 'delete':
+            del target[path[-1]]
+        elif op == 'extend':
+            target[path[-1]].extend(value)
+        else:
+            target[path[-1]].append(value)
+    
+    # The browser's figure also carries the route and range overlays and the clientside restyle
+    # (see assets/sector_view.js), which the cached figure knows nothing about, so those are reset
+    figure, data = rendered['figure'], patch['props']['figure']['data']
+    for trace in [0, 1]:
+        for axis in ['x', 'y', 'z']:
+            data[trace][axis] = figure['data'][trace].get(axis, [])
+    data[len(figure['data']) - 1]['marker'] = figure['data'][-1]['marker']
+    return patch
+
+def show_job(render_job, status, shown):
+    
+    # Finished renders are fetched from the render cache once, rather than with every poll
+    rendered = render_pool.result(render_job['job']) if status['state'] == 'done' else None
+    if rendered is not None:
+        shown_now = rendered.get('key') if render_job['view'] != '2d' else None
+        return (patch_view(render_job['view'], rendered, shown), None, rendered['layout'],
+                rendered.get('interaction', {}), render_job, shown_now, True)
+    
+    # The current view stays up while the next one renders
+    if status['state'] in ('queued', 'running'):
+        progress = html.Div([html.P(RENDER_STAGES.get(status.get('stage'), 'Rendering') + '...',
+                                    style={'color': 'rgba(255,255,255,0.7)',
+                                           'font-family': 'monospace',
+                                           'font-size': '0.8vw',
+                                           'text-align': 'center'}),
+                             dbc.Progress(value=100 * status.get('progress', 0), striped=True, animated=True,
+                                          style={'width': '50%', 'margin': 'auto'})],
+                            style={'padding-top': '5px'})
+        return dash.no_update, progress, dash.no_update, dash.no_update, render_job, dash.no_update, False
+    return dash.no_update, html.P('Rendering failed, please upload the data again.',
+                                  style={'color':'rgba(255,74,74,0.85)',
+                                         'font-size': '0.8vw',
+                                         'text-align': 'center'}), dash.no_update, dash.no_update, render_job, dash.no_update, True
+
+def route_planner(system_data, sector_map):
+    key = (system_data, sector_map)
+    if key in route_planners:
+        route_planners.move_to_end(key)
+        return route_planners[key]
+    frames = sector_store.get(system_data), sector_store.get(sector_map)
+    if frames[0] is None or frames[1] is None:
+        return None
+    with ds.timed('route_index'):
+        planner = ds.RoutePlanner(ds.SectorModel.from_frames(frames[0], frames[1]))
+    route_planners[key] = planner
+    while len(route_planners) > ROUTE_PLANNERS:
+        route_planners.popitem(last=False)
+    return planner
+
+def spatial_index(system_data, sector_map, sector_layout):
+    key = (system_data, sector_map)
+    if key in spatial_indexes:
+        spatial_indexes.move_to_end(key)
+        
+        # Bodies moved by an incremental layout are updated in place
+        spatial_indexes[key].update(sector_layout)
+        return spatial_indexes[key]
+    spatial_indexes[key] = ds.SpatialIndex.from_layout(sector_layout)
+    while len(spatial_indexes) > ROUTE_PLANNERS:
+        spatial_indexes.popitem(last=False)
+    return spatial_indexes[key]
+
+def read_and_check_upload(contents, filename, kind):
     try:
-        if 'csv' in filename:
-            df = pd.read_csv(io.StringIO(decoded.decode('utf-8')))
-        elif 'xls' in filename:
-            df = pd.read_excel(io.BytesIO(decoded))
-        elif 'pkl' in filename:
-            df = pd.read_pickle(io.BytesIO(decoded))
+        token = parse_bundle(contents) if kind == 'bundle' else parse_upload(contents, filename, kind)
     except Exception:
-        return html.P('ERROR',
-                    style={'color':'rgba(255,74,74,0.85)',
-                           'font-size': '0.8vw',
-                           'text-align': 'center'})
+        return {'child': html.P('ERROR',
+                                style={'color':'rgba(255,74,74,0.85)',
+                                       'font-size': '0.8vw',
+                                       'text-align': 'center'}),
+                'data': dash.no_update}
     children = html.P([html.B('Stored: '), filename],
                       style={'color': 'rgba(255,255,255,0.7)',
                              'font-size': '0.8vw',
                              'text-align': 'center'})
-    return {'child': children, 'data': df.to_json()}
+    return {'child': children, 'data': token}
 
 #---------------------------------------------------------------------------------------------
 # Callbacks
 #---------------------------------------------------------------------------------------------
 
 @app.callback(
-    Output('system_data', 'data'),
+    [Output('system_data', 'data'),
+     Output('stored_system_data', 'children'),
+     Output('sector_map', 'data', allow_duplicate=True),
+     Output('stored_sector_map', 'children', allow_duplicate=True)],
     Input('upload_system_data', 'contents'),
-    State('upload_system_data', 'filename'))
+    State('upload_system_data', 'filename'),
+    prevent_initial_call=True)
 def system_data_store(contents, filename):
     if contents is not None:
-        data = read_and_check_upload(contents, filename)['data']
-        return data
+        
+        # A compiled sector bundle (see ds.write_bundle) fills in the sector map as well
+        if filename.lower().endswith('.zip'):
+            upload = read_and_check_upload(contents, filename, 'bundle')
+            if upload['data'] is dash.no_update:
+                return dash.no_update, upload['child'], dash.no_update, dash.no_update
+            return upload['data'][0], upload['child'], upload['data'][1], upload['child']
+        upload = read_and_check_upload(contents, filename, 'system_data')
+        return upload['data'], upload['child'], dash.no_update, dash.no_update
+    return (dash.no_update,) * 4
     
 @app.callback(
-    Output('sector_map', 'data'),
+    [Output('sector_map', 'data'),
+     Output('stored_sector_map', 'children')],
     Input('upload_sector_map', 'contents'),
-    State('upload_sector_map', 'filename'))
+    State('upload_sector_map', 'filename'),
+    prevent_initial_call=True)
 def sector_map_store(contents, filename):
     if contents is not None:
-        data = read_and_check_upload(contents, filename)['data']
-        return data
+        upload = read_and_check_upload(contents, filename, 'sector_map')
+        return upload['data'], upload['child']
+    return dash.no_update, dash.no_update
     
 @app.callback(
-    Output('stored_system_data', 'children'),
-    Input('upload_system_data', 'contents'),
-    State('upload_system_data', 'filename'))
-def stored_system_data(contents, filename):
-    if contents is not None:
-        return read_and_check_upload(contents, filename)['child']
+    [Output('output_display', 'children'),
+     Output('render_progress', 'children'),
+     Output('sector_layout', 'data'),
+     Output('interaction', 'data'),
+     Output('render_job', 'data'),
+     Output('shown_figure', 'data'),
+     Output('render_poll', 'disabled')],
+    [Input('system_data', 'data'),
+     Input('sector_map', 'data'),
+     Input('view', 'value'),
+     Input('render_poll', 'n_intervals'),
+     Input('expanded', 'data')],
+    [State('sector_layout', 'data'),
+     State('render_job', 'data'),
+     State('shown_figure', 'data')],
+    prevent_initial_call=True
+)
+def update(system_data, sector_map, view, n_intervals, expanded, sector_layout, render_job, shown):
+    render_job = render_job or {}
     
-@app.callback(
-    Output('stored_sector_map', 'children'),
-    Input('upload_sector_map', 'contents'),
-    State('upload_sector_map', 'filename'))
-def stored_sector_map(contents, filename):
-    if contents is not None:
-        return read_and_check_upload(contents, filename)['child']
+    # While a render runs in the background, poll it until it is done
+    if ctx.triggered_id == 'render_poll':
+        if not render_job.get('job'):
+            return (dash.no_update,) * 6 + (True,)
+        return show_job(render_job, render_pool.status(render_job['job']), shown)
     
+    if system_data and sector_map:
+        frames = sector_store.get(system_data), sector_store.get(sector_map)
+        if frames[0] is None or frames[1] is None:
+            return dash.no_update, html.P('Stored data has expired, please upload it again.',
+                                          style={'color':'rgba(255,74,74,0.85)',
+                                                 'font-size': '0.8vw',
+                                                 'text-align': 'center'}), dash.no_update, dash.no_update, dash.no_update, dash.no_update, True
+        
+        # Reuse cached renders, and the previous layout so that edits only move the affected bodies;
+        # coordinates, sizes and colors of the 3D figure travel as compact typed arrays
+        if view == '2d':
+            render, options = ds.render_sector_2d, {'height': 'calc(100vh - 16px)', 'asset_url': VIS_URL}
+        elif view == 'lod':
+            expanded = expanded or {}
+            systems = expanded.get('clicked', []) + [s for s in expanded.get('zoomed', []) if s not in expanded.get('clicked', [])]
+            render, options = ds.render_sector_lod, {'binary': True, 'expanded': systems}
+        else:
+            render, options = ds.render_sector_3d, {'binary': True}
+        
+        # Build the figure in the render pool, replacing whatever this session was waiting for,
+        # and show it right away if it is ready within RENDER_WAIT seconds
+        session = render_job.get('session') or uuid.uuid4().hex
+        job = render_pool.submit(render, frames[0], frames[1],
+                                 previous=sector_layout or None,
+                                 slot=session,
+                                 replaces=render_job.get('job'),
+                                 **options)
+        return show_job({'session': session, 'job': job, 'view': view}, render_pool.wait(job, RENDER_WAIT), shown)
+    return (dash.no_update,) * 6 + (True,)
+
 @app.callback(
-    Output('output_display', 'children'),
+    [Output('route_from', 'options'),
+     Output('route_to', 'options'),
+     Output('route_avoid', 'options'),
+     Output('route_types', 'options'),
+     Output('route_types', 'value'),
+     Output('dim_threat', 'options')],
     [Input('system_data', 'data'),
      Input('sector_map', 'data')],
     prevent_initial_call=True
 )
-def update(system_data, sector_map):
-    if system_data and sector_map is not None:
-        return dcc.Graph(figure=ds.dynamic_sector_3d(pd.read_json(io.StringIO(system_data)), 
-                                                     pd.read_json(io.StringIO(sector_map))),
-                         config={'displayModeBar': False,
-                                 'scrollZoom': True,
-                                 'responsive': True},
-                         style={'backgroundColor':'rgba(0,0,0,0.80)',
-                                'height':'75vh'})
+def sector_options(system_data, sector_map):
+    frames = sector_store.get(system_data) if system_data else None, sector_store.get(sector_map) if sector_map else None
+    labels = sorted(frames[0]['label'].astype(str).unique()) if frames[0] is not None else []
+    kinds = sorted(set(str(ds.route_name(t)) for t in frames[1]['type'].dropna().unique())) if frames[1] is not None else []
+    threats = []
+    if frames[0] is not None and 'threat level' in frames[0].columns:
+        threats = sorted(frames[0]['threat level'].dropna().astype(str).unique())
+    return (labels, labels,
+            [{'label': 'Avoid ' + kind, 'value': kind} for kind in kinds],
+            [{'label': 'Show ' + kind, 'value': kind} for kind in kinds], kinds,
+            [{'label': 'Dim ' + threat, 'value': threat} for threat in threats])
+
+@app.callback(
+    [Output('route', 'data'),
+     Output('route_info', 'children')],
+    [Input('route_from', 'value'),
+     Input('route_to', 'value'),
+     Input('route_avoid', 'value'),
+     Input('sector_layout', 'data')],
+    [State('system_data', 'data'),
+     State('sector_map', 'data'),
+     State('view', 'value')],
+    prevent_initial_call=True
+)
+def plan_route(source, target, avoid, sector_layout, system_data, sector_map, view):
+    found = None
+    if view != '2d' and source and target and sector_layout and system_data and sector_map:
+        planner = route_planner(system_data, sector_map)
+        if planner is not None:
+            try:
+                with ds.timed('route_query'):
+                    found = planner.route(source, target, avoid=avoid or ())
+            except KeyError:
+                found = None
+            if found is None:
+                info = 'No route'
+            else:
+                info = '{:,.2f} AU, {} jumps'.format(found['distance'], len(found['routes']))
+        else:
+            info = ''
+    else:
+        info = ''
+    return ds.route_coordinates(sector_layout, found['path']) if found else {}, info
+
+@app.callback(
+    [Output('jump', 'data'),
+     Output('range_info', 'children')],
+    [Input('route_from', 'value'),
+     Input('jump_range', 'value'),
+     Input('sector_layout', 'data')],
+    [State('system_data', 'data'),
+     State('sector_map', 'data'),
+     State('view', 'value')],
+    prevent_initial_call=True
+)
+def jump_range(source, radius, sector_layout, system_data, sector_map, view):
+    if view == '2d' or not source or not radius or not sector_layout or not system_data or not sector_map:
+        return {}, ''
+    index = spatial_index(system_data, sector_map, sector_layout)
+    try:
+        with ds.timed('range_query'):
+            reachable = index.within(source, radius)
+    except KeyError:
+        return {}, ''
+    reachable = reachable[reachable['label'] != source]['label'].tolist()
+    return ds.route_coordinates(sector_layout, reachable), '{} in range'.format(len(reachable))
+
+@app.callback(
+    Output('sector_graph', 'figure'),
+    [Input('route', 'data'),
+     Input('jump', 'data')],
+    prevent_initial_call=True
+)
+def overlay(route, jump):
+    
+    # Only the route and range traces of the 3D figure change, so the figure is patched rather than resent
+    patch = dash.Patch()
+    for trace, marked in enumerate([route, jump]):
+        for axis in ['x', 'y', 'z']:
+            patch['data'][trace][axis] = (marked or {}).get(axis, [])
+    return patch
+
+# Clicks and camera moves only come through in the '3D systems' view (see assets/sector_view.js)
+app.clientside_callback(
+    ClientsideFunction(namespace='sector', function_name='lodEvent'),
+    Output('lod_event', 'data'),
+    [Input('sector_graph', 'clickData'),
+     Input('sector_graph', 'relayoutData')],
+    State('view', 'value'),
+    prevent_initial_call=True
+)
+
+@app.callback(
+    Output('expanded', 'data'),
+    Input('lod_event', 'data'),
+    [State('expanded', 'data'),
+     State('view', 'value'),
+     State('shown_figure', 'data')],
+    prevent_initial_call=True
+)
+def expand_systems(event, expanded, view, shown):
+    if view != 'lod' or not event:
+        return dash.no_update
+    clicked, zoomed = list((expanded or {}).get('clicked', [])), list((expanded or {}).get('zoomed', []))
+    
+    # Clicking a collapsed system expands it, clicking any of its bodies collapses it again
+    if 'click' in event:
+        system = event['click']
+        if system in clicked or system in zoomed:
+            clicked, zoomed = [s for s in clicked if s != system], [s for s in zoomed if s != system]
+        else:
+            clicked.append(system)
+        return {'clicked': clicked, 'zoomed': zoomed}
+    
+    # Zooming in expands the systems around the camera's focus, zooming out collapses them
+    camera = event.get('camera')
+    rendered = ds.render_cache.get(shown, label='shown') if camera and shown else None
+    if rendered is None or 'systems' not in rendered:
+        return dash.no_update
+    focus = ds.lod_focus(rendered['systems'], camera)
+    if focus == zoomed:
+        return dash.no_update
+    return {'clicked': clicked, 'zoomed': focus}
+
+# Highlighting a body's neighbours, toggling route types and dimming by threat level run in the
+# browser (see assets/sector_view.js), without a round trip to the server
+app.clientside_callback(
+    ClientsideFunction(namespace='sector', function_name='restyle'),
+    [Output('sector_graph', 'figure', allow_duplicate=True),
+     Output('selected_body', 'data')],
+    [Input('sector_graph', 'clickData'),
+     Input('route_types', 'value'),
+     Input('dim_threat', 'value'),
+     Input('interaction', 'data')],
+    [State('sector_graph', 'figure'),
+     State('selected_body', 'data'),
+     State('route_types', 'options')],
+    prevent_initial_call=True
+)
+
+@server.route(VIS_URL + '/<path:filename>')
+def vis_assets(filename):
+    return flask.send_from_directory(ds.vis_asset_dir(), filename, max_age=VIS_MAX_AGE)
+
+@server.route('/metrics')
+def metrics_endpoint():
+    return flask.Response(metrics.to_prometheus(), mimetype='text/plain; version=0.0.4')
+
+# Report how long after the process started (the master's start, under preloading) the first
+# response went out, once per worker
+first_response = []
+
+@server.after_request
+def report_first_response(response):
+    if not first_response:
+        first_response.append(time.time() - STARTED)
+        ds.notify('timing', 'first_response', first_response[0])
+        print('First response {:.2f}s after startup'.format(first_response[0]), file=sys.stderr, flush=True)
+    return response
 
 #---------------------------------------------------------------------------------------------
 # Compile App
 #---------------------------------------------------------------------------------------------
 
+ds.notify('timing', 'startup', time.time() - STARTED)
+
 if __name__ == '__main__':
     app.run_server(debug=True)
\ No newline at end of file
@@ -4,6 +4,11 @@
 DynamicSector provides a suite of functions that help construct dynamic star (sector) maps for science fiction roleplaying games.
 """
 
+import os
+import tempfile
+import time
+
+
 def flatten(xss):
     """Flattens a list of list into a list."""
     return [x for xs in xss for x in xs]
@@ -41,284 +46,4025 @@ def random_earthy_hex(red_range=(150, 255), green_range=(150, 255), blue_range=(
     return "#{:02x}{:02x}{:02x}".format(red, green, blue)
 
 
-def set_color_shape_image(type_vector):
-    """Based on the type attribute of input system data, each node in the sector is assigned either a clip art sun or an earthy tone."""
+# Styling shared by the 2D and 3D renderers
+SUN_IMAGE = 'https://png.pngtree.com/png-clipart/20230518/ourmid/pngtree-realistic-sun-illustration-png-image_7096994.png'
+HIDDEN = 'rgba(0, 0, 0, 0)'
+ROUTE_STYLES = {'Regular': {'color': 'rgba(27, 235, 124, 0.7)', 'dashes': False},
+                'Unpredictable': {'color': 'rgba(255, 0, 132, 0.7)', 'dashes': True}}
+ROUTE_HIGHLIGHT = 'rgba(255, 215, 0, 0.9)'
+RANGE_HIGHLIGHT = 'rgba(0, 200, 255, 0.6)'
+FIGURE_SCALE = (50, -50, 50)
+DEFAULT_SEED = 0
 
-    # Generate empty lists to populate
-    color = []
-    shape = []
-    image = []
-    
-    # If / else statement that identifies suns
-    for n in type_vector: 
-        if n=='Sun':
-            color.append("rgba(0, 0, 0, 0)")
-            shape.append('circularImage')
-            image.append('https://png.pngtree.com/png-clipart/20230518/ourmid/pngtree-realistic-sun-illustration-png-image_7096994.png')
-        else: 
-            color.append(random_earthy_hex())
-            shape.append('dot')
-            image.append('')
-    return {'color': color, 
-            'shape': shape, 
-            'image': image}
+
+def route_kind(value):
+    """Normalizes a route type for comparison, ignoring case, spacing and hyphenation."""
+    return ''.join(c for c in str(value).lower() if c.isalpha())
+
+
+def route_name(value):
+    """Returns the ROUTE_STYLES name a route type matches (see route_kind), or the type itself."""
+    kind = route_kind(value)
+    return next((name for name in ROUTE_STYLES if route_kind(name) == kind), value)
+
+
+def random_hex_array(n, red_range, green_range, blue_range, rng=None, upper=False):
+    """Generates an array of n random hex color codes, drawing each component from an inclusive range."""
+
+    # Load dependency
+    import numpy as np
+
+    if rng is None:
+        rng = np.random.default_rng()
+
+    # Draw all components at once
+    rgb = np.stack([rng.integers(*red_range, size=n, endpoint=True),
+                    rng.integers(*green_range, size=n, endpoint=True),
+                    rng.integers(*blue_range, size=n, endpoint=True)], axis=1).astype(np.uint8)
+    return _hex_codes(rgb, upper)
+
+
+def _hex_codes(rgb, upper=False):
+    """Formats an (n, 3) uint8 array as hex color codes, writing the digits straight into a byte buffer."""
+
+    # Load dependency
+    import numpy as np
+
+    digits = np.frombuffer(b'0123456789ABCDEF' if upper else b'0123456789abcdef', dtype=np.uint8)
+    chars = np.empty((len(rgb), 7), dtype=np.uint8)
+    chars[:, 0] = ord('#')
+    chars[:, 1::2] = digits[rgb >> 4]
+    chars[:, 2::2] = digits[rgb & 15]
+    return chars.view('S7').ravel().astype('U7').astype(object)
+
+
+def label_hash(labels, seed=DEFAULT_SEED):
+    """Hashes every label to 64 bits, keyed with `seed`, for picking per-body styling (see hashed_hex_array)."""
+
+    # Load dependencies
+    import numpy as np
+    import pandas as pd
+
+    # Labels are nearly all distinct, so factorizing them first would only cost time
+    return pd.util.hash_array(np.asarray(labels), hash_key='{:016x}'.format(seed % 2 ** 64), categorize=False)
+
+
+def hashed_hex_array(bits, red_range, green_range, blue_range, upper=False):
+    """Turns 64-bit hashes into hex color codes, scaling 16 bits into each component's inclusive range.
+
+    With hashes from label_hash, a body keeps its color wherever it sits in the frame and whatever
+    else the sector holds.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    rgb = np.empty((len(bits), 3), dtype=np.uint8)
+    for i, (lo, hi) in enumerate([red_range, green_range, blue_range]):
+        share = (bits >> np.uint64(16 * i)) & np.uint64(0xFFFF)
+        rgb[:, i] = lo + ((share * np.uint64(hi - lo + 1)) >> np.uint64(16))
+    return _hex_codes(rgb, upper)
+
+
+def random_yellow_hex_array(n, rng=None, red_range=(210, 255), green_range=(210, 255)):
+    """Vectorized counterpart of random_yellow_hex that returns n colors."""
+    return random_hex_array(n, red_range, green_range, (100, 255), rng=rng, upper=True)
+
+
+def random_earthy_hex_array(n, rng=None, red_range=(150, 255), green_range=(150, 255), blue_range=(75, 255)):
+    """Vectorized counterpart of random_earthy_hex that returns n colors."""
+    return random_hex_array(n, red_range, green_range, blue_range, rng=rng)
+
+
+def style_nodes(type_vector, seed=DEFAULT_SEED, labels=None):
+    """Assigns color, fill, shape and image to every astronomical object in a single vectorized pass.
+
+    'color' is the 2D color (transparent for suns so the clip art sun shows through) and 'fill' is the
+    3D marker color (yellow for suns, earthy for planets). Colors are picked per label from
+    label_hash, keyed with `seed`, so the same body is always drawn the same way and editing
+    one body leaves the others' colors alone. Without `labels`, bodies are keyed by position.
+    """
+
+    # Load dependencies
+    import numpy as np
+    import pandas as pd
+
+    # Identify suns with a single comparison over the type column
+    is_sun = pd.Series(type_vector).to_numpy() == 'Sun'
+    n = len(is_sun)
+
+    # Hash every body once and color suns and planets from their own palettes
+    bits = label_hash(np.arange(n) if labels is None else pd.Series(labels).to_numpy(), seed)
+    fill = np.empty(n, dtype=object)
+    fill[is_sun] = hashed_hex_array(bits[is_sun], (210, 255), (210, 255), (100, 255), upper=True)
+    fill[~is_sun] = hashed_hex_array(bits[~is_sun], (150, 255), (150, 255), (75, 255))
+
+    return {'color': np.where(is_sun, HIDDEN, fill).astype(object),
+            'fill': fill,
+            'shape': np.where(is_sun, 'circularImage', 'dot').astype(object),
+            'image': np.where(is_sun, SUN_IMAGE, '').astype(object)}
+
+
+def style_edges(type_vector):
+    """Assigns color and dash flags to every route with a categorical lookup over the route types."""
+
+    # Load dependencies
+    import numpy as np
+    import pandas as pd
+
+    # Look each distinct route type up once, whatever its case or spacing; anything unrecognised
+    # (e.g. In-System) is hidden
+    codes, uniques = pd.factorize(pd.Series(type_vector))
+    styles = [ROUTE_STYLES.get(route_name(t), {}) for t in uniques]
+    color = np.array([style.get('color', HIDDEN) for style in styles] + [HIDDEN], dtype=object)
+    dashes = np.array([style.get('dashes', False) for style in styles] + [False], dtype=bool)
+
+    # Missing types are coded -1, which picks up the trailing hidden style
+    return {'color': color[codes],
+            'dashes': dashes[codes]}
+
+
+# Styling that bundle_frames passes along as frame columns (style_<column>), keyed as style_sector
+# returns it and mapped to the SectorModel columns holding it
+STYLE_COLUMNS = {'nodes': {'color': 'color', 'fill': 'fill', 'shape': 'shape', 'image': 'image',
+                           'md': 'description_md', 'html': 'description_html'},
+                 'edges': {'color': 'color', 'dashes': 'dashes'}}
+
+
+def stored_style(df, part):
+    """Returns the styling a frame carries for `part` ('nodes' or 'edges'), or None if it has none."""
+    columns = STYLE_COLUMNS[part]
+    if not all('style_' + col in df.columns for col in columns.values()):
+        return None
+    return {key: df['style_' + col].to_numpy() for key, col in columns.items()}
+
+
+def style_sector(system_data, sector_map, seed=DEFAULT_SEED):
+    """Computes all node and edge styling (including wrapped descriptions) for a sector in one stage.
+
+    Frames recovered from a compiled sector carry its styling (see bundle_frames), which is used as is.
+    """
+    nodes = stored_style(system_data, 'nodes')
+    if nodes is None:
+        nodes = style_nodes(system_data['type'], seed=seed, labels=system_data['label'])
+        nodes.update(wrap_description(system_data['description']))
+    edges = stored_style(sector_map, 'edges')
+    if edges is None:
+        edges = style_edges(sector_map['type'])
+    return {'nodes': nodes,
+            'edges': edges}
+
+
+def set_color_shape_image(type_vector, seed=DEFAULT_SEED):
+    """Based on the type attribute of input system data, each node in the sector is assigned either a clip art sun or an earthy tone."""
+    style = style_nodes(type_vector, seed=seed)
+    return {'color': list(style['color']),
+            'shape': list(style['shape']),
+            'image': list(style['image'])}
 
 
 def set_edge_color_type(type_vector):
     """Based on the type attribute of input data, each edge in the sector map is assigned a color and type."""
-    
-    # Generate empty lists to populate    
-    color = []
-    updbl = []
-    
-    # If / else statement that identifies regular and unpredictable routes
-    # This also hides within-system edges
-    for n in type_vector:
-        if n=='Regular':
-            color.append('rgba(27, 235, 124, 0.7)')
-            updbl.append(False)
-        elif n=='Unpredictable':
-            color.append('rgba(255, 0, 132, 0.7)')
-            updbl.append(True)
-        else:
-            color.append('rgba(0, 0, 0, 0)')
-            updbl.append(False)
-    return {'color': color,
-            'updbl': updbl}
-        
-def wrap_description(description_vector):
+    style = style_edges(type_vector)
+    return {'color': list(style['color']),
+            'updbl': list(style['dashes'])}
+
+
+def wrap_description(description_vector, width=50):
     """Wraps the description text using markdown and html syntax."""
-        
-    # Import wrap function from textwrap library
-    from textwrap import wrap 
-    
-    # Generate empty lists to populate
-    wrapped_md = []
-    wrapped_html = []
-    
-    # Wrap the descriptions
-    for n in description_vector:
-        wrapped_md.append('\n'.join(wrap(n, width=50)))
-        wrapped_html.append('<br>'.join(wrap(n, width=50)))
-    
-    return {'md': wrapped_md,
-            'html': wrapped_html}
-    
-    
-def dynamic_sector_2d(system_data, sector_map):
-    """Generates 2D sector map based on data provided by the user."""
-    
+
     # Load dependencies
+    import numpy as np
     import pandas as pd
-    import networkx as nx
-    from pyvis.network import Network
-    from IPython.display import HTML
-    from pyautogui import size
+    from textwrap import wrap
 
-    # Update data ready for visualization
-    system_data['color'] = set_color_shape_image(system_data['type'])['color']
-    system_data['shape'] = set_color_shape_image(system_data['type'])['shape']
-    system_data['image'] = set_color_shape_image(system_data['type'])['image']
+    # Wrap each distinct description once and broadcast the result back
+    codes, uniques = pd.factorize(pd.Series(description_vector).fillna('').astype(str))
+    lines = [wrap(n, width=width) for n in uniques]
+    wrapped_md = np.array(['\n'.join(n) for n in lines] + [''], dtype=object)
+    wrapped_html = np.array(['<br>'.join(n) for n in lines] + [''], dtype=object)
 
-    system_data['description_md'] = wrap_description(system_data['description'])['md']
-        
-    sector_map['color'] = set_edge_color_type(sector_map['type'])['color']
-    sector_map['dashes'] = set_edge_color_type(sector_map['type'])['updbl']
-
-    # Create networkx graph object from sector_map input
-    G = nx.from_pandas_edgelist(sector_map, 'source', 'target', edge_attr=['weight', 'type', 'color', 'dashes'])
-
-    # Set attributes of astronomical objects, generate layout if not provided
-    if 'x' and 'y' in system_data.columns:
-        for _, row in system_data.iterrows():
-            nx.set_node_attributes(G, {row['label']: {'value': row['value'], 
-                                                    'type': row['type'], 
-                                                    'x': row['x']*50, 
-                                                    'y': row['y']*-50, 
-                                                    'title': row['label'] + "\n" + row['description_md'], 
-                                                    'color': row['color'],
-                                                    'shape': row['shape'],
-                                                    'image': row['image'],
-                                                    'font': {'color': '#8bad6b', 'face': 'Serif'}
-                                                    }})
-    else:
-        pos = nx.spring_layout(G, dim=2)
-        system_data['x'] = [x[0] for x in pos.values()]
-        system_data['y'] = [y[1] for y in pos.values()]
-        for _, row in system_data.iterrows():
-            nx.set_node_attributes(G, {row['label']: {'value': row['value'], 
-                                                    'type': row['type'], 
-                                                    'x': row['x']*50, 
-                                                    'y': row['y']*-50, 
-                                                    'title': row['label'] + "\n" + row['description_md'], 
-                                                    'color': row['color'],
-                                                    'shape': row['shape'],
-                                                    'image': row['image'],
-                                                    'font': {'color': '#8bad6b', 'face': 'Serif'}
-                                                    }})
-        
-    # Invert edge weights
-    for u, v, data in G.edges(data=True):
-        data['weight'] = 1 / data['weight']
-       
-    # Create pyvis network object with screen height and width to match user
-    wid, hei= size()
-    nt = Network(width='{}px'.format(wid), height='{}px'.format(hei), bgcolor="#031101")
-    nt.from_nx(G)
-    
-    ## Set edge width to 2
-    ## [Note: will not be applicable for all sector sizes, 
-    ##        need to set relative sizes based on input features]
-    for edge in nt.edges:
-        edge['width'] = 2   
-        
-    ## Set visualization options
-    nt.set_options("""
-        var options = {
-            "nodes": {
-            "physics": false
-            },
-            "layout": {
-            "hierarchical": false
-            }
-        }
-        """)
-    
-    # Return html object
-    html_string = nt.generate_html()
-    return HTML(html_string)
+    return {'md': wrapped_md[codes],
+            'html': wrapped_html[codes]}
 
 
-def dynamic_sector_3d(system_data, sector_map):
-    """Generates 3D sector map based on data provided by the user."""
-    
+# Modules the render pipeline imports on first use
+PIPELINE_MODULES = ['numpy', 'pandas', 'pyarrow', 'pyarrow.parquet', 'networkx', 'plotly.graph_objects', 'plotly.io']
+
+
+def warm_imports(modules=PIPELINE_MODULES):
+    """Imports the render pipeline's dependencies ahead of the first render, skipping missing ones.
+
+    A server that loads its app before forking workers can call this once, so that every worker
+    shares the imported modules instead of importing them on its first request.
+    """
+
+    # Load dependency
+    import importlib
+
+    loaded = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+        loaded.append(name)
+    return loaded
+
+
+# Observers receive (kind, name, value) events: 'timing' in seconds, 'size' counts and 'cache' hits
+OBSERVERS = []
+
+
+def add_observer(observer):
+    """Registers a callable observer(kind, name, value) for the render pipeline's events."""
+    if observer not in OBSERVERS:
+        OBSERVERS.append(observer)
+    return observer
+
+
+def remove_observer(observer):
+    """Unregisters an observer added with add_observer."""
+    if observer in OBSERVERS:
+        OBSERVERS.remove(observer)
+
+
+def notify(kind, name, value):
+    """Passes an event to every observer; does nothing when nobody is listening."""
+    for observer in list(OBSERVERS):
+        observer(kind, name, value)
+
+
+class timed(object):
+    """Context manager reporting the time spent in its block as a 'timing' event called `name`."""
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if OBSERVERS:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None and OBSERVERS:
+            notify('timing', self.name, time.perf_counter() - self.start)
+
+
+class MetricsRecorder(object):
+    """Observer aggregating events into Prometheus histograms and counters.
+
+    Timings and sizes become histograms labelled by event name, cache events become hit / miss
+    counters. Each process keeps its own totals; with a `directory` shared by the processes of a
+    server (e.g. its gunicorn workers), each one also writes them to a file there and
+    to_prometheus reports the sum over all of them. Clear the directory when the server starts.
+    """
+
+    TIMING_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+    SIZE_BUCKETS = tuple(10 ** e for e in range(1, 10))
+
+    def __init__(self, prefix='dynamicsector', directory=None):
+        from threading import Lock
+
+        self.prefix = prefix
+        self.directory = directory
+        self.histograms = {}
+        self.counters = {}
+        self._pid = os.getpid()
+        self._lock = Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, kind, name, value):
+        with self._lock:
+
+            # A forked process starts its own totals, leaving its parent's in the parent's file
+            if os.getpid() != self._pid:
+                self.histograms, self.counters, self._pid = {}, {}, os.getpid()
+            if kind == 'cache':
+                key = (name, 'hit' if value else 'miss')
+                self.counters[key] = self.counters.get(key, 0) + 1
+            else:
+                buckets = self.TIMING_BUCKETS if kind == 'timing' else self.SIZE_BUCKETS
+                counts, total = self.histograms.get((kind, name), ([0] * (len(buckets) + 1), 0.0))
+                counts[next((i for i, b in enumerate(buckets) if value <= b), len(buckets))] += 1
+                self.histograms[(kind, name)] = counts, total + value
+            if self.directory:
+                self._write()
+
+    def _write(self):
+        """Replaces this process's file in the shared directory with its current totals."""
+
+        # Load dependency
+        import json
+
+        path = os.path.join(self.directory, '{}.json'.format(self._pid))
+        state = {'histograms': [[k, n, c, t] for (k, n), (c, t) in self.histograms.items()],
+                 'counters': [[c, r, v] for (c, r), v in self.counters.items()]}
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(path + '.tmp', path)
+
+    def _totals(self):
+        """Returns the histograms and counters of this process, or of every process sharing the directory."""
+
+        # Load dependency
+        import json
+
+        with self._lock:
+            histograms = {k: (list(c), t) for k, (c, t) in self.histograms.items()}
+            counters = dict(self.counters)
+        if not self.directory:
+            return histograms, counters
+
+        histograms, counters = {}, {}
+        for entry in os.listdir(self.directory):
+            if not entry.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, entry)) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for kind, name, counts, total in state['histograms']:
+                before, subtotal = histograms.get((kind, name), ([0] * len(counts), 0.0))
+                histograms[(kind, name)] = [a + b for a, b in zip(before, counts)], subtotal + total
+            for cache, result, count in state['counters']:
+                counters[(cache, result)] = counters.get((cache, result), 0) + count
+        return histograms, counters
+
+    def to_prometheus(self):
+        """Renders the metrics in the Prometheus text exposition format."""
+        histograms, counters = self._totals()
+
+        lines = []
+        for kind, metric, label in [('timing', 'stage_seconds', 'stage'), ('size', 'size', 'name')]:
+            name = '{}_{}'.format(self.prefix, metric)
+            lines += ['# TYPE {} histogram'.format(name)]
+            buckets = self.TIMING_BUCKETS if kind == 'timing' else self.SIZE_BUCKETS
+            for (k, event), (counts, total) in sorted(histograms.items()):
+                if k != kind:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], counts):
+                    cumulative += count
+                    lines.append('{}_bucket{{{}="{}",le="{}"}} {}'.format(name, label, event, bound, cumulative))
+                lines.append('{}_sum{{{}="{}"}} {}'.format(name, label, event, total))
+                lines.append('{}_count{{{}="{}"}} {}'.format(name, label, event, cumulative))
+        name = '{}_cache_requests_total'.format(self.prefix)
+        lines.append('# TYPE {} counter'.format(name))
+        for (cache, result), count in sorted(counters.items()):
+            lines.append('{}{{cache="{}",result="{}"}} {}'.format(name, cache, result, count))
+        return '\n'.join(lines) + '\n'
+
+
+# Column types of the two input tables; columns not listed here are passed through untouched
+SYSTEM_SCHEMA = {'label': 'string', 'type': 'string', 'value': 'float64', 'threat level': 'string',
+                 'x': 'float64', 'y': 'float64', 'z': 'float64', 'description': 'string'}
+SECTOR_SCHEMA = {'source': 'string', 'target': 'string', 'weight': 'float64', 'type': 'string'}
+TABLE_FORMATS = {'.csv': 'csv', '.xls': 'excel', '.xlsx': 'excel',
+                 '.parquet': 'parquet', '.pq': 'parquet',
+                 '.feather': 'feather', '.arrow': 'feather', '.ipc': 'feather',
+                 '.pkl': 'pickle', '.pickle': 'pickle'}
+
+
+def table_format(filename):
+    """Picks the table format from a file name's extension."""
+    ext = os.path.splitext(str(filename))[1].lower()
+    if ext not in TABLE_FORMATS:
+        raise ValueError('Unsupported file type: {}'.format(filename))
+    return TABLE_FORMATS[ext]
+
+
+def apply_schema(df, schema):
+    """Coerces the columns of df named in schema to float64 or to strings (keeping missing values)."""
+
     # Load dependencies
+    import numpy as np
     import pandas as pd
-    import networkx as nx
-    import plotly.graph_objects as go
-    from PIL import Image
-    from IPython.display import HTML
-    
-    # Update data ready for visualization
-    system_data['shape'] = set_color_shape_image(system_data['type'])['shape']
-    system_data['image'] = set_color_shape_image(system_data['type'])['image']
 
-    system_data['description_html'] = wrap_description(system_data['description'])['html']
-        
-    sector_map['color'] = set_edge_color_type(sector_map['type'])['color']
-    sector_map['dashes'] = set_edge_color_type(sector_map['type'])['updbl']
-    
-    # Create networkx graph object from sector_map input
-    G = nx.from_pandas_edgelist(sector_map, 'source', 'target', edge_attr=['weight', 'type', 'color'])
-
-    # Set attributes of astronomical objects
-    if 'x' and 'y' and 'z' in system_data.columns:
-        for _, row in system_data.iterrows():
-            nx.set_node_attributes(G, {row['label']: {'value': row['value'], 
-                                                     'type': row['type'], 
-                                                     'x': row['x']*50, 
-                                                     'y': row['y']*-50, 
-                                                     'z': row['z']*50,
-                                                     'title': row['description_html'], 
-                                                     'shape': row['shape'],
-                                                     'font': {'color': '#8bad6b', 'face': 'Serif'}
-                                                    }})
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'float64':
+            if df[col].dtype != np.float64:
+                df[col] = pd.to_numeric(df[col]).astype(np.float64)
+        elif df[col].dtype != object:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str)).astype(object)
+    return df
+
+
+def _arrow_schema(table, schema):
+    """Casts the schema columns of an Arrow table to float64 and string."""
+
+    # Load dependency
+    import pyarrow as pa
+
+    types = {'float64': pa.float64(), 'string': pa.string()}
+    fields = [pa.field(f.name, types[schema[f.name]]) if f.name in schema else f for f in table.schema]
+    return table.cast(pa.schema(fields))
+
+
+def read_table(source, schema, format=None, allow_pickle=True):
+    """Reads a table from a path, bytes or a file object and types its columns with `schema`.
+
+    Parquet and Feather/Arrow IPC files are memory-mapped when given as a path and read without
+    copying when given as bytes; numeric columns without missing values are then handed to pandas
+    zero-copy. `format` defaults to the one implied by the path's extension (see TABLE_FORMATS).
+    Pickles can run arbitrary code, so untrusted input should pass allow_pickle=False.
+    """
+
+    # Load dependencies
+    import io
+    import pandas as pd
+
+    if format is None:
+        format = table_format(source)
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    if format in ('parquet', 'feather'):
+
+        # Load dependencies
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if isinstance(source, (str, os.PathLike)):
+            data = pa.memory_map(os.fspath(source))
+        elif isinstance(source, io.BytesIO):
+            data = pa.BufferReader(source.getbuffer())
+        else:
+            data = source
+        if format == 'parquet':
+            table = pq.read_table(data)
+        else:
+            table = pa.ipc.open_file(data).read_all()
+        df = _arrow_schema(table, schema).to_pandas(split_blocks=True)
+    elif format == 'csv':
+        df = pd.read_csv(source, dtype={c: object if t == 'string' else t for c, t in schema.items()})
+    elif format == 'excel':
+        df = pd.read_excel(source, dtype={c: object if t == 'string' else t for c, t in schema.items()})
+    elif format == 'pickle':
+        if not allow_pickle:
+            raise ValueError('Reading pickles is disabled')
+        df = pd.read_pickle(source)
     else:
-        for _, row in system_data.iterrows():
-            nx.set_node_attributes(G, {row['label']: {'value': row['value'], 
-                                                     'type': row['type'], 
-                                                     'title': row['description_html'], 
-                                                     'shape': row['shape'],
-                                                     'font': {'color': '#8bad6b', 'face': 'Serif'}
-                                                    }})
-        
-    # Invert edge weights
-    for u, v, data in G.edges(data=True):
-        data['weight'] = 1 / data['weight']
-        
-    # Resize astronomical objects to vaguely resemble relative size of sun and planets
-    # [Note: will not be applicable for all sector sizes, 
-    #        need to set relative sizes based on input features]
-    sizes = []
-    for n in G.nodes:
-        if G.nodes[n]['type']=='Sun':
-            sizes.append(G.nodes[n]['value'] * 2000)
-        else:    
-            sizes.append(G.nodes[n]['value'] * 140000)
-            
-    # If / else statement that extracts layout from data or automatically generates layout
-    if 'x' and 'y' and 'z' in system_data.columns:
-        tmp = [{n:[G.nodes[n]['x'], G.nodes[n]['y'], G.nodes[n]['z']]} for n in G.nodes]
-        pos = {}
-        for d in tmp:
-            pos.update(d)
+        raise ValueError('Unsupported table format: {}'.format(format))
+    return apply_schema(df, schema)
+
+
+def read_system_data(source, format=None, allow_pickle=True):
+    """Reads system data from a csv, Excel, Parquet, Feather/Arrow or pickle file."""
+    return read_table(source, SYSTEM_SCHEMA, format=format, allow_pickle=allow_pickle)
+
+
+def read_sector_map(source, format=None, allow_pickle=True):
+    """Reads a sector map from a csv, Excel, Parquet, Feather/Arrow or pickle file."""
+    return read_table(source, SECTOR_SCHEMA, format=format, allow_pickle=allow_pickle)
+
+
+# Rows per chunk when streaming a table
+CHUNK_ROWS = 1000000
+
+
+def iter_table(source, schema, format=None, chunksize=CHUNK_ROWS, allow_pickle=True):
+    """Reads a table in chunks of at most `chunksize` rows, typing each with `schema` (see read_table).
+
+    CSV is parsed chunk by chunk, Parquet batch by batch and Feather/Arrow record batch by record
+    batch (memory-mapped when given as a path), so only one chunk is held in memory at a time.
+    Excel and pickle files cannot be streamed; they are read whole and then split.
+    """
+
+    # Load dependencies
+    import io
+    import pandas as pd
+
+    if format is None:
+        format = table_format(source)
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    if format in ('parquet', 'feather'):
+
+        # Load dependencies
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if isinstance(source, (str, os.PathLike)):
+            data = pa.memory_map(os.fspath(source))
+        elif isinstance(source, io.BytesIO):
+            data = pa.BufferReader(source.getbuffer())
+        else:
+            data = source
+        if format == 'parquet':
+            batches = pq.ParquetFile(data).iter_batches(batch_size=chunksize)
+        else:
+            reader = pa.ipc.open_file(data)
+            batches = (reader.get_batch(i).slice(start, chunksize) for i in range(reader.num_record_batches)
+                       for start in range(0, reader.get_batch(i).num_rows, chunksize))
+        for batch in batches:
+            yield _arrow_schema(pa.Table.from_batches([batch]), schema).to_pandas(split_blocks=True)
+    elif format == 'csv':
+        for chunk in pd.read_csv(source, dtype={c: object if t == 'string' else t for c, t in schema.items()},
+                                 chunksize=chunksize):
+            yield apply_schema(chunk, schema)
     else:
-        pos = nx.spring_layout(G, dim=3)
-           
-    # Generate colors for astronomical objects
-    colors = []
-    for n in G.nodes: 
-        if G.nodes[n]['type']=='Sun':
-            colors.append(random_yellow_hex())
-        else: 
-            colors.append(random_earthy_hex())
-            
-    # Extract edge colors
-    edge_cols = flatten([[G.edges[edge]['color'], 
-                          G.edges[edge]['color'], 
-                          G.edges[edge]['color']] for edge in G.edges])
-    
-    # Create plotly graph object
-    x_nodes = [G.nodes[n]['x'] for n in G.nodes]
-    y_nodes = [G.nodes[n]['y'] for n in G.nodes]
-    z_nodes = [G.nodes[n]['z'] for n in G.nodes]
-    
-    edge_x = []
-    edge_y = []
-    edge_z = []
-    for edge in G.edges():
-        x0, y0, z0 = pos[edge[0]]
-        x1, y1, z1 = pos[edge[1]]
-        
-        edge_x.extend([x0, x1, None])
-        edge_y.extend([y0, y1, None])
-        edge_z.extend([z0, z1, None])
-        
-    edge_trace = go.Scatter3d(x=edge_x, y=edge_y, z=edge_z,
-                              mode='lines',
-                              line=dict(color=edge_cols,
-                                        width=5),
-                              opacity=0.3,
-                              hoverinfo='none')
-    
-    node_trace = go.Scatter3d(x=x_nodes, y=y_nodes, z=z_nodes,
-                              mode='markers',
-                              marker=dict(size=sizes, 
-                                          color=colors),
-                              hoverinfo='text',
-                              text=["<b>" + str(x) + "</b> (" + str(G.nodes[x]['type']) + ")<br><br>" + G.nodes[x]['title'] for x in G.nodes]
-                              )
+        df = read_table(source, schema, format=format, allow_pickle=allow_pickle)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
 
-    layout = go.Layout(scene=dict(xaxis=dict(visible=False,
-                                             range=[min(x_nodes), max(x_nodes)]),
-                                  yaxis=dict(visible=False,
-                                             range=[min(y_nodes), max(y_nodes)]),
-                                  zaxis=dict(visible=False,
-                                             range=[min(z_nodes), max(z_nodes)])),
-                       paper_bgcolor='rgba(0,0,0,0)',
-                       plot_bgcolor='rgba(0,0,0,0)')
-    
-    fig = go.Figure(data=[edge_trace, node_trace], layout=layout)
-    fig.update(layout_showlegend=False) 
-    fig.update_xaxes(showticklabels=False, showgrid=False, zeroline=False)
-    fig.update_yaxes(showticklabels=False, showgrid=False, zeroline=False)
-    fig.update_layout(autosize=True,
-                      width=None,
-                      height=None,
-                      margin=dict(l=0,r=0,t=0,b=0),
-                      hoverlabel=dict(bgcolor="#000d03",
-                                      font_size=16,
-                                      font_family="Courier New"))
-    
-    # Convert plotly graph object to html and return html object
-    return fig
\ No newline at end of file
+
+def iter_sector_map(source, format=None, chunksize=CHUNK_ROWS, allow_pickle=True):
+    """Streams a sector map in chunks (see iter_table), e.g. for SectorModel.from_chunks."""
+    return iter_table(source, SECTOR_SCHEMA, format=format, chunksize=chunksize, allow_pickle=allow_pickle)
+
+
+def check_sector_chunk(chunk, index, offset=0):
+    """Validates a chunk of a sector map against the body index, returning its route ends as body indices.
+
+    Raises a ValueError for missing columns, and for routes with a missing end, a weight that is
+    missing or not positive (layouts use its inverse) or an unknown body, naming the first offending rows counted from the start of
+    the table (the chunk starting at row `offset`).
+    """
+
+    # Load dependencies
+    import numpy as np
+    import pandas as pd
+
+    missing = [col for col in SECTOR_SCHEMA if col not in chunk.columns]
+    if missing:
+        raise ValueError('Sector map is missing columns: {}'.format(', '.join(missing)))
+
+    def fail(message, bad):
+        rows = offset + np.flatnonzero(bad)[:10]
+        raise ValueError('{} (rows {})'.format(message, ', '.join(map(str, rows))))
+
+    ends = chunk['source'].isna().to_numpy() | chunk['target'].isna().to_numpy()
+    if ends.any():
+        fail('Sector map has routes without a source or target', ends)
+    weight = chunk['weight'].to_numpy(dtype=np.float64)
+    if not (weight > 0).all():
+        fail('Sector map has routes with a missing, zero or negative weight', ~(weight > 0))
+    source = index.get_indexer(chunk['source'])
+    target = index.get_indexer(chunk['target'])
+    if ((source < 0) | (target < 0)).any():
+        unknown = pd.unique(np.concatenate([chunk['source'].to_numpy()[source < 0], chunk['target'].to_numpy()[target < 0]]))
+        fail('Sector map refers to bodies missing from the system data: {}'.format(', '.join(map(str, unknown[:10]))),
+             (source < 0) | (target < 0))
+    return source, target
+
+
+def read_sector(system_source, sector_source, format=None, chunksize=CHUNK_ROWS, seed=DEFAULT_SEED,
+                allow_pickle=True):
+    """Reads system data whole and streams the sector map into a styled SectorModel (see SectorModel.from_chunks).
+
+    `format` applies to the sector map; the system data's format follows its extension.
+    """
+    system_data = read_system_data(system_source, allow_pickle=allow_pickle)
+    chunks = iter_sector_map(sector_source, format=format, chunksize=chunksize, allow_pickle=allow_pickle)
+    return SectorModel.from_chunks(system_data, chunks, seed=seed)
+
+
+CACHE_DIR = os.environ.get('DYNAMICSECTOR_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'dynamicsector'))
+
+
+def content_hash(*parts):
+    """Hashes strings, bytes, NumPy arrays and plain values into a short, stable hex digest."""
+
+    # Load dependencies
+    import hashlib
+    import numpy as np
+
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, np.ndarray) and part.dtype != object:
+            h.update(str((part.dtype.str, part.shape)).encode())
+            h.update(np.ascontiguousarray(part).tobytes())
+        elif isinstance(part, np.ndarray):
+            h.update('\x1f'.join(map(str, part.tolist())).encode())
+        elif isinstance(part, bytes):
+            h.update(part)
+        else:
+            h.update(repr(part).encode())
+        h.update(b'\x1e')
+    return h.hexdigest()
+
+
+class TieredCache(object):
+    """Content-addressed cache with an in-memory LRU tier in front of a size-bounded on-disk tier.
+
+    Values are converted to bytes with `dumps` / `loads` for the disk tier, which lives under
+    CACHE_DIR/<name> and can be shared by several processes. Files are written atomically and the
+    least recently used ones are evicted once the directory grows past `max_bytes`. With `ttl`,
+    entries that have not been used for that many seconds expire from both tiers.
+    """
+
+    def __init__(self, name, dumps, loads, max_items=32, max_bytes=256 * 2**20, directory=None, ttl=None):
+        from collections import OrderedDict
+        from threading import Lock
+
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._used = {}
+        self._lock = Lock()
+
+    def __getstate__(self):
+
+        # Only the settings travel to other processes, which start with an empty memory tier
+        state = self.__dict__.copy()
+        state.update(_memory=None, _used=None, _lock=None)
+        return state
+
+    def __setstate__(self, state):
+        from collections import OrderedDict
+        from threading import Lock
+
+        self.__dict__.update(state)
+        self._memory = OrderedDict()
+        self._used = {}
+        self._lock = Lock()
+
+    @property
+    def path(self):
+        return self.directory or os.path.join(CACHE_DIR, self.name)
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.bin')
+
+    def get(self, key, default=None, label=None):
+        """Returns the cached value for key, promoting shared-tier hits into memory.
+
+        Observers see the lookup as a cache event named `label`, the cache's own name by default;
+        bookkeeping reads pass their own label so they do not count towards the cache's hit rate.
+        """
+        label = label or self.name
+        with self._lock:
+            if key in self._memory:
+                if self.ttl is None or time.time() - self._used[key] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self._used[key] = time.time()
+                    if OBSERVERS:
+                        notify('cache', label, True)
+                    return self._memory[key]
+                del self._memory[key], self._used[key]
+
+        # Fall back to the shared tier
+        try:
+            data = self._load(key)
+            value = self.loads(data) if data is not None else None
+        except (OSError, ValueError):
+            value = None
+        if OBSERVERS:
+            notify('cache', label, value is not None)
+        if value is None:
+            return default
+        self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        """Stores value under key in both tiers."""
+        self._remember(key, value)
+        if self.max_bytes <= 0:
+            return
+        try:
+            self._store(key, self.dumps(value))
+        except OSError:
+            pass
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._memory:
+                return True
+        return self._exists(key)
+
+    def clear(self):
+        """Empties both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._used.clear()
+        for entry in self._entries():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._used[key] = time.time()
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                del self._used[self._memory.popitem(last=False)[0]]
+
+    # The shared tier: files under `path`, marked as recently used on every read
+    def _load(self, key):
+        path = self._file(key)
+        if self.ttl is not None and time.time() - os.stat(path).st_mtime > self.ttl:
+            os.remove(path)
+            return None
+        with open(path, 'rb') as f:
+            data = f.read()
+        os.utime(path)
+        return data
+
+    def _store(self, key, data):
+
+        # Write to a temporary file first so other processes never see a partial entry
+        os.makedirs(self.path, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self._file(key))
+        self._evict()
+
+    def _exists(self, key):
+        return os.path.exists(self._file(key))
+
+    def _entries(self):
+        try:
+            return [e for e in os.scandir(self.path) if e.name.endswith('.bin')]
+        except OSError:
+            return []
+
+    def _evict(self):
+        entries = []
+        for e in self._entries():
+            try:
+                entries.append((e.stat().st_mtime, e.stat().st_size, e.path))
+            except OSError:
+                pass
+        total = sum(size for _, size, _ in entries)
+        expired = time.time() - self.ttl if self.ttl is not None else -1
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes and mtime >= expired:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+class RedisCache(TieredCache):
+    """TieredCache whose shared tier is a Redis-compatible server instead of a local directory.
+
+    Entries live under '<name>:<key>' and expire after `ttl` seconds without use; size bounds are
+    left to the server's own eviction policy.
+    """
+
+    def __init__(self, name, dumps, loads, url, max_items=32, ttl=None):
+        super(RedisCache, self).__init__(name, dumps, loads, max_items=max_items, max_bytes=1, ttl=ttl)
+        self.url = url
+        self._client = None
+
+    def __getstate__(self):
+        state = super(RedisCache, self).__getstate__()
+        state['_client'] = None
+        return state
+
+    @property
+    def client(self):
+        if self._client is None:
+
+            # Load dependency
+            import redis
+
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def _call(self, method, *args, **kwargs):
+
+        # Load dependency
+        import redis
+
+        # Connection problems surface as OSError, like a failing disk tier would
+        try:
+            return getattr(self.client, method)(*args, **kwargs)
+        except redis.exceptions.RedisError as e:
+            raise OSError(str(e))
+
+    def _load(self, key):
+        name = '{}:{}'.format(self.name, key)
+        data = self._call('get', name)
+        if data is not None and self.ttl is not None:
+            self._call('expire', name, int(self.ttl))
+        return data
+
+    def _store(self, key, data):
+        self._call('set', '{}:{}'.format(self.name, key), data, ex=int(self.ttl) if self.ttl is not None else None)
+
+    def _exists(self, key):
+        try:
+            return bool(self._call('exists', '{}:{}'.format(self.name, key)))
+        except OSError:
+            return False
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._used.clear()
+        for name in self._call('keys', '{}:*'.format(self.name)):
+            self._call('delete', name)
+
+
+def _array_dumps(array):
+    """Serializes a NumPy array to .npy bytes."""
+
+    # Load dependencies
+    import io
+    import numpy as np
+
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def _array_loads(data):
+    """Deserializes .npy bytes written by _array_dumps."""
+
+    # Load dependencies
+    import io
+    import numpy as np
+
+    return np.load(io.BytesIO(data), allow_pickle=False)
+
+
+# Layouts are keyed by the sector topology, so unchanged sectors get their positions back instantly
+layout_cache = TieredCache('layout', _array_dumps, _array_loads)
+
+
+def _json_dumps(value):
+    """Serializes plain JSON-compatible values to UTF-8 bytes."""
+
+    # Load dependency
+    import json
+
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def _json_loads(data):
+    """Deserializes bytes written by _json_dumps."""
+
+    # Load dependency
+    import json
+
+    return json.loads(data.decode('utf-8'))
+
+
+def frame_dumps(df):
+    """Serializes a data frame to Arrow IPC (Feather) bytes."""
+
+    # Load dependencies
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    df = df.reset_index(drop=True)
+    buffer = pa.BufferOutputStream()
+    try:
+        feather.write_feather(df, buffer)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+
+        # Columns mixing strings and numbers are stored as strings
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        buffer = pa.BufferOutputStream()
+        feather.write_feather(df, buffer)
+    return buffer.getvalue().to_pybytes()
+
+
+def frame_loads(data):
+    """Deserializes bytes written by frame_dumps, without copying numeric columns."""
+
+    # Load dependency
+    import pyarrow as pa
+
+    return pa.ipc.open_file(pa.BufferReader(data)).read_all().to_pandas(split_blocks=True)
+
+
+# Rendered figures are keyed by the sector content and render options, shared by every worker;
+# bump RENDER_VERSION whenever renders change, so stale figures and jobs are not served
+RENDER_VERSION = 'render-v9'
+render_cache = TieredCache('render', _json_dumps, _json_loads, max_items=8, max_bytes=512 * 2**20)
+
+
+class SectorModel(object):
+    """Compact, array-backed sector: node and edge columns in NumPy, a label index and CSR adjacency.
+
+    Built once from the system data and sector map, it feeds the pyvis and plotly renderers directly;
+    a NetworkX graph is only constructed when asked for via `to_networkx`.
+    """
+
+    def __init__(self, nodes, edges, adjacency=None):
+
+        # Load dependencies
+        import numpy as np
+        import pandas as pd
+
+        self.nodes = nodes
+        self.edges = edges
+        self.index = pd.Index(nodes['label'])
+        if adjacency is not None:
+            self.indptr, self.indices, self.edge_ids = adjacency
+            return
+
+        # Undirected CSR adjacency: every edge appears once from each end
+        n = len(self.index)
+        heads = np.concatenate([edges['source'], edges['target']])
+        tails = np.concatenate([edges['target'], edges['source']])
+        order = np.argsort(heads, kind='stable')
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(heads, minlength=n), out=self.indptr[1:])
+        self.indices = tails[order].astype(np.int32)
+        self.edge_ids = (order % max(len(edges['source']), 1)).astype(np.int32)
+
+    @classmethod
+    def from_frames(cls, system_data, sector_map, seed=DEFAULT_SEED):
+        """Builds a styled SectorModel from system data and sector map data frames."""
+
+        # Load dependencies
+        import numpy as np
+        import pandas as pd
+
+        # Later rows win for duplicated bodies, as they would in a NetworkX graph
+        system_data = system_data.drop_duplicates('label', keep='last')
+        index = pd.Index(system_data['label'])
+
+        # Map route endpoints onto body indices, refusing routes to unknown bodies or without a usable weight
+        source, target = check_sector_chunk(sector_map, index)
+
+        # Collapse repeated routes between the same pair of bodies, keeping the last one
+        pair = np.minimum(source, target).astype(np.int64) * len(index) + np.maximum(source, target)
+        keep = np.sort(len(pair) - 1 - np.unique(pair[::-1], return_index=True)[1])
+
+        style = style_sector(system_data, sector_map.iloc[keep], seed=seed)
+        nodes = cls._node_columns(system_data, style['nodes'])
+        edges = {'source': source[keep].astype(np.int32),
+                 'target': target[keep].astype(np.int32),
+                 'weight': sector_map['weight'].to_numpy(dtype=np.float64)[keep],
+                 'type': sector_map['type'].to_numpy(dtype=object)[keep],
+                 'color': style['edges']['color'],
+                 'dashes': style['edges']['dashes']}
+
+        return cls(nodes, edges)
+
+    @classmethod
+    def from_chunks(cls, system_data, chunks, seed=DEFAULT_SEED):
+        """Builds a styled SectorModel from system data and sector map chunks (e.g. from iter_sector_map).
+
+        Each chunk is validated (see check_sector_chunk) and reduced to body indices, weights and
+        route type codes before the next one is read, so the sector map is never held as a data
+        frame, and the result matches from_frames on the whole table.
+        """
+
+        # Load dependencies
+        import numpy as np
+        import pandas as pd
+
+        system_data = system_data.drop_duplicates('label', keep='last')
+        index = pd.Index(system_data['label'])
+
+        # Keep compact columns per chunk, numbering route types as they appear
+        source, target, weight, codes = [], [], [], []
+        kinds = {}
+        offset = 0
+        for chunk in chunks:
+            with timed('ingest_chunk'):
+                s, t = check_sector_chunk(chunk, index, offset)
+                source.append(s.astype(np.int32))
+                target.append(t.astype(np.int32))
+                weight.append(chunk['weight'].to_numpy(dtype=np.float64))
+                c, uniques = pd.factorize(chunk['type'])
+                lookup = np.array([kinds.setdefault(u, len(kinds)) for u in uniques] + [-1], dtype=np.int32)
+                codes.append(lookup[c])
+                offset += len(chunk)
+        if OBSERVERS:
+            notify('size', 'ingest_rows', offset)
+        source, target, weight, codes = [np.concatenate(part) if part else np.zeros(0, dtype)
+                                         for part, dtype in [(source, np.int32), (target, np.int32),
+                                                             (weight, np.float64), (codes, np.int32)]]
+
+        # Collapse repeated routes between the same pair of bodies, keeping the last one
+        pair = np.minimum(source, target).astype(np.int64) * len(index) + np.maximum(source, target)
+        keep = np.sort(len(pair) - 1 - np.unique(pair[::-1], return_index=True)[1])
+        del pair
+
+        # Style each route type once; routes without a type are hidden, as in style_edges
+        types = np.array(list(kinds) + [None], dtype=object)
+        style = style_edges(types[:-1])
+        codes = codes[keep]
+        edges = {'source': source[keep],
+                 'target': target[keep],
+                 'weight': weight[keep],
+                 'type': types[codes],
+                 'color': np.append(style['color'], HIDDEN).astype(object)[codes],
+                 'dashes': np.append(style['dashes'], False)[codes]}
+
+        nodes = style_nodes(system_data['type'], seed=seed, labels=system_data['label'])
+        nodes.update(wrap_description(system_data['description']))
+        return cls(cls._node_columns(system_data, nodes), edges)
+
+    @staticmethod
+    def _node_columns(system_data, style):
+        """Collects the node columns of a SectorModel from deduplicated system data and its node styling."""
+
+        # Load dependency
+        import numpy as np
+
+        nodes = {'label': system_data['label'].to_numpy(dtype=object),
+                 'type': system_data['type'].to_numpy(dtype=object),
+                 'value': system_data['value'].to_numpy(dtype=np.float64),
+                 'color': style['color'],
+                 'fill': style['fill'],
+                 'shape': style['shape'],
+                 'image': style['image'],
+                 'description_md': style['md'],
+                 'description_html': style['html']}
+        for col in ['threat level', 'description']:
+            if col in system_data.columns:
+                nodes[col] = system_data[col].to_numpy(dtype=object)
+        for col in ['x', 'y', 'z']:
+            if col in system_data.columns:
+                nodes[col] = system_data[col].to_numpy(dtype=np.float64)
+        return nodes
+
+    @property
+    def n_nodes(self):
+        return len(self.index)
+
+    @property
+    def n_edges(self):
+        return len(self.edges['source'])
+
+    def index_of(self, labels):
+        """Returns the node indices of the given labels, raising a KeyError for unknown bodies."""
+        idx = self.index.get_indexer(labels)
+        if (idx < 0).any():
+            raise KeyError('Unknown bodies: {}'.format(', '.join(str(l) for l, i in zip(labels, idx) if i < 0)))
+        return idx
+
+    def neighbors(self, i):
+        """Returns the indices of the bodies directly connected to body i."""
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def has_coordinates(self, dim):
+        """Checks whether every body has coordinates for the first `dim` axes."""
+
+        # Load dependency
+        import numpy as np
+
+        axes = ['x', 'y', 'z'][:dim]
+        return all(a in self.nodes and not np.isnan(self.nodes[a]).any() for a in axes)
+
+    def positions(self, dim):
+        """Returns an (n_nodes, dim) array of body coordinates."""
+
+        # Load dependency
+        import numpy as np
+
+        return np.column_stack([self.nodes[a] for a in ['x', 'y', 'z'][:dim]])
+
+    def set_positions(self, pos):
+        """Writes an (n_nodes, dim) array of coordinates back onto the bodies."""
+        for i, a in enumerate(['x', 'y', 'z'][:pos.shape[1]]):
+            self.nodes[a] = pos[:, i].astype(float)
+
+    def to_networkx(self):
+        """Builds a NetworkX graph carrying the node and edge attributes of the sector."""
+
+        # Load dependency
+        import networkx as nx
+
+        G = nx.Graph()
+        labels = self.nodes['label']
+        node_cols = [c for c in self.nodes if c != 'label']
+        G.add_nodes_from(zip(labels, ({c: v for c, v in zip(node_cols, row)}
+                                      for row in zip(*(self.nodes[c].tolist() for c in node_cols)))))
+        edge_cols = ['weight', 'type', 'color', 'dashes']
+        G.add_edges_from(zip(labels[self.edges['source']], labels[self.edges['target']],
+                             ({c: v for c, v in zip(edge_cols, row)}
+                              for row in zip(*(self.edges[c].tolist() for c in edge_cols)))))
+        return G
+
+
+def connected_components(n, source, target):
+    """Labels the connected components of an undirected edge list over n nodes.
+
+    Returns an array mapping each node to a component id numbered 0..k-1 in order of each
+    component's lowest node index.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    # Hook the larger root of every edge onto the smaller one, then jump pointers to the roots
+    label = np.arange(n)
+    source = np.asarray(source, dtype=np.int64)
+    target = np.asarray(target, dtype=np.int64)
+    while True:
+        ls, lt = label[source], label[target]
+        split = ls != lt
+        if not split.any():
+            break
+        lo = np.minimum(ls[split], lt[split])
+        hi = np.maximum(ls[split], lt[split])
+        order = np.lexsort((lo, hi))
+        hi, lo = hi[order], lo[order]
+        first = np.r_[True, hi[1:] != hi[:-1]]
+        label[hi[first]] = np.minimum(label[hi[first]], lo[first])
+        while True:
+            jumped = label[label]
+            if (jumped == label).all():
+                break
+            label = jumped
+    return np.unique(label, return_inverse=True)[1]
+
+
+def rescale_layout(pos, scale=1):
+    """Centers a layout on the origin and scales it so the largest coordinate is `scale`, as NetworkX does."""
+    pos = pos - pos.mean(axis=0)
+    extent = abs(pos).max()
+    return pos * (scale / extent) if extent > 0 else pos
+
+
+def _morton_tree(pos, mass, levels):
+    """Builds a linear octree (a quadtree in 2D) over pos by sorting bodies on their Morton codes.
+
+    Each level lists its occupied cells as contiguous runs of the sorted bodies, with their total mass,
+    centre of mass and the range of their children on the next level.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    n, dim = pos.shape
+    lo = pos.min(axis=0)
+    span = float((pos.max(axis=0) - lo).max()) or 1.0
+    span *= 1 + 1e-9
+
+    # Interleave the bits of the quantized coordinates
+    q = np.minimum(((pos - lo) / span * (1 << levels)).astype(np.int64), (1 << levels) - 1)
+    codes = np.zeros(n, dtype=np.int64)
+    for b in range(levels):
+        for a in range(dim):
+            codes |= ((q[:, a] >> b) & 1) << (b * dim + a)
+    order = np.argsort(codes, kind='stable')
+    codes = codes[order]
+    spos = pos[order]
+    smass = mass[order]
+
+    tree = []
+    for level in range(levels + 1):
+        keys = codes >> (dim * (levels - level))
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        counts = np.diff(np.r_[starts, n])
+        cell_mass = np.add.reduceat(smass, starts)
+        tree.append({'key': keys[starts],
+                     'start': starts,
+                     'count': counts,
+                     'mass': cell_mass,
+                     'centroid': np.add.reduceat(spos * smass[:, None], starts, axis=0) / cell_mass[:, None],
+                     'member': np.repeat(np.arange(len(starts)), counts),
+                     'size2': (span / (1 << level)) ** 2})
+    for level in range(levels):
+        child = tree[level + 1]['key']
+        tree[level]['child_start'] = np.searchsorted(child, tree[level]['key'] << dim)
+        tree[level]['child_end'] = np.searchsorted(child, (tree[level]['key'] + 1) << dim)
+    return order, spos, smass, tree
+
+
+def _children(cells, parent):
+    """Returns the number of children of each parent cell and the flattened child indices."""
+
+    # Load dependency
+    import numpy as np
+
+    first = cells['child_start'][parent]
+    n_children = cells['child_end'][parent] - first
+    return n_children, np.repeat(first, n_children) + (np.arange(n_children.sum()) - np.repeat(np.cumsum(n_children) - n_children, n_children))
+
+
+def _tree_walk(spos, smass, tree, k2, theta, force, p_body, p_cell, level, query=None):
+    """Accumulates the repulsion on individual bodies from a frontier of (body, cell) pairs on `level`.
+
+    The walk is vectorized over pairs one tree level at a time: a cell is accepted as a point mass
+    once its width is below `theta` times its distance, and opened otherwise. Bodies sharing a cell
+    on the finest level repel each other exactly. With `query`, p_body indexes those positions
+    instead, for points that are not themselves in the tree.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    n, dim = force.shape
+    levels = len(tree) - 1
+    for level in range(level, levels + 1):
+        if not len(p_body):
+            break
+        cells = tree[level]
+        delta = (spos if query is None else query)[p_body] - cells['centroid'][p_cell]
+        d2 = (delta * delta).sum(axis=1)
+        if query is None:
+            contains = cells['member'][p_body] == p_cell
+        else:
+            contains = np.zeros(len(p_body), dtype=bool)
+        if level == levels:
+            accept = ~contains
+        else:
+            accept = ~contains & (cells['size2'] < theta * theta * d2)
+        w = k2 * cells['mass'][p_cell[accept]] / np.maximum(d2[accept], 1e-4)
+        for a in range(dim):
+            force[:, a] += np.bincount(p_body[accept], weights=delta[accept, a] * w, minlength=n)
+
+        if level == levels:
+            # Bodies that share a finest cell interact directly
+            shared = contains & (cells['count'][p_cell] > 1)
+            count = cells['count'][p_cell[shared]]
+            body = np.repeat(p_body[shared], count)
+            other = np.repeat(cells['start'][p_cell[shared]], count) + (np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count))
+            body, other = body[body != other], other[body != other]
+            delta = spos[body] - spos[other]
+            w = k2 * smass[other] / np.maximum((delta * delta).sum(axis=1), 1e-4)
+            for a in range(dim):
+                force[:, a] += np.bincount(body, weights=delta[:, a] * w, minlength=n)
+            break
+
+        # Open every rejected cell that is not just the body itself
+        opened = ~accept & ~(contains & (cells['count'][p_cell] == 1))
+        n_children, p_cell = _children(cells, p_cell[opened])
+        p_body = np.repeat(p_body[opened], n_children)
+
+
+def _barnes_hut_repulsion(spos, smass, tree, k2, theta, group_size=32, chunk=2**21):
+    """Approximates the pairwise repulsion on every (Morton-sorted) body with a Barnes-Hut tree walk.
+
+    Bodies are walked in groups (the first tree level averaging at most `group_size` bodies per
+    cell): far cells act on a whole group through a first-order expansion about the group's centre,
+    and only the cells too close for that are walked body by body via _tree_walk.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    n, dim = spos.shape
+    levels = len(tree) - 1
+    g = next((level for level in range(levels + 1) if tree[level]['count'].mean() <= group_size), levels)
+    groups = tree[g]
+    n_groups = len(groups['key'])
+    offset = spos - groups['centroid'][groups['member']]
+    radius = np.sqrt(np.maximum.reduceat((offset * offset).sum(axis=1), groups['start']))
+
+    # Far field: force and its Jacobian at each group centre
+    field = np.zeros((n_groups, dim))
+    jacobian = np.zeros((n_groups, dim, dim))
+    p_group = np.arange(n_groups)
+    p_cell = np.zeros(n_groups, dtype=np.int64)
+    for level in range(g + 1):
+        cells = tree[level]
+        ancestor = np.searchsorted(cells['key'], groups['key'] >> (dim * (g - level)))
+        delta = groups['centroid'][p_group] - cells['centroid'][p_cell]
+        d2 = (delta * delta).sum(axis=1)
+        accept = (ancestor[p_group] != p_cell) & ((np.sqrt(cells['size2']) + radius[p_group]) ** 2 < theta * theta * d2)
+        group, delta, d2 = p_group[accept], delta[accept], np.maximum(d2[accept], 1e-4)
+        m = k2 * cells['mass'][p_cell[accept]] / d2
+        for a in range(dim):
+            field[:, a] += np.bincount(group, weights=delta[:, a] * m, minlength=n_groups)
+            for b in range(dim):
+                jacobian[:, a, b] += np.bincount(group, weights=(a == b) * m - 2 * m * delta[:, a] * delta[:, b] / d2, minlength=n_groups)
+        if level == g:
+            break
+        n_children, p_cell = _children(cells, p_cell[~accept])
+        p_group = np.repeat(p_group[~accept], n_children)
+
+    # Near field: walk the remaining pairs body by body, a block of bodies at a time
+    near_group, near_cell = p_group[~accept], p_cell[~accept]
+    count = groups['count'][near_group]
+    bounds = np.searchsorted(np.cumsum(count), np.arange(chunk, count.sum() + chunk, chunk), side='right')
+    force = np.zeros((n, dim))
+    for lo, hi in zip(np.r_[0, bounds[:-1]], bounds):
+        c = count[lo:hi]
+        body = np.repeat(groups['start'][near_group[lo:hi]], c) + (np.arange(c.sum()) - np.repeat(np.cumsum(c) - c, c))
+        _tree_walk(spos, smass, tree, k2, theta, force, body, np.repeat(near_cell[lo:hi], c), g)
+
+    member = groups['member']
+    return force + field[member] + np.einsum('nab,nb->na', jacobian[member], offset)
+
+
+def force_directed_layout(n, source, target, strength, pos, mass=None, fixed=None, iterations=50, tol=1e-4,
+                          theta=1.0, temperature=0.1):
+    """Runs a Fruchterman-Reingold layout with Barnes-Hut repulsion over an edge list.
+
+    Mirrors NetworkX's spring_layout (optimal distance k = 1/sqrt(n), linear cooling from
+    `temperature` times the layout width, stopping once the mean displacement drops below `tol`,
+    bodies flagged in `fixed` staying put) but never forms the dense n x n distance matrix.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    dim = pos.shape[1]
+    pos = pos.astype(np.float64, copy=True)
+    mass = np.ones(n) if mass is None else np.asarray(mass, dtype=np.float64)
+    if n < 2:
+        return pos
+
+    k = np.sqrt(1.0 / mass.sum())
+    levels = int(min(62 // dim, max(2, np.ceil(np.log2(n) / dim) + 2)))
+    t = max(float((pos.max(axis=0) - pos.min(axis=0)).max()) * temperature, 1e-3)
+    dt = t / (iterations + 1)
+
+    for _ in range(iterations):
+
+        # Repulsion between all bodies, approximated through the tree
+        order, spos, smass, tree = _morton_tree(pos, mass, levels)
+        displacement = np.empty_like(pos)
+        displacement[order] = _barnes_hut_repulsion(spos, smass, tree, k * k, theta)
+
+        # Attraction along routes, stronger for shorter routes
+        delta = pos[source] - pos[target]
+        distance = np.maximum(np.sqrt((delta * delta).sum(axis=1)), 0.01)
+        pull = delta * (strength * distance / k)[:, None]
+        for a in range(dim):
+            displacement[:, a] += np.bincount(target, weights=pull[:, a], minlength=n) - np.bincount(source, weights=pull[:, a], minlength=n)
+
+        # Cap each step by the current temperature
+        length = np.sqrt((displacement * displacement).sum(axis=1))
+        length = np.where(length < 0.01, 0.1, length)
+        step = displacement * (t / length)[:, None]
+        if fixed is not None:
+            step[fixed] = 0
+        pos += step
+        t -= dt
+        if np.linalg.norm(step) / n < tol:
+            break
+    return pos
+
+
+def _coarsen(n, source, target, strength):
+    """Merges each body with its mutual strongest neighbour and absorbs single-route bodies into their neighbour.
+
+    Returns the cluster id of every body plus the aggregated coarse edge list.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    if not len(source):
+        return np.arange(n), source, target, strength
+
+    # Strongest neighbour of every body
+    heads = np.concatenate([source, target])
+    tails = np.concatenate([target, source])
+    weights = np.concatenate([strength, strength])
+    order = np.lexsort((-weights, heads))
+    first = np.flatnonzero(np.r_[True, heads[order][1:] != heads[order][:-1]])
+    best = np.arange(n)
+    best[heads[order][first]] = tails[order][first]
+    degree = np.bincount(heads, minlength=n)
+
+    # Pair up mutual choices and pull leaves onto whatever they hang off
+    body = np.arange(n)
+    merge = (best[best] == body) | (degree == 1)
+    cluster = connected_components(n, body[merge], best[merge])
+
+    # Aggregate routes between clusters, dropping those that fall inside one
+    cs, ct = cluster[source], cluster[target]
+    outer = cs != ct
+    lo, hi = np.minimum(cs[outer], ct[outer]), np.maximum(cs[outer], ct[outer])
+    m = cluster.max() + 1
+    pairs, inverse = np.unique(lo.astype(np.int64) * m + hi, return_inverse=True)
+    return cluster, pairs // m, pairs % m, np.bincount(inverse, weights=strength[outer], minlength=len(pairs))
+
+
+def multilevel_layout(n, source, target, strength, dim, seed=DEFAULT_SEED, mass=None, iterations=50, tol=1e-4,
+                      theta=1.0, multilevel=True, refine=5):
+    """Lays out an edge list over n bodies with the Barnes-Hut engine, returning rescaled positions.
+
+    With `multilevel`, the graph is first coarsened (merging strongly linked bodies, such as
+    planets onto their sun) until it is small, laid out from the coarsest level up, and each finer
+    level is warm-started from the one above, which needs far fewer iterations than a cold start.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    source = np.asarray(source, dtype=np.int64)
+    target = np.asarray(target, dtype=np.int64)
+    mass = np.ones(n) if mass is None else np.asarray(mass, dtype=np.float64)
+
+    # Build the hierarchy of coarsened graphs
+    hierarchy = []
+    while multilevel and n > 1000:
+        cluster, c_source, c_target, c_strength = _coarsen(n, source, target, strength)
+        if cluster.max() + 1 > 0.9 * n:
+            break
+        hierarchy.append((source, target, strength, mass, cluster))
+        n, source, target, strength = cluster.max() + 1, c_source, c_target, c_strength
+        mass = np.bincount(cluster, weights=mass)
+
+    # Lay out the coarsest graph from a random start, then refine level by level with a
+    # fraction of the iteration budget, since each level starts close to its final shape
+    pos = force_directed_layout(n, source, target, strength, rng.random((n, dim)), mass=mass,
+                                iterations=iterations, tol=tol, theta=theta)
+    for source, target, strength, mass, cluster in reversed(hierarchy):
+        spread = 0.1 * np.sqrt(1.0 / len(cluster))
+        pos = pos[cluster] + rng.normal(scale=spread, size=(len(cluster), dim))
+        pos = force_directed_layout(len(cluster), source, target, strength, pos, mass=mass,
+                                    iterations=max(iterations // refine, 1), tol=tol, theta=theta,
+                                    temperature=0.02)
+    return rescale_layout(pos)
+
+
+def barnes_hut_layout(model, dim, seed=DEFAULT_SEED, iterations=50, tol=1e-4, theta=1.0, multilevel=True, refine=5):
+    """Lays out the sector with the Barnes-Hut force-directed engine, built on NumPy and the edge arrays."""
+    return multilevel_layout(model.n_nodes, model.edges['source'], model.edges['target'], 1 / model.edges['weight'],
+                             dim, seed=seed, iterations=iterations, tol=tol, theta=theta,
+                             multilevel=multilevel, refine=refine)
+
+
+def in_system_mask(type_vector):
+    """Flags 'In-System' routes, tolerating differences in case, spacing and hyphenation."""
+
+    # Load dependencies
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(pd.Series(type_vector))
+    flags = np.array([''.join(c for c in str(t).lower() if c.isalpha()) == 'insystem' for t in uniques] + [False])
+    return flags[codes]
+
+
+def star_systems(model):
+    """Groups bodies into star systems: the connected components of the In-System routes."""
+    inner = in_system_mask(model.edges['type'])
+    return connected_components(model.n_nodes, model.edges['source'][inner], model.edges['target'][inner])
+
+
+def _layout_small_systems(dim, iterations, pos, valid, fixed, adjacency):
+    """Lays out a stack of small star systems at once with dense Fruchterman-Reingold updates.
+
+    pos is (systems, width, dim), padded to a common width with bodies masked out by `valid`; suns
+    flagged in `fixed` stay put. Returns each system centred on its sun (or its mean, if it has
+    none) and scaled to unit radius.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    n = valid.sum(axis=1)
+    k = np.sqrt(1.0 / n)[:, None, None]
+    repel = valid[:, None, :] * k * k
+    pull = adjacency / k
+    t = 0.1
+    dt = t / (iterations + 1)
+    for _ in range(iterations):
+
+        # Pairwise distances and displacements through batched matrix products
+        norm = (pos * pos).sum(axis=-1)
+        d2 = np.maximum(norm[:, :, None] + norm[:, None, :] - 2 * np.matmul(pos, pos.transpose(0, 2, 1)), 1e-4)
+        weight = repel / d2 - pull * np.sqrt(d2)
+        displacement = pos * weight.sum(axis=2)[..., None] - np.matmul(weight, pos)
+        length = np.sqrt(np.einsum('sik,sik->si', displacement, displacement))
+        length = np.where(length < 0.01, 0.1, length)
+        step = displacement * (t / length)[..., None]
+        step[fixed | ~valid] = 0
+        pos = pos + step
+        t -= dt
+
+    has_sun = fixed.any(axis=1)
+    centre = np.where(has_sun[:, None], (pos * fixed[..., None]).sum(axis=1),
+                      (pos * valid[..., None]).sum(axis=1) / n[:, None])
+    pos = (pos - centre[:, None, :]) * valid[..., None]
+    radius = np.sqrt((pos * pos).sum(axis=-1)).max(axis=1)
+    return pos / np.where(radius > 0, radius, 1)[:, None, None]
+
+
+def _layout_large_system(dim, iterations, tol, theta, n, source, target, strength, sun, seed):
+    """Lays out one large star system around its sun with the Barnes-Hut engine, scaled to unit radius."""
+
+    # Load dependency
+    import numpy as np
+
+    pos = np.random.default_rng(seed).random((n, dim))
+    fixed = None
+    if sun >= 0:
+        pos[sun] = 0.5
+        fixed = np.arange(n) == sun
+    pos = force_directed_layout(n, source, target, strength, pos, fixed=fixed,
+                                iterations=iterations, tol=tol, theta=theta)
+    pos -= pos[sun] if sun >= 0 else pos.mean(axis=0)
+    radius = np.sqrt((pos * pos).sum(axis=1)).max()
+    return pos / radius if radius > 0 else pos
+
+
+def _run_job(job):
+    """Calls job[0] with the remaining items as arguments, so jobs can be shipped to worker processes."""
+    return job[0](*job[1:])
+
+
+def hierarchical_layout(model, dim, seed=DEFAULT_SEED, iterations=50, tol=1e-4, theta=1.0, system_scale=0.3,
+                        processes=None, parallel_threshold=20000, max_dense=64):
+    """Lays out the sector in two levels: star systems first, then each system's planets around its sun.
+
+    Star systems are the components of the In-System routes. The inter-system graph (one body per
+    system, joined by the Regular and Unpredictable routes) is laid out with the Barnes-Hut engine;
+    every system is then laid out locally and placed at its system's position, scaled to
+    `system_scale` times the typical spacing between systems. Systems of up to `max_dense` bodies
+    are stacked and laid out together with dense updates, larger ones one at a time with the
+    Barnes-Hut engine. Local layouts run across a pool of `processes` worker processes (all cores
+    by default) once the sector has `parallel_threshold` bodies.
+    """
+
+    # Load dependencies
+    import numpy as np
+    from concurrent.futures import ProcessPoolExecutor
+
+    n = model.n_nodes
+    source = model.edges['source'].astype(np.int64)
+    target = model.edges['target'].astype(np.int64)
+    strength = 1 / model.edges['weight']
+    inner = in_system_mask(model.edges['type'])
+    system = star_systems(model)
+    n_systems = system.max() + 1 if n else 0
+    if n_systems == 0:
+        return np.zeros((0, dim))
+
+    # Lay out the systems, merging parallel routes between the same pair of systems
+    a, b = system[source[~inner]], system[target[~inner]]
+    between = a != b
+    lo, hi = np.minimum(a[between], b[between]), np.maximum(a[between], b[between])
+    pairs, inverse = np.unique(lo * n_systems + hi, return_inverse=True)
+    system_pos = multilevel_layout(n_systems, pairs // n_systems, pairs % n_systems,
+                                   np.bincount(inverse, weights=strength[~inner][between], minlength=len(pairs)),
+                                   dim, seed=seed, iterations=iterations, tol=tol, theta=theta)
+    radius = system_scale * 2 / n_systems ** (1 / dim)
+
+    # Local body indices, grouped by system
+    order = np.argsort(system, kind='stable')
+    sizes = np.bincount(system, minlength=n_systems)
+    local = np.empty(n, dtype=np.int64)
+    local[order] = np.arange(n) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    sun = np.full(n_systems, -1)
+    suns = np.flatnonzero(model.nodes['type'] == 'Sun')[::-1]
+    sun[system[suns]] = local[suns]
+    e_source, e_target, e_strength = source[inner], target[inner], strength[inner]
+    e_system = system[e_source]
+
+    # Small systems are stacked by padded width and laid out densely, a block at a time
+    rng = np.random.default_rng(seed)
+    jobs, bodies = [], []
+    width = np.maximum(2, 2 ** np.ceil(np.log2(np.maximum(sizes, 1)))).astype(np.int64)
+    for w in np.unique(width[(sizes > 1) & (sizes <= max_dense)]):
+        members = np.flatnonzero((width == w) & (sizes > 1))
+        slot = np.full(n_systems, -1)
+        slot[members] = np.arange(len(members))
+        block = max(1, 2**22 // (w * w * dim))
+        for first in range(0, len(members), block):
+            in_block = (slot[system] >= first) & (slot[system] < first + block)
+            body = np.flatnonzero(in_block)
+            row = slot[system[body]] - first
+            count = min(block, len(members) - first)
+            valid = np.zeros((count, w), dtype=bool)
+            valid[row, local[body]] = True
+            fixed = np.zeros((count, w), dtype=bool)
+            has_sun = sun[members[first:first + count]] >= 0
+            fixed[np.flatnonzero(has_sun), sun[members[first:first + count]][has_sun]] = True
+            pos = rng.random((count, w, dim))
+            pos[fixed] = 0.5
+            edge = np.flatnonzero((slot[e_system] >= first) & (slot[e_system] < first + block))
+            erow = slot[e_system[edge]] - first
+            adjacency = np.zeros((count, w, w))
+            np.add.at(adjacency, (erow, local[e_source[edge]], local[e_target[edge]]), e_strength[edge])
+            adjacency += adjacency.transpose(0, 2, 1)
+            jobs.append((_layout_small_systems, dim, iterations, pos, valid, fixed, adjacency))
+            bodies.append((body, row, local[body]))
+
+    # Large systems each get their own Barnes-Hut layout
+    for i in np.flatnonzero(sizes > max_dense):
+        edge = e_system == i
+        body = np.flatnonzero(system == i)
+        jobs.append((_layout_large_system, dim, iterations, tol, theta, sizes[i], local[e_source[edge]],
+                     local[e_target[edge]], e_strength[edge], sun[i], [seed, int(i)]))
+        bodies.append((body, None, local[body]))
+
+    # Run the local layouts, across worker processes for large sectors
+    processes = processes or os.cpu_count() or 1
+    if processes > 1 and n >= parallel_threshold and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            layouts = list(pool.map(_run_job, jobs))
+    else:
+        layouts = [_run_job(job) for job in jobs]
+
+    # Place every body around its system's position
+    offsets = np.zeros((n, dim))
+    for (body, row, index), pos in zip(bodies, layouts):
+        offsets[body] = pos[index] if row is None else pos[row, index]
+    return rescale_layout(system_pos[system] + radius * offsets)
+
+
+def networkx_layout(model, dim, seed=DEFAULT_SEED, iterations=50):
+    """Lays out the sector with NetworkX's spring_layout, which is exact but quadratic in the number of bodies."""
+
+    # Load dependencies
+    import numpy as np
+    import networkx as nx
+
+    # Invert edge weights so that nearby bodies attract more strongly
+    G = nx.Graph()
+    G.add_nodes_from(range(model.n_nodes))
+    G.add_weighted_edges_from(zip(model.edges['source'].tolist(),
+                                  model.edges['target'].tolist(),
+                                  (1 / model.edges['weight']).tolist()))
+    pos = nx.spring_layout(G, dim=dim, seed=seed, iterations=iterations)
+    return np.array([pos[i] for i in range(model.n_nodes)])
+
+
+# Layout engines take (model, dim, seed=..., **params) and return an (n_nodes, dim) array
+LAYOUT_ENGINES = {'spring': networkx_layout,
+                  'barnes_hut': barnes_hut_layout,
+                  'hierarchical': hierarchical_layout}
+AUTO_LAYOUT_LIMIT = 500
+
+
+def register_layout_engine(name, engine):
+    """Makes a layout engine available to layout_positions and the renderers under `name`."""
+    LAYOUT_ENGINES[name] = engine
+
+
+def layout_key(model, dim, **params):
+    """Hashes the sector topology, route weights and types, body types, dimension and layout parameters into a cache key.
+
+    Types are part of the key because hierarchical_layout groups bodies around their suns along
+    In-System routes.
+    """
+    return content_hash('layout-v3', model.nodes['label'], model.nodes['type'], model.edges['source'],
+                        model.edges['target'], model.edges['weight'], model.edges['type'], dim, sorted(params.items()))
+
+
+def layout_positions(model, dim, engine='auto', seed=DEFAULT_SEED, cache=True, **params):
+    """Generates a force-directed layout for the sector, treating shorter routes as stronger springs.
+
+    `engine` names one of LAYOUT_ENGINES; 'auto' uses NetworkX's spring layout for small sectors
+    and the Barnes-Hut engine beyond AUTO_LAYOUT_LIMIT bodies. Results are memoized in
+    `layout_cache`, so laying out an unchanged sector again returns the same positions.
+    """
+    if engine == 'auto':
+        engine = 'spring' if model.n_nodes <= AUTO_LAYOUT_LIMIT else 'barnes_hut'
+    if engine not in LAYOUT_ENGINES:
+        raise ValueError('Unknown layout engine: {}'.format(engine))
+
+    key = layout_key(model, dim, engine=engine, seed=seed, **params)
+    if cache:
+        pos = layout_cache.get(key)
+        if pos is not None:
+            return pos.copy()
+
+    pos = LAYOUT_ENGINES[engine](model, dim, seed=seed, **params)
+
+    if cache:
+        layout_cache.put(key, pos)
+    return pos.copy()
+
+
+def layout_snapshot(model):
+    """Captures a laid-out sector's labels, positions and routes as plain lists for incremental_layout.
+
+    The snapshot is JSON-serializable, so it can be kept in a dashboard store between uploads, and
+    carries a content hash of itself as 'key' (see snapshot_key).
+    """
+
+    # Load dependency
+    import numpy as np
+
+    pos = model.positions(3 if model.has_coordinates(3) else 2)
+    return {'key': content_hash('snapshot-v1', model.nodes['label'], pos, model.edges['source'].astype(np.int64),
+                                model.edges['target'].astype(np.int64), model.edges['weight']),
+            'labels': model.nodes['label'].tolist(),
+            'positions': pos.tolist(),
+            'source': model.edges['source'].tolist(),
+            'target': model.edges['target'].tolist(),
+            'weight': model.edges['weight'].tolist()}
+
+
+def snapshot_key(previous):
+    """Returns a layout snapshot's content hash, hashing snapshots made without one, or None for no snapshot."""
+
+    # Load dependency
+    import numpy as np
+
+    if not previous:
+        return None
+    if 'key' in previous:
+        return previous['key']
+    return content_hash('snapshot-v1', np.asarray(previous['labels'], dtype=object),
+                        np.asarray(previous['positions'], dtype=np.float64),
+                        np.asarray(previous['source'], dtype=np.int64), np.asarray(previous['target'], dtype=np.int64),
+                        np.asarray(previous['weight'], dtype=np.float64))
+
+
+def relax_layout(pos, source, target, strength, movable, k, iterations=50, theta=1.0, temperature=0.1,
+                 home=None, rest=None, home_strength=1.0):
+    """Relaxes only the `movable` bodies of a layout, holding every other body where it is.
+
+    Repulsion from the fixed bodies comes from a Barnes-Hut tree built once over them, repulsion
+    among the movable bodies is exact, and only routes touching a movable body are evaluated, so
+    the cost scales with the size of the edit rather than the size of the sector.
+
+    Each step is capped at a temperature that starts at `temperature` * k and cools to nothing, so
+    no body travels further than about temperature * k * iterations / 2. Bodies with a `home`
+    position (rows of an (n, dim) array that are not NaN) are drawn back to it as if by a route
+    of strength `home_strength`. With `rest`, the (source, target, strength) routes the home
+    positions were laid out with, the forces the bodies felt at home are taken as balanced, so
+    only what changed since moves them.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    pos = pos.astype(np.float64, copy=True)
+    n, dim = pos.shape
+    moving = np.flatnonzero(movable)
+    m = len(moving)
+    homed = ~np.isnan(home).any(axis=1) if home is not None else np.zeros(n, dtype=bool)
+
+    # Tree over the bodies that stay put
+    anchored = np.flatnonzero(~movable)
+    if len(anchored):
+        levels = int(min(62 // dim, max(2, np.ceil(np.log2(len(anchored)) / dim) + 2)))
+        _, spos, smass, tree = _morton_tree(pos[anchored], np.ones(len(anchored)), levels)
+
+    def forces(pos, source, target, strength, present):
+        """Returns the net force on every moving body, counting only the `present` moving bodies."""
+        query = pos[moving]
+        displacement = np.zeros((n, dim))
+        if len(anchored):
+            repulsion = np.zeros((m, dim))
+            _tree_walk(spos, smass, tree, k * k, theta, repulsion, np.arange(m), np.zeros(m, dtype=np.int64), 0, query=query)
+            displacement[moving] = repulsion
+
+        # Exact repulsion among the moving bodies, a block of rows at a time
+        for lo in range(0, m, 1024):
+            delta = query[lo:lo + 1024, None, :] - query[None, :, :]
+            d2 = np.maximum((delta * delta).sum(axis=-1), 1e-4)
+            d2[np.arange(len(d2)), np.arange(lo, lo + len(d2))] = np.inf
+            d2[:, ~present[moving]] = np.inf
+            displacement[moving[lo:lo + 1024]] += (delta * (k * k / d2)[..., None]).sum(axis=1)
+
+        # Attraction along the routes touching a moving body
+        incident = (movable[source] | movable[target]) & present[source] & present[target]
+        source, target, strength = source[incident], target[incident], strength[incident]
+        delta = pos[source] - pos[target]
+        distance = np.maximum(np.sqrt((delta * delta).sum(axis=1)), 0.01)
+        pull = delta * (strength * distance / k)[:, None]
+        for a in range(dim):
+            displacement[:, a] += np.bincount(target, weights=pull[:, a], minlength=n) - np.bincount(source, weights=pull[:, a], minlength=n)
+        return displacement[moving]
+
+    # Whatever pushed the bodies at home before the edit is the layout's own balance
+    balance = np.zeros((m, dim))
+    if rest is not None and homed.any():
+        at_home = np.where(homed[:, None], home, pos)
+        balance = forces(at_home, *rest, present=homed | ~movable)
+        balance[~homed[moving]] = 0
+
+    everyone = np.ones(n, dtype=bool)
+    t = temperature * k
+    dt = t / (iterations + 1)
+    for _ in range(iterations):
+        displacement = forces(pos, source, target, strength, everyone) - balance
+
+        # Attraction back to the home positions
+        if homed.any():
+            delta = np.where(homed[moving, None], home[moving] - pos[moving], 0)
+            displacement += delta * (home_strength * np.sqrt((delta * delta).sum(axis=1)) / k)[:, None]
+
+        # Move along the net force, by no more than the temperature
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 1e-12)
+        pos[moving] += displacement * (np.minimum(length, t) / length)[:, None]
+        t -= dt
+    return pos
+
+
+def incremental_layout(model, dim, previous, seed=DEFAULT_SEED, hops=1, iterations=50, theta=1.0, max_changed=0.5):
+    """Updates a previous layout (see layout_snapshot) to match an edited sector.
+
+    Bodies and routes are diffed against the snapshot: bodies that kept their place keep their
+    position, new bodies start next to their known neighbours, and only the bodies touched by the
+    edit (plus `hops` routes around them) are relaxed. Returns None when the dimension differs or
+    more than `max_changed` of the sector moved, in which case a full layout is the better choice.
+    """
+
+    # Load dependencies
+    import numpy as np
+    import pandas as pd
+
+    prev_pos = np.asarray(previous['positions'], dtype=np.float64)
+    if prev_pos.ndim != 2 or prev_pos.shape[1] != dim:
+        return None
+    n = model.n_nodes
+    source = model.edges['source'].astype(np.int64)
+    target = model.edges['target'].astype(np.int64)
+    weight = model.edges['weight']
+
+    # Carry positions over by label
+    before = model.index.get_indexer(previous['labels'])
+    known = np.zeros(n, dtype=bool)
+    known[before[before >= 0]] = True
+    pos = np.zeros((n, dim))
+    pos[before[before >= 0]] = prev_pos[before >= 0]
+
+    # Diff the routes on (unordered endpoints, weight)
+    p_source = before[np.asarray(previous['source'], dtype=np.int64)]
+    p_target = before[np.asarray(previous['target'], dtype=np.int64)]
+    p_weight = np.asarray(previous['weight'], dtype=np.float64)
+    current = pd.MultiIndex.from_arrays([np.minimum(source, target), np.maximum(source, target), weight])
+    prior = pd.MultiIndex.from_arrays([np.minimum(p_source, p_target), np.maximum(p_source, p_target), p_weight])
+    added = ~current.isin(prior)
+    removed = ~prior.isin(current)
+
+    # Everything touched by the edit, grown by a few hops
+    changed = ~known
+    changed[source[added]] = changed[target[added]] = True
+    ends = np.concatenate([p_source[removed], p_target[removed]])
+    changed[ends[ends >= 0]] = True
+    for _ in range(hops):
+        reach = changed[source] | changed[target]
+        changed[source[reach]] = changed[target[reach]] = True
+    if not changed.any():
+        return pos
+    if changed.sum() > max_changed * n:
+        return None
+
+    # Ideal route length estimated from the untouched part of the map
+    strength = 1 / weight
+    settled = ~changed[source] & ~changed[target]
+    if settled.any():
+        length = np.sqrt(((pos[source[settled]] - pos[target[settled]]) ** 2).sum(axis=1))
+        k = float(np.median(length * strength[settled] ** (1 / 3)))
+    else:
+        k = 0.0
+    if not k > 0:
+        k = float(np.ptp(pos[known], axis=0).max()) / np.sqrt(n) if known.any() else np.sqrt(1.0 / n)
+
+    # Drop new bodies beside their placed neighbours, or at random if they have none
+    rng = np.random.default_rng(seed)
+    placed = known.copy()
+    for _ in range(3):
+        link = placed[source] != placed[target]
+        if not link.any():
+            break
+        inside = np.where(placed[source[link]], source[link], target[link])
+        outside = np.where(placed[source[link]], target[link], source[link])
+        count = np.bincount(outside, minlength=n)
+        for a in range(dim):
+            pos[count > 0, a] = np.bincount(outside, weights=pos[inside, a], minlength=n)[count > 0] / count[count > 0]
+        pos[count > 0] += rng.normal(scale=0.1 * k, size=(int((count > 0).sum()), dim))
+        placed |= count > 0
+    if not placed.all():
+        lo, hi = (pos[known].min(axis=0), pos[known].max(axis=0)) if known.any() else (-np.ones(dim), np.ones(dim))
+        pos[~placed] = rng.uniform(lo, hi, size=(int((~placed).sum()), dim))
+
+    # Bodies the map already had are held firmly where the previous routes balanced them, so
+    # they make room for the edit without the map around them shifting
+    home = np.where(known[:, None], pos, np.nan)
+    kept = (p_source >= 0) & (p_target >= 0)
+    rest = (p_source[kept], p_target[kept], 1 / p_weight[kept])
+    return relax_layout(pos, source, target, strength, changed, k, iterations=iterations, theta=theta,
+                        home=home, rest=rest, home_strength=10.0)
+
+
+def prepare_sector(system_data, sector_map, dim=3, seed=DEFAULT_SEED, cache=True, layout='auto', previous=None):
+    """Builds a styled SectorModel and makes sure every body has coordinates in `dim` dimensions.
+
+    Coordinates in the system data are used as given. Otherwise, with a `previous` layout
+    snapshot the sector is laid out incrementally from it, and failing that from scratch with the
+    `layout` engine.
+    """
+
+    # Build the styled, array-backed sector
+    with timed('build'):
+        model = SectorModel.from_frames(system_data, sector_map, seed=seed)
+    return layout_sector(model, dim, seed=seed, cache=cache, layout=layout, previous=previous)
+
+
+def layout_sector(model, dim=3, seed=DEFAULT_SEED, cache=True, layout='auto', previous=None):
+    """Makes sure every body of a SectorModel has coordinates in `dim` dimensions (see prepare_sector)."""
+    if OBSERVERS:
+        notify('size', 'bodies', model.n_nodes)
+        notify('size', 'routes', model.n_edges)
+
+    # Generate layout if not provided
+    if not model.has_coordinates(dim):
+        with timed('layout'):
+            pos = incremental_layout(model, dim, previous, seed=seed) if previous else None
+            if pos is None:
+                pos = layout_positions(model, dim, engine=layout, seed=seed, cache=cache)
+        model.set_positions(pos)
+    return model
+
+
+# Compiled sectors are directories (or uncompressed zips) of .npy arrays with a JSON manifest;
+# bump BUNDLE_VERSION whenever their contents change, so stale bundles are refused
+BUNDLE_VERSION = 'bundle-v1'
+BUNDLE_MANIFEST = 'sector.json'
+
+
+def _bundle_strings(values):
+    """Encodes a text column as int32 codes into its distinct values, kept as one UTF-8 buffer with byte offsets."""
+
+    # Load dependencies
+    import numpy as np
+    import pandas as pd
+
+    # Missing values are coded -1
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    uniques = [str(u).encode('utf-8') for u in uniques]
+    offsets = np.zeros(len(uniques) + 1, dtype=np.int64)
+    np.cumsum([len(u) for u in uniques], out=offsets[1:])
+    return {'codes': codes.astype(np.int32),
+            'text': np.frombuffer(b''.join(uniques), dtype=np.uint8),
+            'offsets': offsets}
+
+
+def _bundle_decode(codes, text, offsets):
+    """Rebuilds a text column encoded by _bundle_strings as an object array, with None for missing values."""
+
+    # Load dependencies
+    import numpy as np
+    import pyarrow as pa
+
+    # The buffers are laid out as an Arrow string array, which decodes them without copying
+    strings = pa.LargeStringArray.from_buffers(len(offsets) - 1, pa.py_buffer(np.ascontiguousarray(offsets)),
+                                               pa.py_buffer(np.ascontiguousarray(text)))
+    return np.append(strings.to_numpy(zero_copy_only=False), None)[codes]
+
+
+def write_bundle(model, path, dims=(2, 3), seed=DEFAULT_SEED, cache=True, layout='auto'):
+    """Writes a styled SectorModel, laid out in each of `dims` dimensions, as a compiled sector bundle.
+
+    The bundle is a directory of .npy arrays with a JSON manifest, or an uncompressed zip of the
+    same when `path` ends in .zip. Numeric columns, layouts and the CSR adjacency are stored as
+    they are and text columns as codes into their distinct values, so load_bundle can open the
+    sector without parsing, styling or layout. Bodies with coordinates keep them (see
+    layout_sector). Returns `path`.
+    """
+
+    # Load dependencies
+    import zipfile
+    import numpy as np
+
+    # Collect the columns, adjacency and one layout per dimension
+    arrays = {'indptr': model.indptr, 'indices': model.indices, 'edge_ids': model.edge_ids}
+    columns = {'nodes': {}, 'edges': {}}
+    for part in columns:
+        for col, values in getattr(model, part).items():
+            name = '{}.{}'.format(part, col)
+            if part == 'nodes' and col in ('x', 'y', 'z'):
+                continue
+            if values.dtype == object:
+                columns[part][col] = 'strings'
+                arrays.update(('{}.{}'.format(name, k), v) for k, v in _bundle_strings(values).items())
+            else:
+                columns[part][col] = 'array'
+                arrays[name] = values
+    for dim in dims:
+        if model.has_coordinates(dim):
+            pos = model.positions(dim)
+        else:
+            with timed('layout'):
+                pos = layout_positions(model, dim, engine=layout, seed=seed, cache=cache)
+        arrays['positions{}d'.format(dim)] = pos.astype(np.float64)
+    manifest = {'version': BUNDLE_VERSION,
+                'bodies': model.n_nodes,
+                'routes': model.n_edges,
+                'dims': list(dims),
+                'columns': columns}
+
+    # The manifest is written last, so an interrupted write is not mistaken for a bundle
+    with timed('bundle_write'):
+        if str(path).lower().endswith('.zip'):
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as bundle:
+                for name, values in arrays.items():
+                    bundle.writestr(name + '.npy', _array_dumps(np.ascontiguousarray(values)))
+                bundle.writestr(BUNDLE_MANIFEST, _json_dumps(manifest))
+        else:
+            os.makedirs(path, exist_ok=True)
+            for name, values in arrays.items():
+                np.save(os.path.join(path, name + '.npy'), np.ascontiguousarray(values), allow_pickle=False)
+            with open(os.path.join(path, BUNDLE_MANIFEST), 'wb') as f:
+                f.write(_json_dumps(manifest))
+    return path
+
+
+def compile_sector(system_data, sector_map, path, dims=(2, 3), seed=DEFAULT_SEED, cache=True, layout='auto'):
+    """Builds a sector from its system data and sector map and writes it as a bundle (see write_bundle)."""
+    with timed('build'):
+        model = SectorModel.from_frames(system_data, sector_map, seed=seed)
+    return write_bundle(model, path, dims=dims, seed=seed, cache=cache, layout=layout)
+
+
+def _zip_member_array(path, info):
+    """Memory-maps an .npy member of an uncompressed zip file."""
+
+    # Load dependency
+    import numpy as np
+
+    with open(path, 'rb') as f:
+
+        # The member's data follows its local header, whose name and extra field lengths vary
+        f.seek(info.header_offset)
+        header = f.read(30)
+        f.seek(info.header_offset + 30 + int.from_bytes(header[26:28], 'little') + int.from_bytes(header[28:30], 'little'))
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if not all(shape):
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape, order='F' if fortran else 'C')
+
+
+def load_bundle(source, dim=None, mmap=True):
+    """Opens a compiled sector bundle (see write_bundle) as a SectorModel laid out in `dim` dimensions.
+
+    `dim` defaults to the most the bundle has a layout for. `source` is a bundle directory, a zip
+    file or the bytes of one. Arrays are memory-mapped from
+    directories and zip files given as paths, so opening a sector only reads its manifest and text
+    columns; the model's numeric columns are read-only views of the bundle.
+    """
+
+    # Load dependencies
+    import io
+    import json
+    import zipfile
+    import numpy as np
+
+    with timed('bundle_load'):
+        if isinstance(source, (str, os.PathLike)) and os.path.isdir(source):
+            with open(os.path.join(source, BUNDLE_MANIFEST), 'rb') as f:
+                manifest = json.loads(f.read().decode('utf-8'))
+
+            def read(name):
+                return np.load(os.path.join(source, name + '.npy'), mmap_mode='r' if mmap else None, allow_pickle=False)
+        else:
+            bundle = zipfile.ZipFile(io.BytesIO(source) if isinstance(source, bytes) else source)
+            manifest = json.loads(bundle.read(BUNDLE_MANIFEST).decode('utf-8'))
+            path = os.fspath(source) if isinstance(source, (str, os.PathLike)) else None
+
+            def read(name):
+                info = bundle.getinfo(name + '.npy')
+                if mmap and path and info.compress_type == zipfile.ZIP_STORED:
+                    return _zip_member_array(path, info)
+                return _array_loads(bundle.read(info))
+
+        if manifest.get('version') != BUNDLE_VERSION:
+            raise ValueError('Unsupported sector bundle version: {}'.format(manifest.get('version')))
+        if dim is None:
+            dim = max(manifest['dims'])
+        if dim not in manifest['dims']:
+            raise ValueError('The sector bundle has no {}D layout (it has {})'.format(
+                dim, ', '.join('{}D'.format(d) for d in manifest['dims'])))
+
+        parts = {}
+        for part, columns in manifest['columns'].items():
+            parts[part] = {}
+            for col, kind in columns.items():
+                name = '{}.{}'.format(part, col)
+                if kind == 'strings':
+                    parts[part][col] = _bundle_decode(read(name + '.codes'), read(name + '.text'), read(name + '.offsets'))
+                else:
+                    parts[part][col] = read(name)
+        pos = read('positions{}d'.format(dim))
+        for i, a in enumerate(['x', 'y', 'z'][:dim]):
+            parts['nodes'][a] = pos[:, i]
+        model = SectorModel(parts['nodes'], parts['edges'],
+                            adjacency=(read('indptr'), read('indices'), read('edge_ids')))
+    if OBSERVERS:
+        notify('size', 'bodies', model.n_nodes)
+        notify('size', 'routes', model.n_edges)
+    return model
+
+
+def bundle_frames(source, dim=None, mmap=True):
+    """Recovers the system data, with coordinates from the bundle's layout, and the sector map from a bundle.
+
+    The bundle's styling comes along as style_<column> columns (see STYLE_COLUMNS), so building a
+    SectorModel from the frames does not style the sector again.
+    """
+
+    # Load dependency
+    import pandas as pd
+
+    model = load_bundle(source, dim=dim, mmap=mmap)
+    labels = model.nodes['label']
+    system_data = pd.DataFrame({col: model.nodes[col] for col in SYSTEM_SCHEMA if col in model.nodes})
+    sector_map = pd.DataFrame({'source': labels[model.edges['source']],
+                               'target': labels[model.edges['target']],
+                               'weight': model.edges['weight'],
+                               'type': model.edges['type']})
+    for frame, part in [(system_data, 'nodes'), (sector_map, 'edges')]:
+        for col in STYLE_COLUMNS[part].values():
+            frame['style_' + col] = getattr(model, part)[col]
+    return system_data, sector_map
+
+
+def _shortest_distances(indptr, indices, weight, source):
+    """Runs Dijkstra's algorithm from `source` over a CSR graph, returning every body's distance (inf if unreachable)."""
+
+    # Load dependencies
+    import heapq
+    import numpy as np
+
+    # Use SciPy's compiled Dijkstra when it is installed
+    try:
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import dijkstra
+    except ImportError:
+        dijkstra = None
+    n = len(indptr) - 1
+    if dijkstra is not None:
+        return dijkstra(csr_matrix((weight, indices, indptr), shape=(n, n)), indices=source)
+
+    indptr, indices, weight = indptr.tolist(), indices.tolist(), weight.tolist()
+    dist = [float('inf')] * n
+    dist[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        d, v = heapq.heappop(heap)
+        if d > dist[v]:
+            continue
+        for j in range(indptr[v], indptr[v + 1]):
+            u, nd = indices[j], d + weight[j]
+            if nd < dist[u]:
+                dist[u] = nd
+                heapq.heappush(heap, (nd, u))
+    return np.array(dist)
+
+
+# Landmark distance tables are keyed by the sector topology, like layouts
+route_cache = TieredCache('routes', _array_dumps, _array_loads)
+
+
+def _peel_trees(n, indptr, indices, edge_ids):
+    """Strips the trees hanging off a graph (bodies reachable only through a single route, like planets).
+
+    Returns, for every body, the neighbour and route towards the remaining core (-1 for core bodies),
+    plus each body's core root. A component that is a tree keeps one body as its core.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    degree = np.diff(indptr).tolist()
+    parent = [-1] * n
+    parent_route = [-1] * n
+    peeled = [False] * n
+    indptr, indices, edge_ids = indptr.tolist(), indices.tolist(), edge_ids.tolist()
+    leaves = [v for v in range(n) if degree[v] == 1]
+    while leaves:
+        v = leaves.pop()
+        if degree[v] != 1:
+            continue
+        for j in range(indptr[v], indptr[v + 1]):
+            u = indices[j]
+            if not peeled[u]:
+                break
+        peeled[v] = True
+        parent[v], parent_route[v] = u, edge_ids[j]
+        degree[v] = 0
+        degree[u] -= 1
+        if degree[u] == 1:
+            leaves.append(u)
+
+    # Follow the parents down to the core, nearest bodies first
+    parent = np.array(parent, dtype=np.int64)
+    root = np.where(parent < 0, np.arange(n), parent)
+    while True:
+        jumped = root[root]
+        if (jumped == root).all():
+            break
+        root = jumped
+    return parent, np.array(parent_route, dtype=np.int64), root
+
+
+class RoutePlanner(object):
+    """Shortest routes between the bodies of a SectorModel, measured by route `weight` (AU).
+
+    The trees hanging off the sector (planets reached only from their sun, and so on) are peeled
+    off once, since routes through them are forced; queries then run A* over the remaining core
+    and add the legs up and down the trees. The heuristic combines lower bounds from `landmarks`
+    precomputed landmark distance tables (ALT) with the straight-line distance between body
+    coordinates, when the sector has them, scaled so that it never overestimates a route. Both
+    bounds hold on any subset of the routes, so one index serves every route type filter.
+    Landmark tables are memoized in `route_cache`, and the last `memo` answers are kept.
+
+    Only repeated queries answered from the memo take microseconds. A new query searches the core,
+    which takes about 1 ms in a sector of 6,000 bodies, 30-100 ms at 60,000 and around 200 ms at
+    300,000, more with route types avoided.
+    """
+
+    def __init__(self, model, landmarks=16, seed=DEFAULT_SEED, cache=True, memo=4096):
+
+        # Load dependencies
+        import numpy as np
+        import pandas as pd
+        from collections import OrderedDict
+
+        self.model = model
+        n = model.n_nodes
+        weight = model.edges['weight'][model.edge_ids]
+        codes, kinds = pd.factorize(pd.Series(model.edges['type']).map(route_kind))
+        self.kinds = list(kinds)
+        self.component = connected_components(n, model.edges['source'], model.edges['target'])
+        self._weight = weight
+        self._lookup = dict(zip(model.nodes['label'].tolist(), range(n)))
+
+        # Peel off the trees and keep the routes between core bodies for searching
+        self.parent, self.parent_route, self.root = _peel_trees(n, model.indptr, model.indices, model.edge_ids)
+        core = self.parent < 0
+        heads = np.repeat(np.arange(n), np.diff(model.indptr))
+        keep = core[heads] & core[model.indices]
+        self._core_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(heads[keep], minlength=n), out=self._core_indptr[1:])
+        self._core_indices = model.indices[keep]
+
+        # Plain lists keep the search loop fast
+        self._indptr = self._core_indptr.tolist()
+        self._neighbor = self._core_indices.tolist()
+        self._core_route = model.edge_ids[keep].tolist()
+        self._length = weight[keep].tolist()
+        self._kind = codes[model.edge_ids[keep]].tolist()
+        self._route_kind = codes.tolist()
+        self._parent = self.parent.tolist()
+        self._parent_route = self.parent_route.tolist()
+
+        # Straight-line bound: coordinates scaled by the smallest weight per unit of distance
+        self._pos = None
+        dim = 3 if model.has_coordinates(3) else 2 if model.has_coordinates(2) else 0
+        if dim and model.n_edges:
+            pos = model.positions(dim)
+            span = np.sqrt(((pos[model.edges['source']] - pos[model.edges['target']]) ** 2).sum(axis=1))
+            ratio = model.edges['weight'][span > 0] / span[span > 0]
+            if len(ratio) and ratio.min() > 0:
+                self._pos = pos * ratio.min()
+
+        self.landmarks = self._landmarks(min(landmarks, n), seed, cache)
+        self._memo = OrderedDict()
+        self._memo_size = memo
+
+    def _landmarks(self, k, seed, cache):
+        """Picks k landmarks by farthest-point selection and returns their (n, k) distance table."""
+
+        # Load dependency
+        import numpy as np
+
+        model = self.model
+        key = content_hash('routes-v1', model.nodes['label'], model.edges['source'], model.edges['target'],
+                           model.edges['weight'], k, seed)
+        if cache:
+            table = route_cache.get(key)
+            if table is not None:
+                return table
+
+        # Each landmark is the body farthest from those chosen so far; unreachable bodies count
+        # as farthest, so every component gets a landmark before any gets a second one
+        n = model.n_nodes
+        table = np.zeros((n, k))
+        nearest = _shortest_distances(model.indptr, model.indices, self._weight,
+                                      int(np.random.default_rng(seed).integers(n))) if n else np.zeros(0)
+        for i in range(k):
+            landmark = int(np.argmax(np.where(np.isfinite(nearest), nearest, np.inf)))
+            dist = _shortest_distances(model.indptr, model.indices, self._weight, landmark)
+            nearest = dist if i == 0 else np.minimum(nearest, dist)
+
+            # Bounds only ever compare bodies of one component, so other components can read 0
+            table[:, i] = np.where(np.isfinite(dist), dist, 0)
+        if cache:
+            route_cache.put(key, table)
+        return table
+
+    def route(self, source, target, avoid=(), only=None):
+        """Finds the shortest route from body `source` to body `target` (by label).
+
+        Route types listed in `avoid` are never used; with `only`, just those types are. Returns
+        a dictionary with the bodies on the way ('path'), the indices of the routes taken
+        ('routes', into model.edges) and the total 'distance', or None when there is no route.
+        """
+        key = (source, target, tuple(avoid), None if only is None else tuple(only))
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            return self._memo[key]
+
+        for label in (source, target):
+            if label not in self._lookup:
+                raise KeyError('Unknown bodies: {}'.format(label))
+        avoid = {route_kind(a) for a in avoid}
+        only = None if only is None else {route_kind(o) for o in only}
+        blocked = [kind in avoid or (only is not None and kind not in only) for kind in self.kinds]
+        result = self._route(self._lookup[source], self._lookup[target], blocked)
+
+        self._memo[key] = result
+        while len(self._memo) > self._memo_size:
+            self._memo.popitem(last=False)
+        return result
+
+    def distance(self, source, target, avoid=(), only=None):
+        """Returns the length of the shortest route between two bodies, or inf when there is none."""
+        found = self.route(source, target, avoid=avoid, only=only)
+        return found['distance'] if found else float('inf')
+
+    def _leg(self, v, blocked):
+        """Returns the bodies and routes from v down to its core root, or None if a route is blocked."""
+        bodies, routes = [v], []
+        while self._parent[bodies[-1]] >= 0:
+            route = self._parent_route[bodies[-1]]
+            if blocked[self._route_kind[route]]:
+                return None
+            routes.append(route)
+            bodies.append(self._parent[bodies[-1]])
+        return bodies, routes
+
+    def _route(self, s, t, blocked):
+        if self.component[s] != self.component[t]:
+            return None
+        if s == t:
+            path, routes = [s], []
+        elif self.root[s] == self.root[t]:
+
+            # Within one tree the route is forced: up to the lowest common ancestor and back down
+            up, down = self._leg(s, [False] * len(blocked)), self._leg(t, [False] * len(blocked))
+            common = set(up[0]) & set(down[0])
+            i = next(i for i, v in enumerate(up[0]) if v in common)
+            j = down[0].index(up[0][i])
+            path = up[0][:i + 1] + down[0][:j][::-1]
+            routes = up[1][:i] + down[1][:j][::-1]
+            if any(blocked[self._route_kind[r]] for r in routes):
+                return None
+        else:
+            up, down = self._leg(s, blocked), self._leg(t, blocked)
+            if up is None or down is None:
+                return None
+            core = self._search(up[0][-1], down[0][-1], blocked)
+            if core is None:
+                return None
+            path = up[0][:-1] + core[0] + down[0][:-1][::-1]
+            routes = up[1] + core[1] + down[1][::-1]
+
+        weight = self.model.edges['weight']
+        return {'path': self.model.nodes['label'][path].tolist(),
+                'routes': routes,
+                'distance': float(weight[routes].sum()) if routes else 0.0}
+
+    def _search(self, s, t, blocked):
+        """Runs A* between two core bodies, returning the bodies and routes on the way or None."""
+
+        # Load dependencies
+        import heapq
+        import numpy as np
+
+        indptr, neighbor, length, kind, route = self._indptr, self._neighbor, self._length, self._kind, self._core_route
+        table, goal = self.landmarks, self.landmarks[t]
+        pos = self._pos
+        inf = float('inf')
+
+        dist = {s: 0.0}
+        parent = {s: (-1, -1)}
+        heap = [(0.0, 0.0, s)]
+        while heap:
+            _, d, v = heapq.heappop(heap)
+            if v == t:
+                break
+            if d > dist[v]:
+                continue
+            lo, hi = indptr[v], indptr[v + 1]
+            if lo == hi:
+                continue
+
+            # Lower bounds for all neighbours at once
+            bodies = self._core_indices[lo:hi]
+            bound = np.abs(table[bodies] - goal).max(axis=1)
+            if pos is not None:
+                bound = np.maximum(bound, np.sqrt(((pos[bodies] - pos[t]) ** 2).sum(axis=1)))
+            bound = bound.tolist()
+            for j in range(lo, hi):
+                if blocked[kind[j]]:
+                    continue
+                u, nd = neighbor[j], d + length[j]
+                if nd < dist.get(u, inf):
+                    dist[u] = nd
+                    parent[u] = (v, route[j])
+                    heapq.heappush(heap, (nd + bound[j - lo], nd, u))
+        if t not in dist:
+            return None
+
+        # Walk back from the target
+        path, routes = [t], []
+        while parent[path[-1]][0] >= 0:
+            v, r = parent[path[-1]]
+            path.append(v)
+            routes.append(r)
+        return path[::-1], routes[::-1]
+
+
+def route_coordinates(layout, path):
+    """Returns the 3D figure coordinates (x, y, z lists) of a path or set of labels in a layout snapshot."""
+
+    # Load dependencies
+    import numpy as np
+    import pandas as pd
+
+    idx = pd.Index(layout['labels']).get_indexer(path)
+    pos = np.asarray(layout['positions'], dtype=np.float64)[idx] * np.array(FIGURE_SCALE)
+    return {'x': pos[:, 0].tolist(), 'y': pos[:, 1].tolist(), 'z': pos[:, 2].tolist()}
+
+
+class _KDTree(object):
+    """A bucketed KD-tree over an (n, dim) array, with the queries SpatialIndex uses from scipy's cKDTree."""
+
+    def __init__(self, data, leafsize=32):
+
+        # Load dependency
+        import numpy as np
+
+        self.data = np.asarray(data, dtype=np.float64)
+        self.leafsize = leafsize
+        self._order = np.arange(len(self.data))
+        self._lo, self._hi, self._left, self._right, self._mins, self._maxs = [], [], [], [], [], []
+        if len(self.data):
+            self._build(0, len(self.data))
+        self._mins, self._maxs = np.array(self._mins), np.array(self._maxs)
+
+    def _build(self, lo, hi):
+
+        # Load dependency
+        import numpy as np
+
+        node = len(self._lo)
+        points = self.data[self._order[lo:hi]]
+        self._lo.append(lo)
+        self._hi.append(hi)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._mins.append(points.min(axis=0))
+        self._maxs.append(points.max(axis=0))
+
+        # Split at the median of the widest axis
+        if hi - lo > self.leafsize:
+            axis = int(np.argmax(self._maxs[node] - self._mins[node]))
+            mid = (lo + hi) // 2
+            part = self._order[lo:hi]
+            self._order[lo:hi] = part[np.argpartition(points[:, axis], mid - lo)]
+            self._left[node] = self._build(lo, mid)
+            self._right[node] = self._build(mid, hi)
+        return node
+
+    def _box_distance(self, node, x):
+
+        # Load dependency
+        import numpy as np
+
+        gap = np.maximum(np.maximum(self._mins[node] - x, x - self._maxs[node]), 0)
+        return float(np.sqrt((gap ** 2).sum()))
+
+    def query_ball_point(self, x, r):
+        """Returns the indices of the points within distance r of x."""
+
+        # Load dependency
+        import numpy as np
+
+        found = []
+        stack = [0] if len(self.data) else []
+        while stack:
+            node = stack.pop()
+            if self._box_distance(node, x) > r:
+                continue
+            lo, hi = self._lo[node], self._hi[node]
+            far = np.maximum(np.abs(self._mins[node] - x), np.abs(self._maxs[node] - x))
+            if self._left[node] < 0 or np.sqrt((far ** 2).sum()) <= r:
+                idx = self._order[lo:hi]
+                found.append(idx[np.sqrt(((self.data[idx] - x) ** 2).sum(axis=1)) <= r])
+            else:
+                stack.extend([self._left[node], self._right[node]])
+        return np.concatenate(found).tolist() if found else []
+
+    def query(self, x, k=1):
+        """Returns the distances and indices of the k points nearest to x (inf and n past the last point)."""
+
+        # Load dependencies
+        import heapq
+        import numpy as np
+
+        best = []
+        heap = [(0.0, 0)] if len(self.data) else []
+        while heap:
+            bound, node = heapq.heappop(heap)
+            if len(best) == k and bound > -best[0][0]:
+                break
+            if self._left[node] >= 0:
+                for child in (self._left[node], self._right[node]):
+                    heapq.heappush(heap, (self._box_distance(child, x), child))
+                continue
+            idx = self._order[self._lo[node]:self._hi[node]]
+            for d, i in zip(np.sqrt(((self.data[idx] - x) ** 2).sum(axis=1)).tolist(), idx.tolist()):
+                if len(best) < k:
+                    heapq.heappush(best, (-d, i))
+                elif d < -best[0][0]:
+                    heapq.heapreplace(best, (-d, i))
+        best = sorted((-d, i) for d, i in best)
+        best += [(np.inf, len(self.data))] * (k - len(best))
+        return np.array([d for d, _ in best]), np.array([i for _, i in best])
+
+
+class SpatialIndex(object):
+    """Radius, nearest-neighbour and bounding-box lookups over body coordinates.
+
+    Built once from a laid-out SectorModel (from_model) or a layout snapshot (from_layout), on
+    scipy's cKDTree when it is installed and on a small KD-tree of its own otherwise. Bodies that
+    move, appear or disappear afterwards (move, remove, update) are set aside and checked directly,
+    until more than `rebuild` of the sector has changed and the tree is rebuilt.
+    """
+
+    def __init__(self, labels, positions, types=None, rebuild=0.1, leafsize=32):
+
+        # Load dependencies
+        import numpy as np
+        import pandas as pd
+
+        self.labels = pd.Index(labels)
+        self.positions = np.array(positions, dtype=np.float64)
+        self.types = None if types is None else np.asarray(types, dtype=object)
+        self.rebuild = rebuild
+        self.leafsize = leafsize
+        self._alive = np.ones(len(self.labels), dtype=bool)
+        self._build()
+
+    @classmethod
+    def from_model(cls, model, **kwargs):
+        """Indexes the bodies of a SectorModel with coordinates, in 3D when it has them."""
+        dim = 3 if model.has_coordinates(3) else 2
+        if not model.has_coordinates(dim):
+            raise ValueError('The sector has no coordinates; lay it out first (see prepare_sector).')
+        return cls(model.nodes['label'], model.positions(dim), types=model.nodes['type'], **kwargs)
+
+    @classmethod
+    def from_layout(cls, layout, **kwargs):
+        """Indexes the bodies of a layout snapshot (see layout_snapshot)."""
+        return cls(layout['labels'], layout['positions'], **kwargs)
+
+    def _build(self):
+
+        # Load dependency
+        import numpy as np
+
+        # Use SciPy's compiled KD-tree when it is installed
+        try:
+            from scipy.spatial import cKDTree as tree
+        except ImportError:
+            tree = _KDTree
+        with timed('spatial_index'):
+            self._indexed = np.flatnonzero(self._alive)
+            self._tree = tree(self.positions[self._indexed], leafsize=self.leafsize)
+            self._pending = np.zeros(len(self.labels), dtype=bool)
+        notify('size', 'spatial_index_bodies', len(self._indexed))
+
+    def __len__(self):
+        return int(self._alive.sum())
+
+    def move(self, labels, positions):
+        """Moves bodies to new coordinates, adding the labels the index does not know yet."""
+
+        # Load dependencies
+        import numpy as np
+        import pandas as pd
+
+        labels = pd.Index(labels)
+        positions = np.asarray(positions, dtype=np.float64).reshape(len(labels), self.positions.shape[1])
+        new = labels[self.labels.get_indexer(labels) < 0]
+        if len(new):
+            self.labels = self.labels.append(new)
+            self.positions = np.vstack([self.positions, np.zeros((len(new), self.positions.shape[1]))])
+            self._alive = np.concatenate([self._alive, np.ones(len(new), dtype=bool)])
+            self._pending = np.concatenate([self._pending, np.ones(len(new), dtype=bool)])
+            if self.types is not None:
+                self.types = np.concatenate([self.types, np.full(len(new), None, dtype=object)])
+        idx = self.labels.get_indexer(labels)
+        self.positions[idx] = positions
+        self._alive[idx] = True
+        self._pending[idx] = True
+        self._maybe_rebuild()
+
+    def remove(self, labels):
+        """Drops bodies from the results; unknown labels are ignored."""
+        idx = self.labels.get_indexer(labels)
+        self._alive[idx[idx >= 0]] = False
+        self._pending[idx[idx >= 0]] = True
+        self._maybe_rebuild()
+
+    def update(self, layout):
+        """Brings the index in line with a newer layout snapshot, moving only the bodies that changed."""
+
+        # Load dependencies
+        import numpy as np
+        import pandas as pd
+
+        labels = pd.Index(layout['labels'])
+        positions = np.asarray(layout['positions'], dtype=np.float64)
+
+        # An empty snapshot clears the index, whatever its dimension
+        if not len(labels):
+            positions = positions.reshape(0, self.positions.shape[1])
+        if positions.shape[1:] != self.positions.shape[1:]:
+            self.__init__(labels, positions, rebuild=self.rebuild, leafsize=self.leafsize)
+            return
+        idx = self.labels.get_indexer(labels)
+        changed = (idx < 0) | ~self._alive[idx]
+        changed[idx >= 0] |= (self.positions[idx[idx >= 0]] != positions[idx >= 0]).any(axis=1)
+        gone = self.labels[self._alive].difference(labels)
+        if len(gone):
+            self.remove(gone)
+        if changed.any():
+            self.move(labels[changed], positions[changed])
+
+    def _maybe_rebuild(self):
+        if self._pending.sum() > self.rebuild * max(len(self._indexed), 1):
+            self._build()
+
+    def _point(self, center):
+        """Resolves a body label or a coordinate to a point."""
+
+        # Load dependency
+        import numpy as np
+
+        if isinstance(center, str):
+            i = self.labels.get_indexer([center])[0]
+            if i < 0 or not self._alive[i]:
+                raise KeyError('Unknown bodies: {}'.format(center))
+            return self.positions[i]
+        return np.asarray(center, dtype=np.float64)
+
+    def _results(self, idx, x, where):
+        """Filters candidate bodies and sorts them by distance from x."""
+
+        # Load dependency
+        import numpy as np
+
+        idx = np.asarray(idx, dtype=np.int64)
+        idx = idx[self._alive[idx]]
+        if where is not None:
+            idx = idx[np.asarray(where, dtype=bool)[idx]]
+        dist = np.sqrt(((self.positions[idx] - x) ** 2).sum(axis=1))
+        order = np.argsort(dist, kind='stable')
+        return idx[order], dist[order]
+
+    def _candidates(self, idx):
+        """Combines tree hits, which may be stale, with the bodies set aside since the last build."""
+
+        # Load dependency
+        import numpy as np
+
+        idx = self._indexed[np.asarray(idx, dtype=np.int64)]
+        idx = idx[~self._pending[idx]]
+        return np.concatenate([idx, np.flatnonzero(self._pending & self._alive)])
+
+    def within(self, center, radius, where=None):
+        """Finds the bodies within `radius` of a body label or coordinate, nearest first.
+
+        `where` is an optional boolean mask over self.labels (e.g. self.types == 'Planet'). Returns a
+        DataFrame of 'label' and 'distance'; a body is included in its own results.
+        """
+        x = self._point(center)
+        idx, dist = self._results(self._candidates(self._tree.query_ball_point(x, radius)), x, where)
+        keep = dist <= radius
+        return self._frame(idx[keep], dist[keep])
+
+    def nearest(self, center, k=1, where=None, exclude=True):
+        """Finds the k bodies nearest to a body label or coordinate, nearest first.
+
+        With `exclude`, a body label is left out of its own results. `where` filters the bodies
+        as in within(). Returns a DataFrame of 'label' and 'distance'.
+        """
+
+        # Load dependency
+        import numpy as np
+
+        x = self._point(center)
+        mask = np.ones(len(self.labels), dtype=bool) if where is None else np.array(where, dtype=bool)
+        if exclude and isinstance(center, str):
+            mask[self.labels.get_indexer([center])[0]] = False
+
+        # Widen the search until k bodies pass the filters, or the whole tree has been searched
+        want = k
+        while True:
+            want = min(2 * want, len(self._indexed))
+            reach, hits = self._tree.query(x, k=want) if want else (np.zeros(0), np.zeros(0, dtype=np.int64))
+            reach, hits = np.atleast_1d(reach), np.atleast_1d(hits)
+            hits = hits[hits < len(self._indexed)]
+            idx, dist = self._results(self._candidates(hits), x, mask)
+
+            # Only bodies within the searched radius are certain to be the nearest
+            if want < len(self._indexed):
+                covered = dist <= reach[-1]
+                idx, dist = idx[covered], dist[covered]
+            if len(idx) >= k or want >= len(self._indexed):
+                return self._frame(idx[:k], dist[:k])
+
+    def in_box(self, lower, upper, where=None):
+        """Finds the bodies inside an axis-aligned box given by its lower and upper corners.
+
+        Returns a DataFrame of 'label' and 'distance' (from the box centre), nearest first.
+        """
+
+        # Load dependency
+        import numpy as np
+
+        lower, upper = np.asarray(lower, dtype=np.float64), np.asarray(upper, dtype=np.float64)
+        x = (lower + upper) / 2
+        radius = float(np.sqrt((((upper - lower) / 2) ** 2).sum()))
+        idx, dist = self._results(self._candidates(self._tree.query_ball_point(x, radius)), x, where)
+        keep = ((self.positions[idx] >= lower) & (self.positions[idx] <= upper)).all(axis=1)
+        return self._frame(idx[keep], dist[keep])
+
+    def _frame(self, idx, dist):
+
+        # Load dependency
+        import pandas as pd
+
+        return pd.DataFrame({'label': self.labels[idx], 'distance': dist})
+
+# vis-network, as bundled with pyvis; pages reference these files instead of inlining them
+VIS_VERSION = '9.1.2'
+VIS_ASSETS = {'js': 'vis-network.min.js', 'css': 'vis-network.css'}
+VIS_CDN = {'js': 'https://cdnjs.cloudflare.com/ajax/libs/vis-network/9.1.2/dist/vis-network.min.js',
+           'css': 'https://cdnjs.cloudflare.com/ajax/libs/vis-network/9.1.2/dist/dist/vis-network.min.css'}
+NETWORK_OPTIONS = {'nodes': {'physics': False},
+                   'layout': {'hierarchical': False}}
+NETWORK_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<link rel="stylesheet" href="{css}">
+<script src="{js}"></script>
+</head>
+<body>
+<div id="{id}" style="width: {width}; height: {height}; background-color: {bgcolor};"></div>
+<script>
+new vis.Network(document.getElementById("{id}"),
+                {{nodes: new vis.DataSet({nodes}), edges: new vis.DataSet({edges})}},
+                {options});
+</script>
+</body>
+</html>
+"""
+
+
+def vis_asset_dir():
+    """Returns the directory holding the vis-network files that ship with pyvis, for serving them locally."""
+
+    # Load dependency
+    import pyvis
+
+    return os.path.join(os.path.dirname(pyvis.__file__), 'lib', 'vis-' + VIS_VERSION)
+
+
+def network_data(model):
+    """Converts a laid-out SectorModel into vis-network node and edge dictionaries."""
+
+    # Populate the nodes and edges straight from the sector columns
+    labels = model.nodes['label'].tolist()
+    nodes = [{'value': value, 
+              'type': kind, 
+              'x': x*50, 
+              'y': y*-50, 
+              'title': label + "\n" + md, 
+              'color': color,
+              'shape': shape,
+              'image': image,
+              'font': {'color': '#8bad6b', 'face': 'Serif'},
+              'size': 10,
+              'id': label,
+              'label': label}
+             for label, value, kind, x, y, md, color, shape, image in zip(labels,
+                                                                          model.nodes['value'].tolist(),
+                                                                          model.nodes['type'].tolist(),
+                                                                          model.nodes['x'].tolist(),
+                                                                          model.nodes['y'].tolist(),
+                                                                          model.nodes['description_md'].tolist(),
+                                                                          model.nodes['color'].tolist(),
+                                                                          model.nodes['shape'].tolist(),
+                                                                          model.nodes['image'].tolist())]
+
+    ## Set edge width to 2
+    ## [Note: will not be applicable for all sector sizes, 
+    ##        need to set relative sizes based on input features]
+    edges = [{'type': kind,
+              'color': color,
+              'dashes': dashes,
+              'width': 2,
+              'from': labels[u],
+              'to': labels[v]}
+             for u, v, kind, color, dashes in zip(model.edges['source'].tolist(),
+                                                  model.edges['target'].tolist(),
+                                                  model.edges['type'].tolist(),
+                                                  model.edges['color'].tolist(),
+                                                  model.edges['dashes'].tolist())]
+    return nodes, edges
+
+
+def network_html(model, width='100%', height='100vh', asset_url=None, bgcolor='#031101'):
+    """Writes a laid-out SectorModel as a standalone vis-network page.
+
+    The viewport is `width` by `height` in CSS units, so '100%' or '100vh' follow the window. The
+    page links vis-network from `asset_url` (e.g. a route serving vis_asset_dir()) or, when that is
+    None, from a CDN, so browsers cache the library instead of receiving it with every page.
+    """
+
+    # Load dependency
+    import json
+
+    if asset_url is None:
+        assets = VIS_CDN
+    else:
+        assets = {k: '{}/{}'.format(asset_url.rstrip('/'), v) for k, v in VIS_ASSETS.items()}
+
+    # Keep descriptions from closing the script block early
+    def script(value):
+        return json.dumps(value, separators=(',', ':')).replace('</', '<\\/')
+
+    nodes, edges = network_data(model)
+    return NETWORK_TEMPLATE.format(css=assets['css'], js=assets['js'], id='sector-' + content_hash(model.nodes['label'])[:8],
+                                   width=width, height=height, bgcolor=bgcolor,
+                                   nodes=script(nodes), edges=script(edges), options=script(NETWORK_OPTIONS))
+
+
+def dynamic_sector_2d(system_data, sector_map=None, seed=DEFAULT_SEED, cache=True, layout='auto', previous=None,
+                      width='100%', height='100vh', asset_url=None, notebook=True):
+    """Generates 2D sector map based on data provided by the user.
+
+    The map fills a `width` by `height` viewport (CSS units) and loads vis-network from
+    `asset_url`, or a CDN by default (see network_html). Returns an IPython HTML object, or the
+    page as a string with notebook=False, which needs neither IPython nor a display. Without a
+    sector map, `system_data` is the path of a compiled sector bundle (see write_bundle).
+    """
+
+    # Build the sector and its layout, or open it ready-made
+    if sector_map is None:
+        model = load_bundle(system_data, 2)
+    else:
+        model = prepare_sector(system_data, sector_map, 2, seed=seed, cache=cache, layout=layout, previous=previous)
+    
+    # Return html object
+    with timed('serialize'):
+        html_string = network_html(model, width=width, height=height, asset_url=asset_url)
+    if not notebook:
+        return html_string
+
+    # Load dependency
+    from IPython.display import HTML
+
+    return HTML(html_string)
+
+
+def thin_routes(pos, source, target, max_edges):
+    """Picks at most `max_edges` routes, keeping one representative per bundle of parallel routes.
+
+    Routes are bundled by the grid cells their endpoints fall in; the finest grid whose bundles
+    fit the budget is used, so sparse regions keep every route while dense ones are thinned out.
+    Returns the indices of the kept routes.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    n = len(source)
+    if max_edges is None or n <= max_edges:
+        return np.arange(n)
+    if max_edges <= 0:
+        return np.arange(0)
+    lo = pos.min(axis=0)
+    span = np.maximum(np.ptp(pos, axis=0), 1e-12)
+    for r in [1024, 512, 256, 128, 64, 32, 16, 8, 4, 2, 1]:
+        cell = np.minimum(((pos - lo) / span * r).astype(np.int64), r - 1)
+        cell = (cell[:, 0] * r + cell[:, 1]) * r + cell[:, 2] if pos.shape[1] == 3 else cell[:, 0] * r + cell[:, 1]
+        a, b = cell[source], cell[target]
+        _, keep = np.unique(np.stack([np.minimum(a, b), np.maximum(a, b)], axis=1), axis=0, return_index=True)
+        if len(keep) <= max_edges:
+            return np.sort(keep)
+    return np.sort(keep)[:max_edges]
+
+
+def dynamic_sector_3d(system_data, sector_map=None, seed=DEFAULT_SEED, cache=True, layout='auto', previous=None, max_edges=None):
+    """Generates 3D sector map based on data provided by the user, or from a compiled sector bundle's path (see dynamic_sector_2d)."""
+    if sector_map is None:
+        model = load_bundle(system_data, 3)
+    else:
+        model = prepare_sector(system_data, sector_map, 3, seed=seed, cache=cache, layout=layout, previous=previous)
+    with timed('figure'):
+        return sector_figure(model, max_edges=max_edges)
+
+
+def sector_figure(model, max_edges=None, path=None, marked=None, customdata=None):
+    """Draws a laid-out SectorModel as a 3D plotly figure.
+
+    Routes are drawn as one uniformly colored trace per route type, leaving hidden routes out.
+    With `max_edges`, visible routes beyond that budget are thinned out (see thin_routes). The
+    first trace highlights `path`, a list of body labels (e.g. from RoutePlanner.route), and the
+    second rings the bodies in `marked` (e.g. from SpatialIndex.within); both are empty without
+    them, so they can be drawn onto the figure later (see route_coordinates). `customdata`, one
+    value per body, is attached to the node trace and comes back with click events.
+    """
+    
+    # Load dependencies
+    import numpy as np
+    import pandas as pd
+    import plotly.graph_objects as go
+    
+    pos = model.positions(3) * np.array(FIGURE_SCALE)
+        
+    # Resize astronomical objects to vaguely resemble relative size of sun and planets
+    # [Note: will not be applicable for all sector sizes, 
+    #        need to set relative sizes based on input features]
+    is_sun = model.nodes['type'] == 'Sun'
+    sizes = model.nodes['value'] * np.where(is_sun, 2000, 140000)
+            
+    # Keep the visible routes, within the level-of-detail budget
+    visible = np.flatnonzero(model.edges['color'] != HIDDEN)
+    visible = visible[thin_routes(pos, model.edges['source'][visible], model.edges['target'][visible], max_edges)]
+    
+    # Highlighted route, drawn over everything else
+    highlight = pos[model.index_of(path)] if path else np.zeros((0, 3))
+    route_trace = go.Scatter3d(x=highlight[:, 0], 
+                               y=highlight[:, 1], 
+                               z=highlight[:, 2],
+                               mode='lines',
+                               name='Route',
+                               line=dict(color=ROUTE_HIGHLIGHT,
+                                         width=10),
+                               hoverinfo='none')
+    
+    # Marked bodies, ringed
+    ringed = pos[model.index_of(marked)] if marked else np.zeros((0, 3))
+    range_trace = go.Scatter3d(x=ringed[:, 0],
+                               y=ringed[:, 1],
+                               z=ringed[:, 2],
+                               mode='markers',
+                               name='Range',
+                               marker=dict(size=14,
+                                           symbol='circle-open',
+                                           color=RANGE_HIGHLIGHT),
+                               hoverinfo='none')
+    
+    # One line trace per route type, named as in ROUTE_STYLES, separating each segment with a gap
+    edge_traces = [route_trace, range_trace]
+    types = pd.Series(model.edges['type'][visible])
+    codes, kinds = pd.factorize(types.map({t: route_name(t) for t in types.unique()}))
+    for code, kind in enumerate(kinds):
+        ids = visible[codes == code]
+        segments = np.full((len(ids), 3, 3), np.nan)
+        segments[:, 0, :] = pos[model.edges['source'][ids]]
+        segments[:, 1, :] = pos[model.edges['target'][ids]]
+        edge_traces.append(go.Scatter3d(x=segments[:, :, 0].ravel(), 
+                                        y=segments[:, :, 1].ravel(), 
+                                        z=segments[:, :, 2].ravel(),
+                                        mode='lines',
+                                        name=str(kind),
+                                        line=dict(color=model.edges['color'][ids[0]],
+                                                  width=5),
+                                        opacity=0.3,
+                                        hoverinfo='none'))
+    
+    # Create plotly graph object
+    x_nodes, y_nodes, z_nodes = pos[:, 0], pos[:, 1], pos[:, 2]
+        
+    node_trace = go.Scatter3d(x=x_nodes, y=y_nodes, z=z_nodes,
+                              mode='markers',
+                              marker=dict(size=sizes, 
+                                          color=model.nodes['fill'].tolist()),
+                              hoverinfo='text',
+                              text=("<b>" + model.nodes['label'].astype(str).astype(object) + "</b> (" + model.nodes['type'].astype(str).astype(object) + ")<br><br>" + model.nodes['description_html']).tolist(),
+                              customdata=None if customdata is None else list(customdata)
+                              )
+
+    layout = go.Layout(scene=dict(xaxis=dict(visible=False,
+                                             range=[x_nodes.min(), x_nodes.max()]),
+                                  yaxis=dict(visible=False,
+                                             range=[y_nodes.min(), y_nodes.max()]),
+                                  zaxis=dict(visible=False,
+                                             range=[z_nodes.min(), z_nodes.max()])),
+                       paper_bgcolor='rgba(0,0,0,0)',
+                       plot_bgcolor='rgba(0,0,0,0)')
+    
+    fig = go.Figure(data=edge_traces + [node_trace], layout=layout)
+    fig.update(layout_showlegend=False) 
+    fig.update_xaxes(showticklabels=False, showgrid=False, zeroline=False)
+    fig.update_yaxes(showticklabels=False, showgrid=False, zeroline=False)
+    fig.update_layout(autosize=True,
+                      width=None,
+                      height=None,
+                      uirevision='sector',
+                      margin=dict(l=0,r=0,t=0,b=0),
+                      hoverlabel=dict(bgcolor="#000d03",
+                                      font_size=16,
+                                      font_family="Courier New"))
+    
+    # Convert plotly graph object to html and return html object
+    return fig
+
+
+def interaction_data(model):
+    """Collects what the dashboard's clientside interactions need to restyle a figure in the browser.
+
+    Bodies are in the order of the figure's node trace: their fill colors, threat levels, and
+    neighbours as CSR lists (the neighbours of body i are indices[indptr[i]:indptr[i + 1]]).
+    """
+
+    # Load dependency
+    import pandas as pd
+
+    threat = pd.Series(model.nodes.get('threat level', [None] * model.n_nodes), dtype=object)
+    return {'fill': model.nodes['fill'].tolist(),
+            'threat': threat.where(threat.notna(), None).astype(object).tolist(),
+            'indptr': model.indptr.tolist(),
+            'indices': model.indices.tolist()}
+
+
+# Level of detail: star systems collapse into one body each, and expanded systems add at most this
+# many bodies; systems near the focus of a camera closer than LOD_ZOOM (plotly's default is ~2.2) expand
+LOD_MAX_EXPANDED = 2000
+LOD_ZOOM = 1.0
+
+# Past LOD_MAX_SYSTEMS systems, nearby ones are grouped into regions drawn as one body each, and
+# routes between the drawn bodies are thinned out beyond LOD_MAX_ROUTES (see thin_routes)
+LOD_MAX_SYSTEMS = 5000
+LOD_MAX_ROUTES = 20000
+REGION_PREFIX = 'region:'
+
+# System memberships are keyed by the sector topology, like layouts
+cluster_cache = TieredCache('clusters', _array_dumps, _array_loads)
+
+
+def system_clusters(model, cache=True):
+    """Groups the bodies of a SectorModel into star systems, the groups joined by In-System routes.
+
+    Returns an array mapping every body to its system (numbered 0..k-1), and each system's anchor
+    body: its largest sun, or its first body when it has none. Memberships are memoized in
+    `cluster_cache`.
+    """
+
+    # Load dependencies
+    import numpy as np
+    import pandas as pd
+
+    key = content_hash('clusters-v1', model.nodes['label'], model.edges['source'], model.edges['target'],
+                       model.edges['type'])
+    system = cluster_cache.get(key) if cache else None
+    if system is None:
+        inside = (pd.Series(model.edges['type']).map(route_kind) == 'insystem').to_numpy()
+        system = connected_components(model.n_nodes, model.edges['source'][inside], model.edges['target'][inside])
+        if cache:
+            cluster_cache.put(key, system)
+
+    # Within each system, suns come first, larger ones before smaller ones
+    is_sun = model.nodes['type'] == 'Sun'
+    order = np.lexsort((-np.nan_to_num(model.nodes['value']), ~is_sun, system))
+    first = np.r_[True, system[order][1:] != system[order][:-1]] if len(order) else np.zeros(0, dtype=bool)
+    return system, order[first]
+
+
+def system_regions(pos, sizes, max_regions):
+    """Groups star systems into at most `max_regions` regions by the grid cells their anchors fall in.
+
+    `pos` holds the anchors' coordinates and `sizes` the systems' body counts. As in thin_routes,
+    the finest grid that fits the budget is used. Returns an array mapping every system to its
+    region (numbered 0..r-1), and each region's lead system: its largest, or its first one on ties.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    k = len(sizes)
+    if k <= max_regions:
+        return np.arange(k), np.arange(k)
+    lo = pos.min(axis=0)
+    span = np.maximum(np.ptp(pos, axis=0), 1e-12)
+    for r in [1024, 512, 256, 128, 64, 32, 16, 8, 4, 2, 1]:
+        cell = np.minimum(((pos - lo) / span * r).astype(np.int64), r - 1)
+        cell = (cell[:, 0] * r + cell[:, 1]) * r + cell[:, 2] if pos.shape[1] == 3 else cell[:, 0] * r + cell[:, 1]
+        cells, region = np.unique(cell, return_inverse=True)
+        if len(cells) <= max_regions:
+            break
+    region = region.ravel()
+    order = np.lexsort((np.arange(k), -sizes, region))
+    first = np.r_[True, region[order][1:] != region[order][:-1]]
+    return region, order[first]
+
+
+def lod_model(model, clusters=None, expanded=(), max_expanded=LOD_MAX_EXPANDED, max_systems=LOD_MAX_SYSTEMS,
+              max_edges=LOD_MAX_ROUTES):
+    """Collapses the star systems of a laid-out SectorModel into one body each, for drawing large sectors.
+
+    Each system is drawn as its anchor (see system_clusters), described with the number of bodies
+    it holds. Past `max_systems` systems, nearby ones are grouped into regions (see system_regions),
+    each drawn as the anchor of its lead system. Systems listed in `expanded` (by anchor label) keep
+    their bodies and regions listed there (by REGION_PREFIX and the lead's anchor label) their
+    systems, in the order given, as long as that adds at most `max_expanded` bodies in all; expanding
+    a system also expands its region. Routes are redrawn between the remaining bodies, merging those
+    that link the same pair with the same route type into the shortest one, and visible ones beyond
+    `max_edges` are thinned out (see thin_routes). Returns the collapsed SectorModel and the system
+    (anchor label), or the region of collapsed regions, of each of its bodies.
+    """
+
+    # Load dependencies
+    import numpy as np
+    import pandas as pd
+
+    system, anchor = clusters if clusters is not None else system_clusters(model)
+    k = len(anchor)
+    sizes = np.bincount(system, minlength=k)
+    anchor_labels = model.nodes['label'][anchor]
+    region, lead = system_regions(model.positions(3)[anchor], sizes, max_systems)
+    region_sizes = np.bincount(region, minlength=len(lead))
+    region_labels = np.array([REGION_PREFIX + str(label) for label in anchor_labels[lead]], dtype=object)
+
+    # Open the expanded regions and systems while the budget allows; regions of a single system
+    # are open from the start
+    region_open = region_sizes == 1
+    opened = np.zeros(k, dtype=bool)
+    budget = max_expanded
+    order = []
+    expanded = list(expanded)
+    systems = pd.Index(anchor_labels).get_indexer(expanded)
+    regions = pd.Index(region_labels).get_indexer(expanded)
+    for s, r in zip(systems, regions):
+        if s < 0 and r < 0 or s >= 0 and opened[s]:
+            continue
+        r = region[s] if s >= 0 else r
+        cost = (0 if region_open[r] else region_sizes[r] - 1) + (sizes[s] - 1 if s >= 0 else 0)
+        if cost > budget:
+            continue
+        if not region_open[r]:
+            region_open[r] = True
+            order.append(('region', r))
+        if s >= 0:
+            opened[s] = True
+            order.append(('system', s))
+        budget -= cost
+
+    # Region leads come first and stand in for their regions; the other systems of open regions and
+    # the other bodies of open systems follow in the order they were expanded, so expanding one
+    # more only appends to the figure
+    members = np.argsort(system, kind='stable')
+    start = np.r_[0, np.cumsum(sizes)]
+    region_members = np.argsort(region, kind='stable')
+    region_start = np.r_[0, np.cumsum(region_sizes)]
+    is_lead = np.zeros(k, dtype=bool)
+    is_lead[lead] = True
+    rest = []
+    for kind, i in order:
+        if kind == 'region':
+            ids = region_members[region_start[i]:region_start[i + 1]]
+            rest.append(anchor[ids[~is_lead[ids]]])
+        else:
+            ids = members[start[i]:start[i + 1]]
+            rest.append(ids[ids != anchor[i]])
+    kept = np.concatenate([anchor[lead]] + rest).astype(np.int64)
+    point = np.full(model.n_nodes, -1, dtype=np.int64)
+    point[kept] = np.arange(len(kept))
+    shown = np.where(region_open[region], anchor, anchor[lead[region]])
+    closed = ~opened[system]
+    point[closed] = point[shown[system[closed]]]
+
+    # Describe collapsed regions and systems, and tag each body with what expands it
+    nodes = {col: values[kept] for col, values in model.nodes.items()}
+    of = system[kept]
+    grouped = ~region_open[region[of]]
+    collapsed = ~grouped & ~opened[of] & (sizes[of] > 1)
+    totals = np.bincount(region, weights=sizes, minlength=len(lead)).astype(np.int64)
+    nodes['description_html'] = nodes['description_html'].astype(object)
+    nodes['description_html'][grouped] = ['<i>Region of {} systems and {} bodies, click to expand</i><br><br>'.format(count, total) + text
+                                          for count, total, text in zip(region_sizes[region[of][grouped]],
+                                                                        totals[region[of][grouped]],
+                                                                        nodes['description_html'][grouped])]
+    nodes['description_html'][collapsed] = ['<i>System of {} bodies, click to expand</i><br><br>'.format(size) + text
+                                            for size, text in zip(sizes[of][collapsed],
+                                                                  nodes['description_html'][collapsed])]
+    tags = anchor_labels[of].astype(object)
+    tags[grouped] = region_labels[region[of][grouped]]
+
+    # Merge routes that now share their ends and type, keeping the shortest
+    source, target = point[model.edges['source']], point[model.edges['target']]
+    codes = pd.factorize(pd.Series(model.edges['type']))[0].astype(np.int64)
+    pair = (np.minimum(source, target) * len(kept) + np.maximum(source, target)) * (codes.max(initial=0) + 1) + codes
+    ids = np.flatnonzero(source != target)
+    ids = ids[np.lexsort((model.edges['weight'][ids], pair[ids]))]
+    ids = ids[np.r_[True, pair[ids][1:] != pair[ids][:-1]]] if len(ids) else ids
+    ids = np.sort(ids)
+
+    # Thin out the visible routes beyond the budget; hidden ones only join the bodies of open systems
+    visible = model.edges['color'][ids] != HIDDEN
+    thinned = ids[visible][thin_routes(model.positions(3)[kept], source[ids[visible]], target[ids[visible]], max_edges)]
+    ids = np.sort(np.concatenate([ids[~visible], thinned]))
+    edges = {col: values[ids] for col, values in model.edges.items()}
+    edges['source'], edges['target'] = source[ids].astype(np.int32), target[ids].astype(np.int32)
+
+    return SectorModel(nodes, edges), tags
+
+
+def lod_focus(systems, camera, zoom=LOD_ZOOM, max_expanded=LOD_MAX_EXPANDED):
+    """Picks the systems to expand around where a zoomed-in 3D camera looks.
+
+    `systems` is the 'systems' entry of a render_sector_lod result and `camera` a plotly scene
+    camera. The point looked at and the radius in view are approximated from the camera's
+    centre and distance, taking the scene to be a cube over the systems' extent. Returns anchor
+    labels, nearest first and within the point budget, or none when the camera is not zoomed in.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    eye = np.array([camera.get('eye', {}).get(a, 0) for a in 'xyz'], dtype=np.float64)
+    center = np.array([camera.get('center', {}).get(a, 0) for a in 'xyz'], dtype=np.float64)
+    distance = float(np.sqrt(((eye - center) ** 2).sum()))
+    if distance >= zoom or not systems.get('labels'):
+        return []
+    pos = np.asarray(systems['positions'], dtype=np.float64)
+    lower, upper = pos.min(axis=0), pos.max(axis=0)
+    focus = (lower + upper) / 2 + center * (upper - lower)
+    radius = distance * float((upper - lower).max()) / 2
+
+    sizes = dict(zip(systems['labels'], systems['sizes']))
+    budget = max_expanded
+    chosen = []
+    for label in SpatialIndex(systems['labels'], pos).within(focus, radius)['label']:
+        if 1 < sizes[label] <= budget + 1:
+            chosen.append(label)
+            budget -= sizes[label] - 1
+    return chosen
+
+
+def typed_array(values, dtype='<f4'):
+    """Encodes numbers as a plotly.js base64 typed array spec, with None becoming NaN."""
+
+    # Load dependencies
+    import base64
+    import numpy as np
+
+    array = np.asarray(values, dtype=np.float64 if np.dtype(dtype).kind == 'f' else None).astype(dtype)
+    return {'dtype': np.dtype(dtype).str[1:], 'bdata': base64.b64encode(array.tobytes()).decode('ascii')}
+
+
+def pack_figure(figure, min_length=64, max_colors=4096):
+    """Rewrites the coordinates, sizes and colors of a figure dictionary as base64 typed arrays.
+
+    Only arrays of at least `min_length` entries are packed. Color lists that repeat their colors,
+    with at most `max_colors` distinct ones, become integer codes into a discrete colorscale. Needs plotly.js
+    2.28 or later on the client; Dash 2.17+ serves the one bundled with plotly.py, which has it from
+    plotly 5.19 on.
+    """
+
+    # Load dependencies
+    import numpy as np
+    import pandas as pd
+
+    for trace in figure.get('data', []):
+        for axis in ['x', 'y', 'z']:
+            if isinstance(trace.get(axis), list) and len(trace[axis]) >= min_length:
+                trace[axis] = typed_array([np.nan if v is None else v for v in trace[axis]])
+        marker = trace.get('marker', {})
+        if isinstance(marker.get('size'), list) and len(marker['size']) >= min_length:
+            marker['size'] = typed_array(marker['size'])
+        if isinstance(marker.get('color'), list) and len(marker['color']) >= min_length:
+            codes, colors = pd.factorize(pd.Series(marker['color'], dtype=object))
+            if len(colors) == 1 and (codes >= 0).all():
+                marker['color'] = colors[0]
+            elif len(colors) <= min(max_colors, len(codes) // 2) and (codes >= 0).all():
+                marker.update(color=typed_array(codes, '<u2' if len(colors) > 256 else '<u1'),
+                              colorscale=[[float(v), c] for v, c in zip(np.linspace(0, 1, len(colors)), colors)],
+                              cmin=0, cmax=len(colors) - 1, showscale=False)
+    return figure
+
+
+def figure_changes(previous, figure, max_items=0.1):
+    """Lists what differs between two figure dictionaries, for sending partial updates (e.g. dash.Patch).
+
+    Returns ('set', path, value), ('append', path, trace) and ('delete', path, None) operations in
+    the order they apply, where a path is a tuple of keys and indices (e.g. ('data', 2, 'x')).
+    Trace properties and layout entries are compared whole, so unchanged node text or route
+    coordinates are left out; lists of equal length where at most `max_items` of the entries
+    changed (such as a few edited descriptions) are updated entry by entry, and lists that only
+    grew are extended (('extend', path, items)).
+    """
+    changes = []
+    old, new = previous.get('data', []), figure.get('data', [])
+    for i, (before, after) in enumerate(zip(old, new)):
+        for key in sorted(set(before) | set(after)):
+            if key not in after:
+                changes.append(('delete', ('data', i, key), None))
+            elif before.get(key) == after[key]:
+                continue
+            elif isinstance(before.get(key), list) and isinstance(after[key], list) and len(before[key]) <= len(after[key]):
+                m = len(before[key])
+                edited = [j for j, (a, b) in enumerate(zip(before[key], after[key])) if a != b]
+                if len(edited) <= max_items * m:
+                    changes.extend(('set', ('data', i, key, j), after[key][j]) for j in edited)
+                    if len(after[key]) > m:
+                        changes.append(('extend', ('data', i, key), after[key][m:]))
+                else:
+                    changes.append(('set', ('data', i, key), after[key]))
+            else:
+                changes.append(('set', ('data', i, key), after[key]))
+    for i in range(len(old) - 1, len(new) - 1, -1):
+        changes.append(('delete', ('data', i), None))
+    for i in range(len(old), len(new)):
+        changes.append(('append', ('data',), new[i]))
+    before, after = previous.get('layout', {}), figure.get('layout', {})
+    for key in sorted(set(before) | set(after)):
+        if key not in after:
+            changes.append(('delete', ('layout', key), None))
+        elif before.get(key) != after[key]:
+            changes.append(('set', ('layout', key), after[key]))
+    return changes
+
+
+def frame_hash(df):
+    """Hashes a data frame by content, ignoring its index, column order and numeric dtype widths.
+
+    Numbers are rounded to 9 decimals, so a frame that has been through JSON hashes the same.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    parts = [len(df)]
+    for col in sorted(df.columns, key=str):
+        values = df[col].to_numpy()
+        if values.dtype.kind in 'biuf':
+            values = np.round(values.astype(np.float64), 9)
+        else:
+            values = values.astype(str).astype(object)
+        parts.extend([str(col), values])
+    return content_hash(*parts)
+
+
+def sector_key(system_data, sector_map, **options):
+    """Hashes the system data, sector map and render options into a render cache key."""
+    return content_hash(RENDER_VERSION, frame_hash(system_data), frame_hash(sector_map), sorted(options.items()))
+
+
+def render_sector_3d(system_data, sector_map, seed=DEFAULT_SEED, cache=True, layout='auto', previous=None, max_edges=None, binary=False):
+    """Renders the 3D sector as a plain figure dictionary, together with its layout snapshot.
+
+    Results are memoized in `render_cache` under `sector_key`, so showing a sector that has been
+    rendered before (from the same `previous` layout, if any) costs a lookup instead of a rebuild. Colors are seeded, which keeps cached
+    figures identical to fresh ones. With `binary`, the figure is packed with pack_figure.
+    """
+    key = sector_key(system_data, sector_map, seed=seed, layout=layout, previous=snapshot_key(previous),
+                     max_edges=max_edges, binary=binary)
+    if cache:
+        hit = render_cache.get(key)
+        if hit is not None:
+            return hit
+
+    # Load dependency
+    import json
+
+    model = prepare_sector(system_data, sector_map, 3, seed=seed, cache=cache, layout=layout, previous=previous)
+    with timed('figure'):
+        figure = sector_figure(model, max_edges=max_edges)
+    with timed('serialize'):
+        rendered = {'key': key,
+                    'figure': json.loads(figure.to_json()),
+                    'layout': layout_snapshot(model),
+                    'interaction': interaction_data(model)}
+        if binary:
+            pack_figure(rendered['figure'])
+    if OBSERVERS:
+        notify('size', 'payload_bytes', len(_json_dumps(rendered['figure'])))
+    if cache:
+        render_cache.put(key, rendered)
+    return rendered
+
+
+def render_sector_lod(system_data, sector_map, seed=DEFAULT_SEED, cache=True, layout='auto', previous=None,
+                      expanded=(), max_expanded=LOD_MAX_EXPANDED, max_systems=LOD_MAX_SYSTEMS, max_edges=LOD_MAX_ROUTES,
+                      binary=False):
+    """Renders the 3D sector with its star systems collapsed (see lod_model), like render_sector_3d.
+
+    The result also lists the systems ('systems': anchor labels, figure coordinates, body counts
+    and the expanded ones), for picking systems to expand with lod_focus. The node trace carries
+    each body's system (or region, see lod_model) as customdata, and the layout snapshot covers
+    every body. The figure holds at most `max_systems` regions plus the expanded bodies, and at
+    most `max_edges` visible routes.
+    """
+    expanded = list(expanded)
+    key = sector_key(system_data, sector_map, seed=seed, layout=layout, previous=snapshot_key(previous), lod=True,
+                     expanded=expanded, max_expanded=max_expanded, max_systems=max_systems, max_edges=max_edges,
+                     binary=binary)
+    if cache:
+        hit = render_cache.get(key)
+        if hit is not None:
+            return hit
+
+    # Load dependencies
+    import json
+    import numpy as np
+
+    model = prepare_sector(system_data, sector_map, 3, seed=seed, cache=cache, layout=layout, previous=previous)
+    with timed('clusters'):
+        system, anchor = system_clusters(model, cache=cache)
+        lod, systems = lod_model(model, (system, anchor), expanded, max_expanded, max_systems, max_edges)
+    with timed('figure'):
+        figure = sector_figure(lod, customdata=systems)
+    with timed('serialize'):
+        labels, counts = np.unique(systems, return_counts=True)
+        rendered = {'key': key,
+                    'figure': json.loads(figure.to_json()),
+                    'layout': layout_snapshot(model),
+                    'interaction': interaction_data(lod),
+                    'systems': {'labels': model.nodes['label'][anchor].tolist(),
+                                'positions': (model.positions(3)[anchor] * np.array(FIGURE_SCALE)).tolist(),
+                                'sizes': np.bincount(system, minlength=len(anchor)).tolist(),
+                                'expanded': labels[counts > 1].tolist()}}
+        if binary:
+            pack_figure(rendered['figure'])
+    if OBSERVERS:
+        notify('size', 'payload_bytes', len(_json_dumps(rendered['figure'])))
+    if cache:
+        render_cache.put(key, rendered)
+    return rendered
+
+
+def render_sector_2d(system_data, sector_map, seed=DEFAULT_SEED, cache=True, layout='auto', previous=None,
+                     width='100%', height='100vh', asset_url=None):
+    """Renders the 2D sector as a vis-network page (see network_html), together with its layout snapshot.
+
+    Like render_sector_3d, results are memoized in `render_cache`, so a sector that has been shown
+    before costs a lookup.
+    """
+    key = sector_key(system_data, sector_map, view='2d', seed=seed, layout=layout, previous=snapshot_key(previous),
+                     width=width, height=height, asset_url=asset_url)
+    if cache:
+        hit = render_cache.get(key)
+        if hit is not None:
+            return hit
+
+    model = prepare_sector(system_data, sector_map, 2, seed=seed, cache=cache, layout=layout, previous=previous)
+    with timed('serialize'):
+        rendered = {'key': key,
+                    'html': network_html(model, width=width, height=height, asset_url=asset_url),
+                    'layout': layout_snapshot(model)}
+    if OBSERVERS:
+        notify('size', 'payload_bytes', len(rendered['html']))
+    if cache:
+        render_cache.put(key, rendered)
+    return rendered
+
+
+# Background jobs keep their state and progress here for an hour, read from disk on every poll;
+# their results go to render_cache, so polls only read a few small entries
+JOB_TTL = 60 * 60
+job_store = TieredCache('jobs', _json_dumps, _json_loads, max_items=0, max_bytes=64 * 2**20, ttl=JOB_TTL)
+
+# Share of a render done once each pipeline stage has finished
+JOB_STAGES = {'build': 0.1, 'layout': 0.8, 'figure': 0.9, 'serialize': 1.0}
+
+
+class JobCancelled(Exception):
+    """Raised inside a background job that has been cancelled, to abandon it at the next stage."""
+
+
+def _job_entry(key, run, part):
+    """Names the job store entry holding one part ('progress' or 'cancelled') of a run of a job."""
+    return '{}-{}-{}'.format(key, run, part)
+
+
+def _job_part(value):
+    """Reduces a job argument to something content_hash hashes in full, without going through repr.
+
+    Data frames are hashed by content, dictionaries item by item and lists as NumPy arrays, so a
+    layout snapshot's positions are hashed as float64 bytes.
+    """
+
+    # Load dependency
+    import numpy as np
+
+    if hasattr(value, 'columns'):
+        return frame_hash(value)
+    if isinstance(value, dict):
+        return content_hash(*[part for name in sorted(value, key=str) for part in (name, _job_part(value[name]))])
+    if isinstance(value, (list, tuple)):
+        try:
+            array = np.asarray(value)
+        except ValueError:
+            return value
+        if array.dtype != object:
+            return array
+    return value
+
+
+def _run_pool_job(store, key, run, job):
+    """Runs a RenderPool job in a worker process, recording its progress in `store`.
+
+    The worker only writes its run's own progress entry, and stops once the run's cancellation
+    entry (written by RenderPool.release) appears, so a cancellation is never overwritten. The
+    result goes to render_cache, under the key the render already stored it with or else the
+    job's. Returns the pipeline events seen along the way, for the submitting process to replay.
+    """
+    events = []
+    progress = {'state': 'running', 'progress': 0.0, 'stage': None}
+
+    def update(**fields):
+        if _job_entry(key, run, 'cancelled') in store:
+            raise JobCancelled(key)
+        progress.update(fields, time=time.time())
+        store.put(_job_entry(key, run, 'progress'), progress)
+
+    # Follow the pipeline's stages, checking for cancellation as each one finishes
+    def track(kind, name, value):
+        if kind == 'cache' and name == store.name:
+            return
+        events.append((kind, name, value))
+        if kind == 'timing' and name in JOB_STAGES:
+            update(state='running', stage=name, progress=JOB_STAGES[name])
+
+    OBSERVERS[:] = [track]
+    try:
+        update()
+        result = _run_job(job)
+        result_key = result.get('key') if isinstance(result, dict) else None
+        if result_key is None or result_key not in render_cache:
+            result_key = key
+            render_cache.put(key, result)
+        update(state='done', progress=1.0, result_key=result_key)
+    finally:
+        del OBSERVERS[:]
+    return events
+
+
+class RenderPool(object):
+    """Bounded pool of worker processes running renders in the background.
+
+    Jobs are named by a hash of the function and its arguments, so submitting a render that is
+    already queued or running joins it instead of starting it again. Progress and errors go to
+    `store` (job_store by default), where any process sharing it can poll them with `status`, and
+    results to render_cache, for `result` to fetch once the job is done. A job submitted for a `slot` (e.g. a browser session) with `replaces` set to the
+    slot's previous job drops that job, which is cancelled once no slot is waiting for it.
+    Running jobs stop at the end of their current pipeline stage. Queued or running jobs whose
+    state has not changed for `stale_after` seconds are considered lost and run again.
+    """
+
+    def __init__(self, processes=None, store=None, stale_after=15 * 60):
+        from threading import RLock
+
+        self.processes = processes or os.cpu_count() or 1
+        self.store = job_store if store is None else store
+        self.stale_after = stale_after
+        self._executor = None
+        self._futures = {}
+
+        # Reentrant, as cancelling a future runs its done callback on the spot
+        self._lock = RLock()
+
+    def job_id(self, fn, *args, **kwargs):
+        """Hashes a function and its arguments, hashing data frames and layouts by content, into a job id."""
+        parts = ['job-v2', RENDER_VERSION, fn.__module__, fn.__name__]
+        for value in args:
+            parts.append(_job_part(value))
+        for name, value in sorted(kwargs.items()):
+            parts.extend([name, _job_part(value)])
+        return content_hash(*parts)
+
+    def submit(self, fn, *args, slot=None, replaces=None, **kwargs):
+        """Starts fn(*args, **kwargs) in the pool unless the same job is already done or under way.
+
+        Returns the job id to poll with `status`.
+        """
+
+        # Load dependencies
+        import uuid
+        from concurrent.futures import ProcessPoolExecutor
+        from functools import partial
+
+        key = self.job_id(fn, *args, **kwargs)
+        with self._lock:
+            status = self.status(key)
+            state = self.store.get(key) or {}
+            alive = status['state'] in ('queued', 'running') and time.time() - status.get('time', 0) < self.stale_after
+            done = status['state'] == 'done' and status.get('result_key') in render_cache
+            if slot is not None:
+                state['slots'] = sorted(set(state.get('slots', [])) | {slot})
+            if key not in self._futures and not alive and not done:
+
+                # Every run has its own progress and cancellation entries
+                state.update(state='queued', progress=0.0, stage=None, error=None, run=uuid.uuid4().hex)
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.processes)
+                future = self._executor.submit(_run_pool_job, self.store, key, state['run'],
+                                               (partial(fn, **kwargs),) + args)
+                self._futures[key] = future
+            else:
+                future = None
+            state['time'] = time.time()
+            self.store.put(key, state)
+        if future is not None:
+            future.add_done_callback(lambda f: self._finished(key, f))
+        if replaces is not None and replaces != key:
+            self.release(replaces, slot)
+        return key
+
+    def release(self, key, slot=None):
+        """Stops waiting for a job on behalf of `slot`, cancelling it when no other slot waits for it."""
+        with self._lock:
+            state = self.store.get(key)
+            if state is None or self.status(key)['state'] in ('done', 'failed', 'cancelled'):
+                return
+            state['slots'] = [s for s in state.get('slots', []) if s != slot]
+            if slot is None or not state['slots']:
+                future = self._futures.get(key)
+                if future is not None:
+                    future.cancel()
+                self.store.put(_job_entry(key, state.get('run'), 'cancelled'), {'time': time.time()})
+                state['state'] = 'cancelled'
+            self.store.put(key, state)
+
+    def status(self, key):
+        """Returns the state of a job: 'queued', 'running', 'done', 'failed', 'cancelled' or 'unknown'.
+
+        The status also carries the job's progress (0 to 1) and last finished `stage`, the
+        render_cache key of its result (`result_key`) once done, and its `error` if it failed.
+        """
+        state = self.store.get(key)
+        if state is None:
+            return {'state': 'queued' if key in self._futures else 'unknown', 'progress': 0.0}
+
+        # A run's cancellation wins over whatever progress its worker reported
+        if state.get('state') in ('queued', 'running') and state.get('run'):
+            if _job_entry(key, state['run'], 'cancelled') in self.store:
+                return dict(state, state='cancelled')
+            progress = self.store.get(_job_entry(key, state['run'], 'progress'))
+            if progress is not None:
+                state = dict(state, **progress)
+        return state
+
+    def result(self, key):
+        """Returns the result of a finished job from render_cache, or None if it is not done (or has been evicted)."""
+        status = self.status(key)
+        if status['state'] != 'done' or not status.get('result_key'):
+            return None
+        return render_cache.get(status['result_key'], label='job_results')
+
+    def wait(self, key, timeout=None):
+        """Waits up to `timeout` seconds for a job submitted from this process, then returns its status."""
+
+        # Load dependency
+        from concurrent.futures import wait
+
+        future = self._futures.get(key)
+        if future is not None:
+            wait([future], timeout=timeout)
+        return self.status(key)
+
+    def shutdown(self):
+        """Cancels the queued jobs and stops the worker processes."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            futures = list(self._futures.values())
+        for future in futures:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _finished(self, key, future):
+
+        # Load dependency
+        from concurrent.futures.process import BrokenProcessPool
+
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+        error = None if future.cancelled() else future.exception()
+        if future.cancelled() or isinstance(error, JobCancelled):
+            state = 'cancelled'
+        elif error is not None:
+            state = 'failed'
+            if isinstance(error, BrokenProcessPool):
+                self.shutdown()
+        else:
+            for event in future.result():
+                notify(*event)
+            return
+        with self._lock:
+            self.store.put(key, dict(self.store.get(key) or {}, state=state, error=str(error or ''), time=time.time()))
+
+
+# Batch renders record the input hash of every page they write here, in the output directory
+BATCH_MANIFEST = '.dynamicsector-batch.json'
+BATCH_VIEWS = ('2d', '3d')
+REPORT_STAGES = [('read', ['read', 'bundle_load']), ('build', ['build']), ('layout', ['layout']),
+                 ('draw', ['figure', 'serialize']), ('write', ['write'])]
+
+
+def file_hash(path, block=2**20):
+    """Hashes a file, or every file in a directory with its relative name, by content without reading it whole."""
+
+    # Load dependency
+    import hashlib
+
+    h = hashlib.blake2b(digest_size=16)
+    if os.path.isdir(path):
+        files = sorted(os.path.relpath(os.path.join(d, f), path) for d, _, names in os.walk(path) for f in names)
+    else:
+        files = [None]
+    for name in files:
+        if name is not None:
+            h.update(name.replace(os.sep, '/').encode('utf-8') + b'\x1e')
+        with open(path if name is None else os.path.join(path, name), 'rb') as f:
+            for data in iter(lambda: f.read(block), b''):
+                h.update(data)
+    return h.hexdigest()
+
+
+def _is_bundle(path):
+    """Checks whether a path is a compiled sector bundle (see write_bundle)."""
+
+    # Load dependency
+    import zipfile
+
+    if os.path.isdir(path):
+        return os.path.exists(os.path.join(path, BUNDLE_MANIFEST))
+    if path.lower().endswith('.zip') and zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as bundle:
+            return BUNDLE_MANIFEST in bundle.namelist()
+    return False
+
+
+def find_sectors(source):
+    """Lists the sectors of a campaign archive, each as a dictionary of its name and input paths.
+
+    `source` is a directory or a manifest. In a directory, searched recursively, every table named
+    `<prefix>system_data` with a `<prefix>sector_map` table beside it is a sector, and so is every
+    compiled bundle (see write_bundle); sectors are named after their sub-directory and prefix. A
+    manifest is a JSON list, or a csv table, of entries with a 'name' and either 'system_data' and
+    'sector_map' paths or a 'bundle' path, relative to the manifest.
+    """
+
+    # Load dependencies
+    import json
+    import pandas as pd
+
+    if os.path.isdir(source) and not _is_bundle(source):
+        sectors = []
+        for directory, subdirectories, files in os.walk(source):
+            subdirectories.sort()
+            relative = os.path.relpath(directory, source)
+            parts = [] if relative == '.' else relative.split(os.sep)
+            if BUNDLE_MANIFEST in files:
+                sectors.append({'name': '_'.join(parts), 'bundle': directory})
+                subdirectories[:] = []
+                continue
+            tables = {os.path.splitext(f)[0]: os.path.join(directory, f) for f in sorted(files, reverse=True)
+                      if os.path.splitext(f)[1].lower() in TABLE_FORMATS}
+            for name in sorted(files):
+                path = os.path.join(directory, name)
+                stem = os.path.splitext(name)[0]
+                if _is_bundle(path):
+                    sectors.append({'name': '_'.join(parts + [stem]), 'bundle': path})
+                elif stem.endswith('system_data') and tables.get(stem) == path:
+                    prefix = stem[:-len('system_data')]
+                    if prefix + 'sector_map' in tables:
+                        label = prefix.strip('_-. ')
+                        sectors.append({'name': '_'.join(parts + [label] if label else parts),
+                                        'system_data': path,
+                                        'sector_map': tables[prefix + 'sector_map']})
+        for sector in sectors:
+            sector['name'] = sector['name'] or os.path.basename(os.path.abspath(source))
+    else:
+        if str(source).lower().endswith('.json'):
+            with open(source, 'rb') as f:
+                entries = json.loads(f.read().decode('utf-8'))
+        else:
+            entries = pd.read_csv(source, dtype=object).to_dict('records')
+        base = os.path.dirname(os.path.abspath(source))
+        sectors = []
+        for entry in entries:
+            sector = {k: v for k, v in entry.items() if k in ('name', 'system_data', 'sector_map', 'bundle')
+                      and isinstance(v, str) and v}
+            if 'name' not in sector or not ('bundle' in sector or {'system_data', 'sector_map'} <= set(sector)):
+                raise ValueError('Manifest entries need a name and either system_data and sector_map or bundle: {}'.format(entry))
+            for k in ('system_data', 'sector_map', 'bundle'):
+                if k in sector:
+                    sector[k] = os.path.join(base, sector[k])
+            sectors.append(sector)
+
+    names = [s['name'] for s in sectors]
+    duplicated = sorted(set(n for n in names if names.count(n) > 1))
+    if duplicated:
+        raise ValueError('Several sectors are named {}'.format(', '.join(duplicated)))
+    return sectors
+
+
+def _render_sector_pages(sector, out_dir, views, hashes, options, force=False):
+    """Renders one sector of a batch to HTML pages, skipping the ones whose inputs are unchanged (see render_batch)."""
+
+    # Keep this sector's stage timings and sizes
+    events = {'timing': {}, 'size': {}}
+
+    def record(kind, name, value):
+        if kind in events:
+            events[kind][name] = events[kind].get(name, 0) + value if kind == 'timing' else value
+
+    results = []
+    inputs = None
+    frames = None
+    add_observer(record)
+    try:
+        for view in views:
+            start = time.perf_counter()
+            events['timing'].clear()
+            page = '{}_{}.html'.format(sector['name'], view)
+            result = {'name': sector['name'], 'view': view, 'file': page}
+            try:
+                if inputs is None:
+                    with timed('hash'):
+                        inputs = [file_hash(sector[k]) for k in ('bundle', 'system_data', 'sector_map') if k in sector]
+                result['key'] = content_hash(RENDER_VERSION, view, sorted(options.items()), *inputs)
+                path = os.path.join(out_dir, page)
+                if not force and hashes.get(page) == result['key'] and os.path.exists(path):
+                    result['state'] = 'skipped'
+                else:
+
+                    # Tables are read once per sector, bundles are opened per view
+                    if 'bundle' in sector:
+                        source = [sector['bundle']]
+                    else:
+                        if frames is None:
+                            with timed('read'):
+                                frames = [read_system_data(sector['system_data']), read_sector_map(sector['sector_map'])]
+                        source = frames
+                    local = options['assets'] == 'local'
+                    if view == '2d':
+                        html_string = dynamic_sector_2d(*source, seed=options['seed'], layout=options['layout'],
+                                                        asset_url='vis' if local else None, notebook=False)
+                        with timed('write'):
+                            with open(path, 'w', encoding='utf-8') as f:
+                                f.write(html_string)
+                    else:
+                        figure = dynamic_sector_3d(*source, seed=options['seed'], layout=options['layout'],
+                                                   max_edges=options['max_edges'])
+                        with timed('write'):
+                            figure.write_html(path, include_plotlyjs='directory' if local else 'cdn')
+                    result['state'] = 'rendered'
+            except Exception as error:
+                result.update(state='failed', error='{}: {}'.format(type(error).__name__, error))
+            result.update(seconds=time.perf_counter() - start,
+                          bodies=events['size'].get('bodies'),
+                          routes=events['size'].get('routes'),
+                          timings=dict(events['timing']))
+            results.append(result)
+    finally:
+        remove_observer(record)
+    return results
+
+
+def _batch_assets(out_dir, views):
+    """Copies plotly.js and vis-network next to the pages of a batch, unless they are there already."""
+
+    # Load dependency
+    import shutil
+
+    if '3d' in views and not os.path.exists(os.path.join(out_dir, 'plotly.min.js')):
+
+        # Load dependency
+        from plotly.offline import get_plotlyjs
+
+        with open(os.path.join(out_dir, 'plotly.min.js'), 'w', encoding='utf-8') as f:
+            f.write(get_plotlyjs())
+    if '2d' in views:
+        os.makedirs(os.path.join(out_dir, 'vis'), exist_ok=True)
+        for name in VIS_ASSETS.values():
+            if not os.path.exists(os.path.join(out_dir, 'vis', name)):
+                shutil.copyfile(os.path.join(vis_asset_dir(), name), os.path.join(out_dir, 'vis', name))
+
+
+def render_batch(source, out_dir, views=BATCH_VIEWS, processes=None, force=False, seed=DEFAULT_SEED, layout='auto',
+                 max_edges=None, assets='local', report=None):
+    """Renders every sector of a campaign archive (see find_sectors) to standalone HTML pages in `out_dir`.
+
+    Each sector becomes `<name>_2d.html` and/or `<name>_3d.html` per `views`, across a pool of
+    `processes` worker processes (all cores by default). Pages whose input files and render
+    options hash the same as when the last batch wrote them (see BATCH_MANIFEST) are skipped,
+    unless `force`. With assets='local', plotly.js and vis-network are copied into `out_dir`, so
+    the pages work offline; 'cdn' links them from CDNs instead. `report` is called with each
+    sector's results as it finishes. Returns one dictionary per page, with its state ('rendered',
+    'skipped' or 'failed'), body and route counts, and time spent per stage.
+    """
+
+    # Load dependencies
+    import json
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    if assets not in ('local', 'cdn'):
+        raise ValueError("assets must be 'local' or 'cdn', not {!r}".format(assets))
+    sectors = find_sectors(source)
+    os.makedirs(out_dir, exist_ok=True)
+    if assets == 'local':
+        _batch_assets(out_dir, views)
+    manifest = os.path.join(out_dir, BATCH_MANIFEST)
+    hashes = {}
+    if os.path.exists(manifest):
+        with open(manifest, 'rb') as f:
+            hashes = json.loads(f.read().decode('utf-8'))
+    options = {'seed': seed, 'layout': layout, 'max_edges': max_edges, 'assets': assets}
+
+    # The manifest is rewritten as each sector finishes, so an interrupted batch keeps its progress
+    results = []
+
+    def finished(pages):
+        for page in pages:
+            if page['state'] == 'failed':
+                hashes.pop(page['file'], None)
+            else:
+                hashes[page['file']] = page['key']
+        with open(manifest + '.tmp', 'wb') as f:
+            f.write(_json_dumps(hashes))
+        os.replace(manifest + '.tmp', manifest)
+        results.extend(pages)
+        if report is not None:
+            report(pages)
+
+    processes = min(processes or os.cpu_count() or 1, len(sectors))
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(_render_sector_pages, sector, out_dir, views, hashes, options, force)
+                       for sector in sectors]
+            for future in as_completed(futures):
+                finished(future.result())
+    else:
+        for sector in sectors:
+            finished(_render_sector_pages(sector, out_dir, views, hashes, options, force))
+    return results
+
+
+def main(argv=None):
+    """Command line entry point, rendering a campaign archive of sectors to HTML (see render_batch)."""
+
+    # Load dependencies
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog='dynamicsector',
+                                     description='Renders a directory or manifest of sectors to standalone 2D and 3D HTML pages.')
+    parser.add_argument('source', help='directory of <name>system_data and <name>sector_map tables or compiled bundles, '
+                                       'or a JSON or csv manifest of them')
+    parser.add_argument('output', help='directory to write the pages to')
+    parser.add_argument('--views', nargs='+', default=list(BATCH_VIEWS), choices=BATCH_VIEWS)
+    parser.add_argument('--processes', type=int, help='worker processes (default: all cores)')
+    parser.add_argument('--force', action='store_true', help='render every page, even if its inputs are unchanged')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--layout', default='auto', help='layout engine: auto or one of {}'.format(', '.join(LAYOUT_ENGINES)))
+    parser.add_argument('--max-edges', type=int, help='thin the routes of 3D pages to this many')
+    parser.add_argument('--cdn', action='store_true', help='link plotly.js and vis-network from CDNs instead of copying them')
+    parser.add_argument('--report', help='also write the timing report to this JSON file')
+    args = parser.parse_args(argv)
+
+    row = '{:<28} {:<4} {:<8} {:>9} {:>9}' + ' {:>8}' * (len(REPORT_STAGES) + 1)
+    print(row.format('sector', 'view', 'state', 'bodies', 'routes', *[s for s, _ in REPORT_STAGES], 'total'))
+
+    def report(pages):
+        for page in pages:
+            stages = ['{:.2f}'.format(sum(page['timings'].get(n, 0) for n in names)) for _, names in REPORT_STAGES]
+            print(row.format(page['name'], page['view'], page['state'],
+                             '' if page['bodies'] is None else page['bodies'],
+                             '' if page['routes'] is None else page['routes'],
+                             *stages, '{:.2f}'.format(page['seconds'])), flush=True)
+            if page['state'] == 'failed':
+                print('  {}'.format(page['error']), flush=True)
+
+    start = time.perf_counter()
+    results = render_batch(args.source, args.output, views=args.views, processes=args.processes, force=args.force,
+                           seed=args.seed, layout=args.layout, max_edges=args.max_edges,
+                           assets='cdn' if args.cdn else 'local', report=report)
+    elapsed = time.perf_counter() - start
+    states = [r['state'] for r in results]
+    print('{} pages: {} rendered, {} skipped, {} failed in {:.2f} s'.format(
+        len(results), states.count('rendered'), states.count('skipped'), states.count('failed'), elapsed))
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'seconds': elapsed, 'pages': results}, f, indent=2)
+    return 1 if 'failed' in states else 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,27 @@
+#---------------------------------------------------------------------------------------------
+# Gunicorn settings for the hosted dashboard. Gunicorn only looks for ./gunicorn.conf.py in the
+# directory it is launched from, before `--chdir` applies, so pass this file explicitly:
+#
+#   gunicorn --chdir src -c src/gunicorn.conf.py app:server
+#---------------------------------------------------------------------------------------------
+
+import os
+
+# In fast-start mode the app (and the render pipeline's imports) is loaded once in the master,
+# and the forked workers share those modules instead of each importing everything again
+preload_app = os.environ.get('DYNAMICSECTOR_FAST_START', '0') == '1'
+
+# Start the workers' shared /metrics totals (see DYNAMICSECTOR_METRICS_DIR) afresh, as every
+# process leaves its file behind; this file is read before a preloaded app records anything
+metrics_dir = os.environ.get('DYNAMICSECTOR_METRICS_DIR')
+if metrics_dir and os.path.isdir(metrics_dir):
+    for entry in os.listdir(metrics_dir):
+        if entry.endswith('.json'):
+            os.remove(os.path.join(metrics_dir, entry))
+
+def when_ready(server):
+    # Move everything loaded so far out of the garbage collector's reach, so that collections
+    # in the workers do not touch (and copy) the pages they share with the master
+    if preload_app:
+        import gc
+        gc.freeze()